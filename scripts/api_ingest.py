@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Ingesta masiva de propuestas desde la API GraphQL del portal (estilo CONSUL).
+
+En lugar de descargar y parsear la ficha HTML de cada propuesta, pide los
+proyectos de un presupuesto en paginas de `PAGE_SIZE` a
+`/presupuestosparticipativos/graphql` y los convierte al mismo registro que
+produce `scrape_budgets.scrape_proposal_details` (mismas claves, en el mismo
+orden, y la misma limpieza de descripcion, autor, zona y longitud).
+
+Si el endpoint no existe o no responde con datos validos se lanza
+`ApiUnavailable`; `records_by_url` la captura y devuelve lo que haya para que
+el llamador siga con el scraping HTML.
+
+`mock_site.py` sirve el mismo endpoint (salvo con `--no-api`), asi que se
+puede probar en local:
+
+    PARTICIPATIVOS_BASE_URL=http://127.0.0.1:8765 python3 scripts/api_ingest.py --budget-id 6
+    python3 scripts/scrape_budgets.py --api
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+import requests
+from bs4 import BeautifulSoup
+
+from scrape_budgets import (
+    BASE_URL,
+    ZONE_NAMES,
+    normalize_investment_url,
+    normalize_longitude,
+    normalize_zone_name,
+    resolve_zone_ref,
+    split_description,
+)
+from site_config import site_url
+
+GRAPHQL_PATH = "/presupuestosparticipativos/graphql"
+PAGE_SIZE = 100
+TIMEOUT = 30
+MAX_PAGES = 200
+
+INVESTMENTS_QUERY = """
+query Investments($budgetId: ID!, $first: Int!, $after: String) {
+  budgetInvestments(budgetId: $budgetId, first: $first, after: $after) {
+    pageInfo { hasNextPage endCursor }
+    edges {
+      node {
+        id
+        title
+        description
+        location
+        organizationName
+        publicCreatedAt
+        cachedVotesUp
+        unfeasibilityExplanation
+        heading { id name }
+        tags { name }
+        image { url }
+        documents { title url }
+        mapLocation { latitude longitude }
+      }
+    }
+  }
+}
+"""
+
+
+class ApiUnavailable(RuntimeError):
+    """El portal no ofrece la API o responde con algo que no se puede usar."""
+
+
+def investment_url(budget_id: Any, investment_id: Any) -> str:
+    return f"{BASE_URL}/presupuestosparticipativos/budgets/{budget_id}/investments/{investment_id}"
+
+
+def absolute_url(url: str | None) -> str | None:
+    if not url:
+        return None
+    return BASE_URL + url if url.startswith("/") else url
+
+
+def format_date(value: str | None) -> str | None:
+    """`2026-01-02T10:00:00+01:00` -> `02/01/2026`, el formato de la ficha."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).strftime("%d/%m/%Y")
+    except ValueError:
+        return None
+
+
+def description_paragraphs(description_html: str | None) -> list[str]:
+    soup = BeautifulSoup(description_html or "", "html.parser")
+    paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
+    if not paragraphs:
+        paragraphs = [line.strip() for line in soup.get_text("\n").splitlines()]
+    return [text for text in paragraphs if text]
+
+
+def node_to_record(node: dict[str, Any], budget_id: Any, zone_name: str | None = None, zone_id: Any = None) -> dict[str, Any]:
+    """Registro con la forma de `scrape_proposal_details` a partir de un nodo de la API."""
+    # La ficha muestra ubicacion y entidad como parrafos; se pasan por la misma limpieza.
+    paragraphs = description_paragraphs(node.get("description"))
+    if node.get("location"):
+        paragraphs.append(f"Ubicación: {node['location']}")
+    if node.get("organizationName"):
+        paragraphs.append(f"Propuesto en nombre de: {node['organizationName']}")
+    description, address, author = split_description(paragraphs)
+
+    heading = node.get("heading") or {}
+    zone_name = zone_name or heading.get("name")
+    zone, normalized_id = normalize_zone_name(zone_name) if zone_name else (None, None)
+    if normalized_id is None:
+        # Nombre desconocido: el heading_id (de discovered_urls o del nodo) tambien identifica la zona.
+        normalized_id = resolve_zone_ref(zone_id) or resolve_zone_ref(heading.get("id"))
+        if normalized_id is not None:
+            zone = ZONE_NAMES[normalized_id]
+
+    location = node.get("mapLocation") or {}
+    latitude, longitude = location.get("latitude"), location.get("longitude")
+
+    return {
+        "url": investment_url(budget_id, node["id"]),
+        "code": str(node["id"]),
+        "zone": zone,
+        "zone_id": normalized_id,
+        "date": format_date(node.get("publicCreatedAt")),
+        "title": (node.get("title") or "").strip(),
+        "author": author,
+        "description": description,
+        "address": address,
+        "image_url": absolute_url((node.get("image") or {}).get("url")),
+        "documents": [
+            {"url": absolute_url(doc.get("url")), "title": (doc.get("title") or "").strip()}
+            for doc in node.get("documents") or []
+            if doc.get("url")
+        ],
+        "categories": [tag["name"] for tag in node.get("tags") or [] if tag.get("name")],
+        "latitude": float(latitude) if latitude is not None else None,
+        "longitude": normalize_longitude(float(longitude)) if longitude is not None else None,
+        "votes": int(node.get("cachedVotesUp") or 0),
+        "inviability_report": (node.get("unfeasibilityExplanation") or "").strip(' "“”'),
+    }
+
+
+def fetch_investment_nodes(
+    session: requests.Session,
+    budget_id: Any,
+    page_size: int = PAGE_SIZE,
+) -> Iterator[dict[str, Any]]:
+    after = None
+    for _ in range(MAX_PAGES):
+        variables = {"budgetId": str(budget_id), "first": page_size, "after": after}
+        try:
+            response = session.post(
+                site_url(GRAPHQL_PATH),
+                json={"query": INVESTMENTS_QUERY, "variables": variables},
+                timeout=TIMEOUT,
+            )
+        except requests.RequestException as exc:
+            raise ApiUnavailable(f"Sin respuesta de {GRAPHQL_PATH}: {exc}") from exc
+        if response.status_code != 200:
+            raise ApiUnavailable(f"{GRAPHQL_PATH} respondio {response.status_code}")
+        try:
+            payload = response.json()
+        except ValueError as exc:
+            raise ApiUnavailable(f"{GRAPHQL_PATH} no devuelve JSON") from exc
+        try:
+            connection = payload["data"]["budgetInvestments"]
+            edges = connection["edges"]
+            page_info = connection["pageInfo"]
+        except (KeyError, TypeError) as exc:
+            errors = payload.get("errors") if isinstance(payload, dict) else None
+            raise ApiUnavailable(f"Respuesta inesperada de {GRAPHQL_PATH}: {errors or exc}") from exc
+
+        for edge in edges:
+            yield edge["node"]
+        if not page_info.get("hasNextPage"):
+            return
+        after = page_info.get("endCursor")
+
+
+def fetch_investments(budget_id: Any, session: requests.Session | None = None, page_size: int = PAGE_SIZE) -> list[dict[str, Any]]:
+    """Todos los proyectos de un presupuesto como registros; lanza `ApiUnavailable` si no hay API."""
+    session = session or requests.Session()
+    return [node_to_record(node, budget_id) for node in fetch_investment_nodes(session, budget_id, page_size)]
+
+
+def budget_id_from_url(url: str) -> str | None:
+    match = re.search(r"/budgets/(\d+)/investments/\d+", url or "")
+    return match.group(1) if match else None
+
+
+def records_by_url(
+    discovered: list[dict[str, Any]],
+    session: requests.Session | None = None,
+    page_size: int = PAGE_SIZE,
+) -> dict[str, dict[str, Any]]:
+    """Registros de la API para las URLs descubiertas (las de `discovered_urls.json`).
+
+    Se respeta la zona del descubrimiento, como en `scrape_proposal_details`.
+    Las propuestas de presupuestos sin API no aparecen en el resultado y el
+    llamador las extrae de su ficha HTML.
+    """
+    session = session or requests.Session()
+    wanted: dict[str, dict[str, dict[str, Any]]] = defaultdict(dict)
+    for item in discovered:
+        url = normalize_investment_url(item.get("url"))
+        budget_id = budget_id_from_url(url)
+        if budget_id:
+            wanted[budget_id][url] = item
+
+    records: dict[str, dict[str, Any]] = {}
+    for budget_id, items in wanted.items():
+        try:
+            nodes = list(fetch_investment_nodes(session, budget_id, page_size))
+        except ApiUnavailable as exc:
+            print(f"[!] API no disponible para el budget {budget_id} ({exc}); se usara el HTML")
+            continue
+        matched = 0
+        for node in nodes:
+            url = investment_url(budget_id, node.get("id"))
+            item = items.get(url)
+            if item is not None:
+                records[url] = node_to_record(node, budget_id, item.get("zone_name") or None, item.get("zone_id"))
+                matched += 1
+        print(f"[*] API: {len(nodes)} proyectos del budget {budget_id}, {matched} de ellos pendientes")
+    return records
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Descarga los proyectos de un presupuesto desde la API GraphQL")
+    parser.add_argument("--budget-id", default="6")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--output", type=Path, default=None, help="Guarda los registros en este JSON")
+    args = parser.parse_args()
+
+    try:
+        records = fetch_investments(args.budget_id, page_size=args.page_size)
+    except ApiUnavailable as exc:
+        print(f"[!] {exc}")
+        return 1
+
+    print(f"Proyectos leidos: {len(records)}")
+    if args.output:
+        args.output.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""Banco de pruebas de rendimiento de los scripts de datos.
+
+Mide, sin tocar el servidor municipal ni los ficheros de `data/`:
+
+- `parse_detail_page`: `scrape_proposal_details` sobre fichas ya descargadas
+  (solo BeautifulSoup + extraccion, sin red).
+- `vote_refresh_mock`: `VoteUpdater.update_proposals` completo contra
+  `mock_site.py` en un puerto local, con los ficheros de progreso y datos
+  redirigidos a un directorio temporal.
+- `listing_shards_mock`: `update_votes.py --from-listings` en `LISTING_SHARDS`
+  shards contra `mock_site.py`. Ademas comprueba que entre todos piden cada
+  pagina de listado una sola vez; si no, el caso falla.
+- `simulate_outcomes`: `simulate_outcomes.run` sobre los datos del repo, con
+  la foto de apoyos fechada `SIMULATION_LEAD_DAYS` dias antes del cierre para
+  que se sorteen de verdad ritmos (Gamma) y apoyos nuevos (Poisson). Usa los
+  topes de `data/zone_caps.json` y, si falta alguno, la mitad del importe de
+  las candidatas de cada zona, para que el tope recorte. Comprueba que las
+  probabilidades y percentiles son coherentes y que con la misma semilla sale
+  lo mismo.
+- `export_json` / `export_csv`: volcado del dataset como hacen los scrapers.
+- `export_columnar` / `load_columnar` / `load_csv`: escritura y lectura del
+  formato columnar propio de `export_columnar.py` frente a leer el CSV.
+- `sanitize_pdf`: aplanado de un acta con `sanitize_acta_pdfs.py`.
+
+Los resultados se escriben en JSON. Con `--save-baseline` se guardan como
+referencia y con `--compare` se comparan contra ella: si la mediana de algun
+caso empeora mas que su umbral, o si falla la comprobacion de un caso, el
+script sale con codigo 1.
+
+    python3 scripts/benchmark.py --save-baseline
+    python3 scripts/benchmark.py --compare --only vote_refresh_mock
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_ACTAS_DIR = ROOT / "data" / "actas-mesa"
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+DEFAULT_THRESHOLD = 0.20
+MOCK_PORT = 8766
+LISTING_SHARDS = 3
+SIMULATION_LEAD_DAYS = 7
+
+
+class CheckFailed(Exception):
+    """Un caso ha medido algo que no debe pasar (no es una cuestion de tiempo)."""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[argparse.Namespace], Callable[[], int]]
+    repeat: int = 5
+    threshold: float = DEFAULT_THRESHOLD
+    description: str = ""
+
+
+@dataclass
+class Result:
+    name: str
+    timings: list[float]
+    items: int
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> dict[str, Any]:
+        median = statistics.median(self.timings)
+        return {
+            "repeat": len(self.timings),
+            "min_seconds": round(min(self.timings), 6),
+            "median_seconds": round(median, 6),
+            "mean_seconds": round(statistics.fmean(self.timings), 6),
+            "items": self.items,
+            "items_per_second": round(self.items / median, 2) if median else None,
+            **self.extra,
+        }
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, *, repeat: int = 5, threshold: float = DEFAULT_THRESHOLD) -> Callable:
+    """Registra una funcion `setup(args) -> run()`; `run()` devuelve el numero de elementos."""
+
+    def decorator(setup: Callable[[argparse.Namespace], Callable[[], int]]) -> Callable:
+        BENCHMARKS[name] = Benchmark(
+            name,
+            setup,
+            repeat=repeat,
+            threshold=threshold,
+            description=(setup.__doc__ or "").strip().splitlines()[0] if setup.__doc__ else "",
+        )
+        return setup
+
+    return decorator
+
+
+def load_proposals(args: argparse.Namespace) -> list[dict[str, Any]]:
+    proposals = json.loads(args.proposals_json.read_text(encoding="utf-8"))
+    return proposals[: args.limit] if args.limit else proposals
+
+
+_mock_server = None
+
+
+def mock_server(args: argparse.Namespace):
+    """Arranca (una sola vez) el servidor simulado en un hilo."""
+    global _mock_server
+    if _mock_server is None:
+        import mock_site
+
+        _mock_server = mock_site.build_server(
+            port=args.mock_port,
+            proposals_json=args.proposals_json,
+            latency_ms=args.mock_latency_ms,
+        )
+        threading.Thread(target=_mock_server.serve_forever, daemon=True).start()
+    return _mock_server
+
+
+@benchmark("parse_detail_page")
+def setup_parse_detail_page(args: argparse.Namespace) -> Callable[[], int]:
+    """Extraccion de una ficha ya descargada con scrape_proposal_details."""
+    from bs4 import BeautifulSoup
+
+    import scrape_budgets
+
+    server = mock_server(args)
+    proposals = load_proposals(args)
+    pages = {
+        p["url"]: server.site.detail_page(str(p["code"])).encode("utf-8")
+        for p in proposals
+    }
+    original_get_soup = scrape_budgets.get_soup
+
+    def run() -> int:
+        scrape_budgets.get_soup = lambda url: BeautifulSoup(pages[url], "html.parser")
+        try:
+            for p in proposals:
+                scrape_budgets.scrape_proposal_details(p["url"], p.get("zone") or "", p.get("zone_id"))
+        finally:
+            scrape_budgets.get_soup = original_get_soup
+        return len(proposals)
+
+    return run
+
+
+def mock_update_votes(args: argparse.Namespace, server: Any, workdir: Path):
+    """`update_votes` apuntando al servidor simulado, con sus ficheros en `workdir`."""
+    os.environ["PARTICIPATIVOS_BASE_URL"] = server.base_url
+    (ROOT / "logs").mkdir(exist_ok=True)
+
+    import site_config
+
+    site_config.BASE_URL = server.base_url
+    import update_votes
+
+    update_votes.DATA_DIR = str(workdir)
+    update_votes.PROPOSALS_FILE = str(workdir / "proposals_data.json")
+    update_votes.PROGRESS_FILE = str(workdir / "update_progress.json")
+    update_votes.BACKUP_DIR = str(workdir / "backups")
+    update_votes.METRICS_FILE = str(workdir / "vote_update_metrics.json")
+    update_votes.BASE_DELAY = args.vote_delay
+    update_votes.PAUSE_DURATION = 0
+    update_votes.logger.disabled = True
+    return update_votes
+
+
+@benchmark("vote_refresh_mock", repeat=3, threshold=0.30)
+def setup_vote_refresh_mock(args: argparse.Namespace) -> Callable[[], int]:
+    """Refresco de votos completo contra el servidor simulado."""
+    server = mock_server(args)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-votes-"))
+    update_votes = mock_update_votes(args, server, workdir)
+    proposals = load_proposals(args)
+
+    def run() -> int:
+        updater = update_votes.VoteUpdater()
+        batch = json.loads(json.dumps(proposals))
+        progress = {"last_processed_index": -1, "processed_codes": [], "errors": []}
+        updater.update_proposals(batch, progress)
+        return len(batch)
+
+    return run
+
+
+@benchmark("listing_shards_mock", repeat=3, threshold=0.30)
+def setup_listing_shards_mock(args: argparse.Namespace) -> Callable[[], int]:
+    """Refresco por listados repartido en shards; cada pagina de listado se pide una vez."""
+    server = mock_server(args)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-shards-"))
+    update_votes = mock_update_votes(args, server, workdir)
+    Path(update_votes.PROPOSALS_FILE).write_text(json.dumps(load_proposals(args)), encoding="utf-8")
+    page_size = server.site.page_size
+    listing_pages = sum(max(1, -(-len(items) // page_size)) for _, items in server.site.zones.values())
+
+    def run() -> int:
+        server.stats.reset()
+        shards_dir = tempfile.mkdtemp(prefix="shards-", dir=workdir)
+        observed = 0
+        for index in range(1, LISTING_SHARDS + 1):
+            updater = update_votes.VoteUpdater(from_listings=True, shard=(index, LISTING_SHARDS), shards_dir=shards_dir)
+            if not updater.run():
+                raise CheckFailed(f"el shard {index}/{LISTING_SHARDS} no ha terminado")
+            observed += len(updater.observations)
+        requested = server.stats.snapshot()["by_route"].get("listing", 0)
+        if requested != listing_pages:
+            raise CheckFailed(
+                f"{LISTING_SHARDS} shards han pedido {requested} paginas de listado; una pasada son {listing_pages}"
+            )
+        return observed
+
+    return run
+
+
+@benchmark("simulate_outcomes", repeat=3)
+def setup_simulate_outcomes(args: argparse.Namespace) -> Callable[[], int]:
+    """Monte Carlo de simulate_outcomes.py sobre los datos del repo, una semana antes del cierre."""
+    import project_winners
+    import simulate_outcomes
+
+    if simulate_outcomes.np is None:
+        raise ImportError("simulate_outcomes necesita NumPy")
+    workdir = Path(tempfile.mkdtemp(prefix="bench-simulation-"))
+    as_of = simulate_outcomes.DEADLINE - timedelta(days=SIMULATION_LEAD_DAYS)
+    progress_json = workdir / "update_progress.json"
+    progress_json.write_text(json.dumps({"last_complete_timestamp": as_of.isoformat()}), encoding="utf-8")
+
+    finales = json.loads(simulate_outcomes.DEFAULT_FINALES_JSON.read_text(encoding="utf-8"))
+    caps = project_winners.known_caps(finales)
+    zones, members = project_winners.zone_members(finales, caps)
+    try:
+        project_winners.check_caps(zones, members)
+    except project_winners.MissingCaps:
+        caps = {zone["name"]: sum(amount for _, amount in candidates) // 2 for zone, candidates in zip(zones, members)}
+    previous: list[list[Any]] = []
+
+    def run() -> int:
+        artifact = simulate_outcomes.run(
+            args.proposals_json,
+            output=workdir / "outcome_probabilities.json",
+            progress_json=progress_json,
+            backup_dir=workdir / "backups",
+            caps=caps,
+        )
+        rows = artifact["rows"]
+        if artifact["horizon_hours"] <= 0:
+            raise CheckFailed("la foto no queda antes del cierre: no se sortea nada")
+        if any(row[7] is None or not 0 <= row[7] <= 1 for row in rows):
+            raise CheckFailed("hay probabilidades nulas o fuera de [0, 1]")
+        if not any(0 < row[7] < 1 for row in rows):
+            raise CheckFailed("ninguna probabilidad es intermedia: el sorteo no cambia nada")
+        if any(not row[2] <= row[4] <= row[5] <= row[6] for row in rows):
+            raise CheckFailed("percentiles de apoyos finales desordenados o por debajo de los apoyos actuales")
+        if previous and previous != rows:
+            raise CheckFailed("con la misma semilla el resultado cambia")
+        previous[:] = rows
+        return artifact["trials"]
+
+    return run
+
+
+@benchmark("export_json")
+def setup_export_json(args: argparse.Namespace) -> Callable[[], int]:
+    """Volcado del dataset a JSON con indentacion, como scrape_budgets."""
+    proposals = load_proposals(args)
+
+    def run() -> int:
+        buffer = io.StringIO()
+        json.dump(proposals, buffer, ensure_ascii=False, indent=2)
+        return len(proposals)
+
+    return run
+
+
+@benchmark("export_csv")
+def setup_export_csv(args: argparse.Namespace) -> Callable[[], int]:
+    """Volcado del dataset a CSV con el esquema fijo, como scrape_budgets."""
+    import export_columnar
+
+    proposals = load_proposals(args)
+
+    def run() -> int:
+        export_columnar.dump_csv(io.StringIO(), proposals)
+        return len(proposals)
+
+    return run
+
+
+@benchmark("export_columnar")
+def setup_export_columnar(args: argparse.Namespace) -> Callable[[], int]:
+    """Columnas tipadas y volcado al formato propio (sin pyarrow)."""
+    import export_columnar
+
+    proposals = load_proposals(args)
+
+    def run() -> int:
+        export_columnar.encode_packed(export_columnar.columnarize(proposals))
+        return len(proposals)
+
+    return run
+
+
+@benchmark("load_columnar")
+def setup_load_columnar(args: argparse.Namespace) -> Callable[[], int]:
+    """Lectura completa del formato columnar propio."""
+    import export_columnar
+
+    proposals = load_proposals(args)
+    data = export_columnar.encode_packed(export_columnar.columnarize(proposals))
+
+    def run() -> int:
+        export_columnar.decode_packed(data)
+        return len(proposals)
+
+    return run
+
+
+@benchmark("load_csv")
+def setup_load_csv(args: argparse.Namespace) -> Callable[[], int]:
+    """Lectura del mismo dataset en CSV, con las listas vueltas a parsear."""
+    import export_columnar
+
+    proposals = load_proposals(args)
+    buffer = io.StringIO()
+    export_columnar.dump_csv(buffer, proposals)
+    text = buffer.getvalue()
+
+    def run() -> int:
+        rows = list(csv.DictReader(io.StringIO(text)))
+        for row in rows:
+            for name in ("documents", "categories"):
+                row[name] = json.loads(row[name]) if row[name] else []
+        return len(rows)
+
+    return run
+
+
+@benchmark("sanitize_pdf", repeat=3)
+def setup_sanitize_pdf(args: argparse.Namespace) -> Callable[[], int]:
+    """Aplanado de la primera acta de data/actas-mesa."""
+    import fitz
+
+    import sanitize_acta_pdfs
+
+    input_pdf = sanitize_acta_pdfs.iter_input_files(args.actas)[0]
+    output_pdf = Path(tempfile.mkdtemp(prefix="bench-sanitize-")) / input_pdf.name
+    settings = sanitize_acta_pdfs.RasterSettings()
+    with fitz.open(input_pdf) as doc:
+        page_count = doc.page_count
+
+    def run() -> int:
+        sanitize_acta_pdfs.sanitize_pdf(input_pdf, output_pdf, settings)
+        return page_count
+
+    return run
+
+
+def run_benchmark(spec: Benchmark, args: argparse.Namespace) -> Result:
+    run = spec.setup(args)
+    run()  # calentamiento: imports perezosos, conexiones, caches de bs4
+    timings = []
+    items = 0
+    for _ in range(args.repeat or spec.repeat):
+        started = time.perf_counter()
+        items = run()
+        timings.append(time.perf_counter() - started)
+    return Result(spec.name, timings, items)
+
+
+def compare(results: dict[str, dict[str, Any]], baseline: dict[str, Any], threshold: float | None) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            continue
+        limit = threshold if threshold is not None else BENCHMARKS[name].threshold
+        ratio = current["median_seconds"] / reference["median_seconds"] if reference["median_seconds"] else 1.0
+        current["baseline_median_seconds"] = reference["median_seconds"]
+        current["ratio_vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + limit:
+            regressions.append(f"{name}: {ratio:.2f}x la referencia (umbral {1 + limit:.2f}x)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de los scripts de datos")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="Casos a ejecutar")
+    parser.add_argument("--list", action="store_true", help="Lista los casos disponibles")
+    parser.add_argument("--repeat", type=int, default=None, help="Repeticiones por caso (por defecto, las de cada caso)")
+    parser.add_argument("--limit", type=int, default=None, help="Usa solo las N primeras propuestas")
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--actas", type=Path, default=DEFAULT_ACTAS_DIR)
+    parser.add_argument("--mock-port", type=int, default=MOCK_PORT)
+    parser.add_argument("--mock-latency-ms", type=float, default=0)
+    parser.add_argument("--vote-delay", type=float, default=0, help="BASE_DELAY de update_votes durante la prueba")
+    parser.add_argument("--output", type=Path, default=None, help="Fichero JSON de resultados")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=None, help="Umbral de regresion comun (0.2 = +20%%)")
+    args = parser.parse_args()
+
+    if args.list:
+        for spec in BENCHMARKS.values():
+            print(f"{spec.name:22} {spec.description}")
+        return 0
+
+    results: dict[str, dict[str, Any]] = {}
+    failures: list[str] = []
+    for name in args.only or BENCHMARKS:
+        try:
+            result = run_benchmark(BENCHMARKS[name], args)
+        except ImportError as exc:
+            print(f"SKIP\t{name}\t({exc})")
+            continue
+        except CheckFailed as exc:
+            print(f"FALLO\t{name}\t{exc}")
+            failures.append(name)
+            continue
+        results[name] = result.summary()
+        summary = results[name]
+        print(
+            f"{name:22} mediana {summary['median_seconds'] * 1000:9.1f} ms"
+            f"  min {summary['min_seconds'] * 1000:9.1f} ms"
+            f"  {summary['items_per_second'] or 0:10.1f} elem/s"
+        )
+
+    regressions: list[str] = []
+    if args.compare:
+        if not args.baseline.exists():
+            raise SystemExit(f"No existe la referencia {args.baseline}; genera una con --save-baseline")
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        if args.baseline.exists():
+            previous = json.loads(args.baseline.read_text(encoding="utf-8"))
+            report["results"] = {**previous.get("results", {}), **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Referencia guardada en {args.baseline}")
+
+    for line in regressions:
+        print(f"REGRESION\t{line}")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
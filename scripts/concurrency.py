@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Limite adaptativo de peticiones HTTP en vuelo (AIMD).
+
+Los scrapers tenian el numero de hilos fijado a mano (`MAX_WORKERS`, ajustado
+a prueba y error para GitHub Actions). `AdaptiveLimiter` lo ajusta solo:
+
+- Cada respuesta sana suma `1 / limite` (un hueco mas por cada "ventana" de
+  peticiones completada), hasta `maximum`.
+- Un timeout, error de conexion, 429 o 5xx (tambien los que urllib3 reintenta
+  por su cuenta) multiplica el limite por `decrease_factor`. Tras un recorte
+  hay una pausa de `cooldown_seconds` para que las peticiones que ya estaban
+  en vuelo no lo hundan de golpe.
+- Si la latencia pasa de `latency_tolerance` veces la latencia base (una
+  media lenta que sigue a los minimos) el limite baja un poco (x0.9): el
+  servidor empieza a encolar antes de fallar.
+
+Los hilos del pool pueden ser mas que el limite; cada peticion espera hueco
+en `slot()`. `run_metrics.instrument_session(..., limiter=...)` lo aplica a
+todas las peticiones de una sesion, y el limite actual, el maximo alcanzado y
+los recortes quedan en las metricas (`concurrency_limit`,
+`concurrency_limit_peak`, `concurrency_decreases`).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+LATENCY_DECREASE_FACTOR = 0.9
+# Por debajo de esta latencia no se recorta por lentitud: el ruido pesa mas que la senal.
+MIN_LATENCY_SIGNAL_SECONDS = 0.05
+BASELINE_DRIFT = 0.05
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        *,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        cooldown_seconds: float = 1.0,
+        metrics: Any = None,
+        stage: str = "",
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.peak = self.limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown_seconds = cooldown_seconds
+        self.metrics = metrics
+        self.stage = stage
+        self.in_flight = 0
+        self.baseline: float | None = None
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+        self._publish()
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self, latency: float) -> None:
+        with self._condition:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - self.baseline) * BASELINE_DRIFT
+
+            if latency > MIN_LATENCY_SIGNAL_SECONDS and latency > self.baseline * self.latency_tolerance:
+                self._decrease(LATENCY_DECREASE_FACTOR, "latency")
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                self.peak = max(self.peak, self.limit)
+                # Al subir de entero hay un hueco nuevo para los hilos que esperan.
+                self._condition.notify_all()
+            self._publish()
+
+    def on_overload(self, reason: str) -> None:
+        with self._condition:
+            self._decrease(self.decrease_factor, reason)
+            self._publish()
+
+    def _decrease(self, factor: float, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * factor)
+        if self.metrics is not None:
+            self.metrics.count("concurrency_decreases", stage=self.stage, reason=reason)
+
+    def _publish(self) -> None:
+        if self.metrics is not None:
+            self.metrics.set_gauge("concurrency_limit", round(self.limit, 2), stage=self.stage)
+            self.metrics.set_gauge("concurrency_limit_peak", round(self.peak, 2), stage=self.stage)
+
+    def describe(self) -> str:
+        return f"límite {self.limit:.1f} (máximo alcanzado {self.peak:.1f}, tope {self.maximum})"
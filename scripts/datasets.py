@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Acceso comun a los datasets de `data/`, indexados por codigo de propuesta.
+
+`Datasets` carga cada fichero una sola vez, al primer uso, y lo indexa por
+codigo, asi que cualquier cruce entre ficheros es una busqueda en un dict:
+
+- `proposals_data.json`: `proposals` (en su orden) y `proposal(code)`.
+- `proposals_metadata.json`: `metadata(code)`. Hay codigos repetidos; gana la
+  primera entrada, igual que el `find` que hacia el frontend.
+- `mesa-final-unificado.csv`: `mesa_row(code)`.
+- `finales.json` (ver `scrape_finales.py`): `final(code)`, con el importe en
+  centimos.
+
+`load_zone_caps` lee `zone_caps.json`, la tabla de topes por zona que se
+mantiene a mano, para `scrape_finales.py`, `project_winners.py` y
+`simulate_outcomes.py`.
+
+`joined(code)` devuelve la vista unida de una propuesta y `write_joined`
+vuelca todas en `data/cache/proposals_joined.json`, en columnas como el resto
+de artefactos (`columns`, `rows`, `index.by_code`).
+
+    python3 scripts/datasets.py          # escribe el artefacto unido
+    python3 scripts/datasets.py 8486     # muestra la vista unida de una propuesta
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Iterable
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = ROOT / "data"
+DEFAULT_JOINED_JSON = DATA_DIR / "cache" / "proposals_joined.json"
+DEFAULT_ZONE_CAPS_JSON = DATA_DIR / "zone_caps.json"
+FORMAT_VERSION = 1
+
+JOINED_COLUMNS = [
+    "code",
+    "title",
+    "zone_id",
+    "zone",
+    "votes",
+    "url",
+    "category",
+    "tags",
+    "summary",
+    "urgent",
+    "mesa_status",
+    "mesa_discarded",
+    "exclusion_type",
+    "in_final",
+    "final_amount_cents",
+]
+
+
+def normalize_code(value: Any) -> str:
+    return str(value or "").strip()
+
+
+def index_by_code(records: Iterable[dict[str, Any]], key: str = "code") -> dict[str, dict[str, Any]]:
+    """Indexa por codigo; los registros sin codigo se ignoran y, si se repite, gana el primero."""
+    index: dict[str, dict[str, Any]] = {}
+    for record in records:
+        code = normalize_code(record.get(key))
+        if code and code not in index:
+            index[code] = record
+    return index
+
+
+def to_int(value: Any) -> int | None:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def load_zone_caps(path: Path = DEFAULT_ZONE_CAPS_JSON) -> dict[str, int]:
+    """Tope en centimos de cada zona de la tabla; las zonas aun sin anotar (null) no aparecen."""
+    if not path.exists():
+        return {}
+    table = json.loads(path.read_text(encoding="utf-8"))
+    return {zone["name"]: int(zone["cap_cents"]) for zone in table.get("zones", []) if zone.get("cap_cents") is not None}
+
+
+class Datasets:
+    def __init__(self, data_dir: Path = DATA_DIR) -> None:
+        self.data_dir = Path(data_dir)
+        self.proposals_json = self.data_dir / "proposals_data.json"
+        self.metadata_json = self.data_dir / "proposals_metadata.json"
+        self.mesa_csv = self.data_dir / "mesa-final-unificado.csv"
+        self.finales_json = self.data_dir / "finales.json"
+
+    @staticmethod
+    def _read_json(path: Path, default: Any) -> Any:
+        if not path.exists():
+            return default
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    @cached_property
+    def proposals(self) -> list[dict[str, Any]]:
+        return self._read_json(self.proposals_json, [])
+
+    @cached_property
+    def proposals_by_code(self) -> dict[str, dict[str, Any]]:
+        return index_by_code(self.proposals)
+
+    @cached_property
+    def metadata_by_code(self) -> dict[str, dict[str, Any]]:
+        return index_by_code(self._read_json(self.metadata_json, []))
+
+    @cached_property
+    def mesa_by_code(self) -> dict[str, dict[str, str]]:
+        if not self.mesa_csv.exists():
+            return {}
+        with self.mesa_csv.open(encoding="utf-8", newline="") as fh:
+            return index_by_code(csv.DictReader(fh), key="propuesta_id")
+
+    @cached_property
+    def finals_by_code(self) -> dict[str, dict[str, Any]]:
+        finales = self._read_json(self.finales_json, None)
+        if not finales:
+            return {}
+        columns = finales["columns"]
+        return {
+            code: dict(zip(columns, finales["rows"][row]))
+            for code, row in finales["index"]["by_code"].items()
+        }
+
+    def proposal(self, code: Any) -> dict[str, Any] | None:
+        return self.proposals_by_code.get(normalize_code(code))
+
+    def metadata(self, code: Any) -> dict[str, Any] | None:
+        return self.metadata_by_code.get(normalize_code(code))
+
+    def mesa_row(self, code: Any) -> dict[str, str] | None:
+        return self.mesa_by_code.get(normalize_code(code))
+
+    def final(self, code: Any) -> dict[str, Any] | None:
+        return self.finals_by_code.get(normalize_code(code))
+
+    def _join(self, code: str) -> dict[str, Any]:
+        proposal = self.proposals_by_code.get(code) or {}
+        meta = self.metadata_by_code.get(code) or {}
+        mesa = self.mesa_by_code.get(code) or {}
+        final = self.finals_by_code.get(code)
+        return {
+            "code": code,
+            "title": proposal.get("title") or mesa.get("titulo_propuesta") or (final or {}).get("title") or "",
+            "zone_id": to_int(proposal.get("zone_id")),
+            "zone": proposal.get("zone") or mesa.get("zona") or (final or {}).get("zone"),
+            "votes": to_int(proposal.get("votes")) or 0,
+            "url": proposal.get("url") or mesa.get("enlace") or (final or {}).get("url"),
+            "category": meta.get("category"),
+            "tags": meta.get("tags") or [],
+            "summary": meta.get("summary"),
+            "urgent": bool(meta.get("urgent")),
+            "mesa_status": mesa.get("situacion") or None,
+            "mesa_discarded": mesa.get("aparece_descartada_en_mesa") == "SI" if mesa else None,
+            "exclusion_type": mesa.get("tipo_razon_exclusion") or None,
+            "in_final": final is not None,
+            "final_amount_cents": (final or {}).get("amount_cents"),
+        }
+
+    @cached_property
+    def joined_by_code(self) -> dict[str, dict[str, Any]]:
+        # Orden estable: propuestas, luego filas de mesa y del listado final que no esten en ellas.
+        codes = dict.fromkeys([*self.proposals_by_code, *self.mesa_by_code, *self.finals_by_code])
+        return {code: self._join(code) for code in codes}
+
+    def joined(self, code: Any) -> dict[str, Any] | None:
+        return self.joined_by_code.get(normalize_code(code))
+
+    def joined_artifact(self) -> dict[str, Any]:
+        views = list(self.joined_by_code.values())
+        return {
+            "version": FORMAT_VERSION,
+            "counts": {
+                "proposals": len(self.proposals_by_code),
+                "metadata": len(self.metadata_by_code),
+                "mesa": len(self.mesa_by_code),
+                "finales": len(self.finals_by_code),
+            },
+            "columns": JOINED_COLUMNS,
+            "rows": [[view[column] for column in JOINED_COLUMNS] for view in views],
+            "index": {"by_code": {view["code"]: position for position, view in enumerate(views)}},
+        }
+
+    def write_joined(self, path: Path = DEFAULT_JOINED_JSON) -> dict[str, Any]:
+        artifact = self.joined_artifact()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(artifact, ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+        return artifact
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Vista unida de los datasets por codigo de propuesta")
+    parser.add_argument("codes", nargs="*", help="Codigos a mostrar (sin codigos, escribe el artefacto)")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output", type=Path, default=DEFAULT_JOINED_JSON)
+    args = parser.parse_args()
+
+    datasets = Datasets(args.data_dir)
+    if args.codes:
+        for code in args.codes:
+            print(json.dumps(datasets.joined(code), ensure_ascii=False, indent=2))
+        return 0
+
+    artifact = datasets.write_joined(args.output)
+    counts = ", ".join(f"{name}: {count}" for name, count in artifact["counts"].items())
+    print(f"Propuestas unidas: {len(artifact['rows'])} ({counts})")
+    print(f"Guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,10 +4,15 @@
 Reglas:
 - Lee la ficha publica de cada propuesta y busca el bloque
   `Informe de inviabilidad`.
+- Antes de ir a la web usa `inviability_report` de `proposals_data.json` y la
+  cache local de fichas ya leidas (con caducidad), de modo que solo se piden
+  las fichas que faltan o han caducado.
 - Si existe, guarda su texto en `razon_exclusion`.
 - Siempre guarda la propia URL de la propuesta en
   `informe_inviabilidad_url` cuando la razon se ha tomado de la ficha.
 - Si no hay bloque web, intenta derivar una razon corta desde el acta.
+- La clasificacion del motivo sale de `data/exclusion_reason_rules.json`
+  (categoria -> frases, por orden de prioridad), editable sin tocar codigo.
 """
 
 from __future__ import annotations
@@ -18,18 +23,32 @@ import json
 import re
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
 import requests
 from bs4 import BeautifulSoup
 
+from concurrency import AdaptiveLimiter
+from datasets import index_by_code
+from profiling import profile_run
+from run_metrics import RunMetrics, instrument_session
+from site_config import site_url
+
 ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_MESA_CSV = ROOT / "data" / "mesa-final-unificado.csv"
 DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_RULES_JSON = ROOT / "data" / "exclusion_reason_rules.json"
+DEFAULT_CACHE_JSON = ROOT / "data" / "cache" / "inviability_reasons.json"
+DEFAULT_CACHE_TTL_HOURS = 24
 REQUEST_DELAY_SECONDS = 0.2
 REQUEST_TIMEOUT_SECONDS = 20
-MAX_WORKERS = 8
+# Peticiones en vuelo: AdaptiveLimiter parte de INITIAL_CONCURRENCY y sube hasta MAX_CONCURRENCY
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 12
 TARGET_STATUSES = {
     "Mesa pero no final",
     "Descartada por mesa y fuera de la final",
@@ -60,149 +79,145 @@ def clean_reason_prefix(text: str, proposal_id: str) -> str:
     return cleaned.strip(" .;")
 
 
+def trie_pattern(phrases: list[str]) -> str:
+    """Expresion regular equivalente a `a|b|c...` con los prefijos comunes factorizados.
+
+    El motor de `re` prueba las alternativas una a una; al agrupar por prefijo,
+    cada posicion del texto se descarta tras comparar unos pocos caracteres en
+    lugar de uno por frase. Las continuaciones opcionales son voraces, asi que
+    en cada posicion se obtiene la frase mas larga.
+    """
+    trie: dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict[str, Any]) -> str:
+        ends_here = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+@dataclass(frozen=True)
+class PhraseMatcher:
+    """Busca en una sola pasada cual de varias frases etiquetadas aparece en un texto.
+
+    Las frases se compilan en una unica expresion tipo trie dentro de un
+    lookahead, para probar todas las posiciones de inicio aunque las
+    coincidencias se solapen. Cada frase encontrada se resuelve a su etiqueta
+    con un diccionario; si varias etiquetas aparecen gana la de menor rango
+    (el orden del fichero de reglas).
+    """
+
+    pattern: re.Pattern[str]
+    ranks: dict[str, tuple[int, str, str]]
+
+    @classmethod
+    def compile(cls, groups: list[tuple[str, list[str]]]) -> PhraseMatcher:
+        ranks: dict[str, tuple[int, str, str]] = {}
+        for rank, (label, phrases) in enumerate(groups):
+            for phrase in phrases:
+                key = phrase.lower()
+                ranks.setdefault(key, (rank, label, key))
+
+        # Una frase mas larga oculta en su posicion a las frases que son prefijo
+        # suyo; hereda su rango si es mejor.
+        for key in list(ranks):
+            for end in range(1, len(key)):
+                prefix = ranks.get(key[:end])
+                if prefix and prefix[0] < ranks[key][0]:
+                    ranks[key] = prefix
+
+        body = trie_pattern(list(ranks)) if ranks else r"(?!x)x"
+        # El texto se pasa a minusculas antes de buscar; es mas rapido que IGNORECASE.
+        return cls(re.compile(f"(?=({body}))"), ranks)
+
+    def search(self, text: str) -> tuple[str, str] | None:
+        """Devuelve `(etiqueta, frase)` de la coincidencia de mayor prioridad."""
+        best: tuple[int, str, str] | None = None
+        for match in self.pattern.finditer(text.lower()):
+            found = self.ranks.get(match.group(1))
+            if found and (best is None or found[0] < best[0]):
+                best = found
+                if best[0] == 0:
+                    break
+        return (best[1], best[2]) if best else None
+
+
+@dataclass(frozen=True)
+class ExclusionRules:
+    categories: PhraseMatcher
+    default_category: str
+    acta_placeholders: PhraseMatcher
+    extract_blockers: PhraseMatcher
+
+
+def compile_rules(raw: dict[str, Any]) -> ExclusionRules:
+    return ExclusionRules(
+        categories=PhraseMatcher.compile(
+            [(entry["category"], entry["phrases"]) for entry in raw.get("categories", [])]
+        ),
+        default_category=raw.get("default_category", ""),
+        acta_placeholders=PhraseMatcher.compile([("placeholder", raw.get("acta_placeholder_markers", []))]),
+        extract_blockers=PhraseMatcher.compile([("blocker", raw.get("extract_blockers", []))]),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_rules(path: Path = DEFAULT_RULES_JSON) -> ExclusionRules:
+    return compile_rules(json.loads(path.read_text(encoding="utf-8")))
+
+
 def infer_reason_from_extract(extract: str, proposal_id: str) -> str:
     cleaned = clean_reason_prefix(extract, proposal_id)
     if not cleaned:
         return ""
 
     # Evita usar textos meramente descriptivos del match en acta.
-    blockers = (
-        "id detectada en tabla/listado",
-        "figura en la tabla de priorizadas",
-        "cargando",
-    )
-    lowered = cleaned.lower()
-    if any(blocker in lowered for blocker in blockers):
+    if load_rules().extract_blockers.search(cleaned):
         return ""
     return cleaned
 
 
 def looks_like_acta_placeholder(text: str) -> bool:
-    lowered = normalize_text(text).lower()
-    if not lowered:
+    cleaned = normalize_text(text)
+    if not cleaned:
         return False
-    markers = (
-        "acta zona",
-        "figura en la tabla de propuestas",
-        "id detectada en tabla/listado",
-        "figura en la relación final",
-    )
-    return any(marker in lowered for marker in markers)
+    return load_rules().acta_placeholders.search(cleaned) is not None
 
 
-def classify_exclusion_reason(reason: str) -> str:
-    lowered = normalize_text(reason).lower()
-    if not lowered:
-        return ""
+def match_exclusion_reason(reason: str) -> tuple[str, str]:
+    """Devuelve la categoria del motivo y la frase de las reglas que la decide.
+
+    Si ninguna frase coincide se devuelve la categoria por defecto y una frase
+    vacia.
+    """
+    cleaned = normalize_text(reason)
+    if not cleaned:
+        return "", ""
 
-    if any(phrase in lowered for phrase in (
-        "mantenimiento ordinario",
-        "actuación de mantenimiento",
-        "mantenimiento general",
-        "mantenimiento primario",
-        "debe estar incluida en los presupuestos generales ordinarios",
-        "parte del mantenimiento del ayuntamiento",
-        "no debe ser una inversión municipal",
-        "no una mejora para la ciudad",
-    )):
-        return "Mantenimiento ordinario"
-
-    if any(phrase in lowered for phrase in (
-        "ya se encuentra en funcionamiento",
-        "ya se encuentra en marcha",
-        "ya se ha realizado",
-        "ya se ejecuta",
-        "ya incluida en el proyecto",
-        "existe una reurbanización prevista",
-        "en ejecución en la actualidad",
-        "se va a instalar",
-        "ya cuenta con",
-        "ya existen",
-        "hay un proyecto",
-        "se está acometiendo",
-        "se va a ejecutar",
-        "ya no tiene repercusión",
-    )):
-        return "Ya previsto o en ejecución"
-
-    if any(phrase in lowered for phrase in (
-        "no se considera necesario",
-        "no considera necesaria",
-        "no se considera conveniente",
-        "hacen innecesaria la intervención",
-        "no debe llevarse a cabo ninguna actuación",
-        "no es prioridad",
-        "prioriza otras opciones",
-        "no se considera viable la intervención y prioriza otras opciones",
-        "no cree conveniente",
-        "no favorezca al común de la ciudadanía",
-        "no justifica la intervención",
-        "supone más peligrosidad que beneficio",
-        "el parque existente se puede usar perfectamente",
-        "se debe mantener como está",
-    )):
-        return "Sin motivo suficiente"
-
-    if any(phrase in lowered for phrase in (
-        "excede el millón",
-        "excede del millón",
-        "supera el millón",
-        "superior al presupuesto asignado",
-        "más de un millón",
-        "presupuesto sería más de un millón",
-        "presupuesto excedería del millón",
-        "inviable por espacio",
-        "elevado coste de mantenimiento",
-        "interferencias con otras infraestructuras",
-        "no es viable",
-        "inviable técnicamente",
-        "problemas que los provocados",
-        "reducción del número de plazas de aparcamiento",
-        "no permite el tránsito de los autobuses",
-        "falta de espacio",
-        "difícil de llevar a cabo",
-        "elevados costes de mantenimiento y gestión",
-        "obra arquitectónica de diseño",
-        "impide su derribo",
-    )):
-        return "Inviabilidad técnica o económica"
-
-    if any(phrase in lowered for phrase in (
-        "no es competencia municipal",
-        "no son titulares de la vía",
-        "junta de castilla y león",
-        "patrimonio no permite",
-        "debe ser el ayuntamiento quien",
-        "no se corresponde con competencias municipales",
-        "no corresponde al marco de presupuestos participativos",
-        "no admisible",
-        "no admisible, y con carácter previo",
-        "no es un proyecto de zona sino de ciudad",
-        "no es un proyecto de zona",
-        "inconcreción de la propuesta",
-        "sin descripción ni justificación",
-        "sin incorporar descripción ni justificación",
-        "no concreta el lugar",
-        "no da un lugar de actuación concreto",
-        "no permite identificar con claridad la actuación",
-        "no se encuentra suficientemente motivada",
-        "no atiende las necesidades del barrio-zona",
-        "fuera del ámbito",
-        "no se corresponde al marco",
-    )):
-        return "Competencia o encaje legal"
-
-    return "Competencia o encaje legal"
+    rules = load_rules()
+    match = rules.categories.search(cleaned)
+    if match is None:
+        return rules.default_category, ""
+    return match
+
+
+def classify_exclusion_reason(reason: str) -> str:
+    return match_exclusion_reason(reason)[0]
 
 
 def load_proposals(path: Path) -> dict[str, dict[str, Any]]:
-    proposals = json.loads(path.read_text(encoding="utf-8"))
-    by_code: dict[str, dict[str, Any]] = {}
-    for proposal in proposals:
-        code = get_proposal_code(proposal)
-        if code:
-            by_code[code] = proposal
-    return by_code
+    return index_by_code(json.loads(path.read_text(encoding="utf-8")))
 
 
 def extract_inviability_reason_from_html(html: str) -> str:
@@ -222,9 +237,9 @@ def extract_inviability_reason_from_html(html: str) -> str:
     return ""
 
 
-def fetch_inviability_reason(url: str) -> str:
-    response = requests.get(
-        url,
+def fetch_inviability_reason(url: str, session: requests.Session | None = None) -> str:
+    response = (session or requests).get(
+        site_url(url),
         timeout=REQUEST_TIMEOUT_SECONDS,
         headers={
             "User-Agent": "aldeapucela-participativos2027/1.0 (+https://aldeapucela.org)",
@@ -234,53 +249,115 @@ def fetch_inviability_reason(url: str) -> str:
     return extract_inviability_reason_from_html(response.text)
 
 
+def load_reason_cache(path: Path) -> dict[str, dict[str, str]]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_reason_cache(path: Path, cache: dict[str, dict[str, str]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(cache, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def is_cache_fresh(entry: dict[str, str] | None, ttl: timedelta) -> bool:
+    if not entry:
+        return False
+    try:
+        fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return datetime.now() - fetched_at < ttl
+
+
+def has_web_reason(row: dict[str, str], source_url: str) -> bool:
+    """La fila ya tiene un motivo leido de la propia ficha en una ejecucion anterior."""
+    return (
+        bool(source_url)
+        and normalize_text(row.get("informe_inviabilidad_url")) == source_url
+        and bool(normalize_text(row.get("razon_exclusion")))
+    )
+
+
 def enrich_rows(
     rows: list[dict[str, str]],
     proposals_by_code: dict[str, dict[str, Any]],
     *,
     skip_web: bool = False,
+    reason_cache: dict[str, dict[str, str]] | None = None,
+    cache_ttl: timedelta = timedelta(hours=DEFAULT_CACHE_TTL_HOURS),
+    refresh_web: bool = False,
+    metrics: RunMetrics | None = None,
 ) -> tuple[list[dict[str, str]], int, dict[str, int]]:
     changed = 0
-    fetched_reasons: dict[str, str] = {}
+    reason_cache = {} if reason_cache is None else reason_cache
     stats = {
         "target_rows": 0,
         "web_reason_rows": 0,
         "acta_fallback_rows": 0,
         "missing_reason_rows": 0,
+        "store_reason_rows": 0,
+        "cached_reason_rows": 0,
+        "fetched_urls": 0,
     }
 
-    fetch_targets: dict[str, str] = {}
+    targets: list[tuple[dict[str, str], str, str]] = []
+    web_reasons: dict[str, str] = {}
+    fetch_urls: set[str] = set()
     for row in rows:
         if row.get("situacion") not in TARGET_STATUSES:
             continue
         stats["target_rows"] += 1
         proposal_id = normalize_text(row.get("propuesta_id"))
-        proposal = proposals_by_code.get(proposal_id)
-        source_url = normalize_text(row.get("enlace")) or normalize_text(proposal.get("url") if proposal else "")
-        if source_url:
-            fetch_targets[proposal_id] = source_url
-
-    if not skip_web:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_id = {
-                executor.submit(fetch_inviability_reason, source_url): proposal_id
-                for proposal_id, source_url in fetch_targets.items()
+        proposal = proposals_by_code.get(proposal_id) or {}
+        source_url = normalize_text(row.get("enlace")) or normalize_text(proposal.get("url"))
+        targets.append((row, proposal_id, source_url))
+
+        stored_reason = normalize_text(proposal.get("inviability_report"))
+        if stored_reason:
+            web_reasons[proposal_id] = stored_reason
+            stats["store_reason_rows"] += 1
+        elif skip_web or not source_url:
+            continue
+        elif not refresh_web and has_web_reason(row, source_url):
+            web_reasons[proposal_id] = normalize_text(row.get("razon_exclusion"))
+            stats["cached_reason_rows"] += 1
+        elif not refresh_web and is_cache_fresh(reason_cache.get(source_url), cache_ttl):
+            web_reasons[proposal_id] = reason_cache[source_url].get("reason", "")
+            stats["cached_reason_rows"] += 1
+        else:
+            fetch_urls.add(source_url)
+
+    if fetch_urls:
+        metrics = metrics if metrics is not None else RunMetrics("enrich_mesa_exclusion_reasons")
+        limiter = AdaptiveLimiter(INITIAL_CONCURRENCY, maximum=MAX_CONCURRENCY, metrics=metrics, stage="enrich")
+        session = requests.Session()
+        instrument_session(session, metrics, "enrich", limiter=limiter)
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+            future_to_url = {
+                executor.submit(fetch_inviability_reason, source_url, session): source_url
+                for source_url in fetch_urls
             }
-            for future in as_completed(future_to_id):
-                proposal_id = future_to_id[future]
+            for future in as_completed(future_to_url):
+                source_url = future_to_url[future]
                 try:
-                    fetched_reasons[proposal_id] = future.result()
+                    reason = future.result()
                 except requests.RequestException:
-                    fetched_reasons[proposal_id] = ""
+                    continue
+                reason_cache[source_url] = {
+                    "reason": reason,
+                    "fetched_at": datetime.now().isoformat(timespec="seconds"),
+                }
+                stats["fetched_urls"] += 1
                 time.sleep(REQUEST_DELAY_SECONDS)
 
-    for row in rows:
-        if row.get("situacion") not in TARGET_STATUSES:
-            continue
-        proposal_id = normalize_text(row.get("propuesta_id"))
-        proposal = proposals_by_code.get(proposal_id)
-        source_url = normalize_text(row.get("enlace")) or normalize_text(proposal.get("url") if proposal else "")
-        fetched_reason = fetched_reasons.get(proposal_id, "")
+    for row, proposal_id, source_url in targets:
+        fetched_reason = web_reasons.get(proposal_id, "")
+        if not fetched_reason and source_url in fetch_urls:
+            fetched_reason = reason_cache.get(source_url, {}).get("reason", "")
 
         current_reason = normalize_text(row.get("razon_exclusion"))
         if fetched_reason:
@@ -333,19 +410,64 @@ def main() -> int:
     parser.add_argument("--mesa-csv", type=Path, default=DEFAULT_MESA_CSV)
     parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
     parser.add_argument("--skip-web", action="store_true")
+    parser.add_argument("--cache-json", type=Path, default=DEFAULT_CACHE_JSON)
+    parser.add_argument("--cache-ttl-hours", type=float, default=DEFAULT_CACHE_TTL_HOURS)
+    parser.add_argument(
+        "--refresh-web",
+        action="store_true",
+        help="Vuelve a leer todas las fichas aunque ya haya motivo web o cache vigente",
+    )
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Resumen JSON de tiempos por etapa y cache")
+    parser.add_argument("--prometheus", type=Path, default=None, help="Mismas metricas en formato Prometheus")
+    parser.add_argument("--profile", action="store_true", help="Perfila la ejecucion y guarda el perfil en logs/")
     args = parser.parse_args()
 
-    with args.mesa_csv.open(encoding="utf-8", newline="") as fh:
-        rows = list(csv.DictReader(fh))
-
-    proposals_by_code = load_proposals(args.proposals_json)
-    enriched_rows, changed, stats = enrich_rows(rows, proposals_by_code, skip_web=args.skip_web)
-    write_csv(args.mesa_csv, enriched_rows)
+    if args.profile:
+        with profile_run("enrich_mesa_exclusion_reasons"):
+            return run(args)
+    return run(args)
+
+
+def run(args: argparse.Namespace) -> int:
+    metrics = RunMetrics("enrich_mesa_exclusion_reasons")
+    with metrics.stage("load"):
+        with args.mesa_csv.open(encoding="utf-8", newline="") as fh:
+            rows = list(csv.DictReader(fh))
+
+        proposals_by_code = load_proposals(args.proposals_json)
+        reason_cache = load_reason_cache(args.cache_json)
+    with metrics.stage("enrich"):
+        enriched_rows, changed, stats = enrich_rows(
+            rows,
+            proposals_by_code,
+            skip_web=args.skip_web,
+            reason_cache=reason_cache,
+            cache_ttl=timedelta(hours=args.cache_ttl_hours),
+            refresh_web=args.refresh_web,
+            metrics=metrics,
+        )
+    with metrics.stage("write"):
+        write_csv(args.mesa_csv, enriched_rows)
+        if stats["fetched_urls"]:
+            save_reason_cache(args.cache_json, reason_cache)
+
+    metrics.count("cache_lookups", stats["store_reason_rows"], cache="proposals_data", result="hit")
+    metrics.count("cache_lookups", stats["cached_reason_rows"], cache="inviability_reasons", result="hit")
+    metrics.count("cache_lookups", stats["fetched_urls"], cache="inviability_reasons", result="miss")
+    for name, value in stats.items():
+        metrics.set_gauge("rows", value, kind=name)
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
 
     print(f"Filas procesadas: {len(enriched_rows)}")
     print(f"Filas actualizadas: {changed}")
     print(f"Filas objetivo (mesa/no final o descartadas fuera final): {stats['target_rows']}")
     print(f"Con motivo extraido de la web: {stats['web_reason_rows']}")
+    print(f"  de ellas desde proposals_data.json: {stats['store_reason_rows']}")
+    print(f"  de ellas desde cache / ejecuciones previas: {stats['cached_reason_rows']}")
+    print(f"  fichas descargadas en esta ejecucion: {stats['fetched_urls']}")
     print(f"Con motivo provisional desde acta: {stats['acta_fallback_rows']}")
     print(f"Sin motivo localizado todavia: {stats['missing_reason_rows']}")
     return 0
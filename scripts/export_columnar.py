@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""Exportacion columnar tipada de `data/proposals_data.json`.
+
+El JSON con sangria y el CSV son lentos de leer y el CSV pierde los tipos:
+las listas acaban como texto y la cabecera dependia de la primera fila. Aqui
+el esquema es fijo (`SCHEMA`) y cada columna se guarda con su tipo:
+
+- `zone` y los elementos de `categories` van codificados con diccionario
+  (un indice entero por fila y la lista de valores distintos una sola vez).
+- `categories` es una lista de categorias y `documents` una lista de
+  `{url, title}`, sin pasar por texto.
+- `date` es una fecha (dias desde 1970-01-01), `zone_id` y `votes` enteros y
+  `latitude` / `longitude` reales; los vacios son nulos, no cadenas vacias.
+
+Formatos:
+
+- `parquet` (si esta instalado pyarrow): `data/proposals_data.parquet`, se
+  lee con `pandas.read_parquet`, `pyarrow`, DuckDB o Polars.
+- `packed` (sin dependencias): `data/proposals_data.cols`. Cabecera JSON con
+  el esquema, los diccionarios y la posicion de cada buffer; despues los
+  buffers little-endian alineados a 8 bytes (validez en bits, offsets uint32
+  y valores), que se pueden mapear tal cual con `numpy.frombuffer`. Solo el
+  texto (`data`) va comprimido con zlib.
+  `read_packed` lo lee en Python, solo las columnas pedidas.
+
+Con `--format auto` (por defecto) se usa Parquet si hay pyarrow.
+
+    python3 scripts/export_columnar.py
+    python3 scripts/export_columnar.py --format packed --compare-csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import struct
+import sys
+import time
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import IO, Any, Iterable
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_PARQUET = ROOT / "data" / "proposals_data.parquet"
+DEFAULT_PACKED = ROOT / "data" / "proposals_data.cols"
+FORMAT_VERSION = 1
+FORMATS = ("auto", "parquet", "packed")
+
+PACKED_MAGIC = b"PPCOLS1\n"
+ALIGNMENT = 8
+COMPRESSION_LEVEL = 6
+EPOCH = date(1970, 1, 1)
+DATE_FORMAT = "%d/%m/%Y"
+
+# Orden y tipo de cada campo de una propuesta (el de scrape_proposal_details).
+SCHEMA = [
+    ("url", "string"),
+    ("code", "string"),
+    ("zone", "dictionary<int8>"),
+    ("zone_id", "int8"),
+    ("date", "date32"),
+    ("title", "string"),
+    ("author", "string"),
+    ("description", "string"),
+    ("address", "string"),
+    ("image_url", "string"),
+    ("documents", "list<document>"),
+    ("categories", "list<dictionary<int16>>"),
+    ("latitude", "float64"),
+    ("longitude", "float64"),
+    ("votes", "int32"),
+    ("inviability_report", "string"),
+]
+CSV_FIELDS = [name for name, _ in SCHEMA]
+DOCUMENT_FIELDS = ["url", "title"]
+
+# Codigos de `array` de cada tipo numerico; todos con el mismo tamano en cualquier plataforma.
+TYPECODES = {"int8": "b", "int16": "h", "int32": "i", "uint32": "I", "float64": "d"}
+
+
+def csv_value(value: Any) -> Any:
+    """Listas y diccionarios como JSON (no como repr de Python); None como vacio."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def dump_csv(fh: IO[str], proposals: list[dict[str, Any]]) -> None:
+    """CSV con las columnas de `SCHEMA` y, detras, cualquier campo que no este en el."""
+    extra = [key for key in dict.fromkeys(key for proposal in proposals for key in proposal) if key not in CSV_FIELDS]
+    writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS + extra)
+    writer.writeheader()
+    for proposal in proposals:
+        writer.writerow({key: csv_value(value) for key, value in proposal.items()})
+
+
+def write_csv(path: str | Path, proposals: list[dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        dump_csv(fh, proposals)
+
+
+def parse_date(value: Any) -> int | None:
+    if not value:
+        return None
+    try:
+        return (datetime.strptime(str(value).strip(), DATE_FORMAT).date() - EPOCH).days
+    except ValueError:
+        return None
+
+
+def to_number(value: Any, kind: type) -> Any:
+    if value is None or value == "":
+        return None
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_text(value: Any) -> str | None:
+    return None if value is None else str(value)
+
+
+@dataclass
+class Table:
+    """Columnas ya tipadas en Python: el paso comun a Parquet y al formato propio."""
+
+    rows: int
+    columns: dict[str, Any]
+    dictionaries: dict[str, list[str]] = field(default_factory=dict)
+
+
+class Dictionary:
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self.positions: dict[str, int] = {}
+
+    def encode(self, value: Any) -> int | None:
+        if value is None or value == "":
+            return None
+        value = str(value)
+        position = self.positions.get(value)
+        if position is None:
+            position = self.positions[value] = len(self.values)
+            self.values.append(value)
+        return position
+
+
+def columnarize(proposals: list[dict[str, Any]]) -> Table:
+    columns: dict[str, Any] = {}
+    dictionaries = {}
+    for name, kind in SCHEMA:
+        values = [proposal.get(name) for proposal in proposals]
+        if kind == "string":
+            columns[name] = [to_text(value) for value in values]
+        elif kind == "date32":
+            columns[name] = [parse_date(value) for value in values]
+        elif kind == "float64":
+            columns[name] = [to_number(value, float) for value in values]
+        elif kind in ("int8", "int32"):
+            columns[name] = [to_number(value, int) for value in values]
+        elif kind == "dictionary<int8>":
+            dictionary = Dictionary()
+            columns[name] = [dictionary.encode(value) for value in values]
+            dictionaries[name] = dictionary.values
+        elif kind == "list<dictionary<int16>>":
+            dictionary = Dictionary()
+            offsets, indices = [0], []
+            for items in values:
+                indices.extend(index for index in map(dictionary.encode, items or []) if index is not None)
+                offsets.append(len(indices))
+            columns[name] = (offsets, indices)
+            dictionaries[name] = dictionary.values
+        elif kind == "list<document>":
+            offsets, urls, titles = [0], [], []
+            for documents in values:
+                for document in documents or []:
+                    urls.append(to_text(document.get("url")))
+                    titles.append(to_text(document.get("title")))
+                offsets.append(len(urls))
+            columns[name] = (offsets, urls, titles)
+        else:
+            raise ValueError(f"Tipo desconocido en el esquema: {kind}")
+    return Table(len(proposals), columns, dictionaries)
+
+
+# --- Parquet (pyarrow) ---
+
+
+def to_arrow(table: Table) -> Any:
+    def dictionary_array(indices: list[int | None], index_type: Any, values: list[str]) -> Any:
+        return pa.DictionaryArray.from_arrays(pa.array(indices, index_type), pa.array(values, pa.string()))
+
+    arrays = []
+    for name, kind in SCHEMA:
+        values = table.columns[name]
+        if kind == "string":
+            arrays.append(pa.array(values, pa.string()))
+        elif kind == "date32":
+            arrays.append(pa.array(values, pa.int32()).cast(pa.date32()))
+        elif kind in ("int8", "int32", "float64"):
+            arrays.append(pa.array(values, getattr(pa, kind)()))
+        elif kind == "dictionary<int8>":
+            arrays.append(dictionary_array(values, pa.int8(), table.dictionaries[name]))
+        elif kind == "list<dictionary<int16>>":
+            offsets, indices = values
+            items = dictionary_array(indices, pa.int16(), table.dictionaries[name])
+            arrays.append(pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), items))
+        elif kind == "list<document>":
+            offsets, urls, titles = values
+            items = pa.StructArray.from_arrays([pa.array(urls, pa.string()), pa.array(titles, pa.string())], names=DOCUMENT_FIELDS)
+            arrays.append(pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), items))
+    return pa.Table.from_arrays(arrays, names=CSV_FIELDS)
+
+
+def write_parquet(path: Path, table: Table) -> None:
+    if pa is None:
+        raise RuntimeError("Parquet necesita pyarrow (pip install pyarrow); usa --format packed")
+    pq.write_table(to_arrow(table), path, compression="zstd")
+
+
+# --- Formato propio (packed) ---
+
+
+def little_endian(typecode: str, values: Iterable[Any]) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def from_little_endian(typecode: str, buffer: bytes) -> list[Any]:
+    packed = array(typecode)
+    packed.frombytes(buffer)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tolist()
+
+
+def validity_bitmap(values: list[Any]) -> bytes | None:
+    """Bit i a 1 si la fila i tiene valor (orden de Arrow); None si no hay nulos."""
+    if all(value is not None for value in values):
+        return None
+    bitmap = bytearray((len(values) + 7) // 8)
+    for position, value in enumerate(values):
+        if value is not None:
+            bitmap[position >> 3] |= 1 << (position & 7)
+    return bytes(bitmap)
+
+
+def is_valid(bitmap: bytes | None, position: int) -> bool:
+    return bitmap is None or bool(bitmap[position >> 3] & (1 << (position & 7)))
+
+
+def encode_strings(prefix: str, values: list[str | None]) -> dict[str, bytes]:
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = [0]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    buffers = {f"{prefix}offsets": little_endian("I", offsets), f"{prefix}data": b"".join(encoded)}
+    bitmap = validity_bitmap(values)
+    if bitmap is not None:
+        buffers[f"{prefix}validity"] = bitmap
+    return buffers
+
+
+def decode_strings(prefix: str, buffers: dict[str, bytes], count: int) -> list[str | None]:
+    offsets = from_little_endian("I", buffers[f"{prefix}offsets"])
+    data = buffers[f"{prefix}data"]
+    bitmap = buffers.get(f"{prefix}validity")
+    return [
+        data[offsets[position]:offsets[position + 1]].decode("utf-8") if is_valid(bitmap, position) else None
+        for position in range(count)
+    ]
+
+
+def encode_column(kind: str, values: Any) -> dict[str, bytes]:
+    if kind == "string":
+        return encode_strings("", values)
+    if kind in ("int8", "int32", "float64", "date32"):
+        typecode = TYPECODES["int32" if kind == "date32" else kind]
+        buffers = {"values": little_endian(typecode, (0 if value is None else value for value in values))}
+        bitmap = validity_bitmap(values)
+        if bitmap is not None:
+            buffers["validity"] = bitmap
+        return buffers
+    if kind == "dictionary<int8>":
+        # -1: sin valor.
+        return {"indices": little_endian("b", (-1 if index is None else index for index in values))}
+    if kind == "list<dictionary<int16>>":
+        offsets, indices = values
+        return {"offsets": little_endian("I", offsets), "indices": little_endian("h", indices)}
+    if kind == "list<document>":
+        offsets, urls, titles = values
+        return {"offsets": little_endian("I", offsets), **encode_strings("url.", urls), **encode_strings("title.", titles)}
+    raise ValueError(f"Tipo desconocido en el esquema: {kind}")
+
+
+def decode_column(kind: str, buffers: dict[str, bytes], count: int, dictionary: list[str] | None) -> list[Any]:
+    if kind == "string":
+        return decode_strings("", buffers, count)
+    if kind in ("int8", "int32", "float64", "date32"):
+        values = from_little_endian(TYPECODES["int32" if kind == "date32" else kind], buffers["values"])
+        bitmap = buffers.get("validity")
+        values = [value if is_valid(bitmap, position) else None for position, value in enumerate(values)]
+        if kind == "date32":
+            return [None if value is None else date.fromordinal(EPOCH.toordinal() + value) for value in values]
+        return values
+    if kind == "dictionary<int8>":
+        return [dictionary[index] if index >= 0 else None for index in from_little_endian("b", buffers["indices"])]
+    if kind == "list<dictionary<int16>>":
+        offsets = from_little_endian("I", buffers["offsets"])
+        items = [dictionary[index] for index in from_little_endian("h", buffers["indices"])]
+        return [items[offsets[position]:offsets[position + 1]] for position in range(count)]
+    if kind == "list<document>":
+        offsets = from_little_endian("I", buffers["offsets"])
+        urls = decode_strings("url.", buffers, offsets[-1])
+        titles = decode_strings("title.", buffers, offsets[-1])
+        items = [{"url": url, "title": title} for url, title in zip(urls, titles)]
+        return [items[offsets[position]:offsets[position + 1]] for position in range(count)]
+    raise ValueError(f"Tipo desconocido en el esquema: {kind}")
+
+
+def encode_packed(table: Table) -> bytes:
+    """Cabecera (longitud uint32 + JSON) y buffers alineados; posiciones relativas al primer buffer."""
+    body = bytearray()
+    layout: dict[str, dict[str, list[Any]]] = {}
+    for name, kind in SCHEMA:
+        layout[name] = {}
+        for buffer_name, buffer in encode_column(kind, table.columns[name]).items():
+            body.extend(b"\0" * (-len(body) % ALIGNMENT))
+            if buffer_name.endswith("data"):
+                buffer = zlib.compress(buffer, COMPRESSION_LEVEL)
+                layout[name][buffer_name] = [len(body), len(buffer), "zlib"]
+            else:
+                layout[name][buffer_name] = [len(body), len(buffer)]
+            body.extend(buffer)
+    header = json.dumps(
+        {
+            "version": FORMAT_VERSION,
+            "rows": table.rows,
+            "schema": [list(item) for item in SCHEMA],
+            "dictionaries": table.dictionaries,
+            "buffers": layout,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    prefix = PACKED_MAGIC + struct.pack("<I", len(header)) + header
+    return prefix + b"\0" * (-len(prefix) % ALIGNMENT) + bytes(body)
+
+
+def decode_packed(data: bytes, columns: Iterable[str] | None = None) -> dict[str, list[Any]]:
+    if not data.startswith(PACKED_MAGIC):
+        raise ValueError("No es un fichero de export_columnar (cabecera desconocida)")
+    (header_length,) = struct.unpack_from("<I", data, len(PACKED_MAGIC))
+    start = len(PACKED_MAGIC) + 4
+    header = json.loads(data[start:start + header_length].decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Version de formato no soportada: {header.get('version')}")
+    body = start + header_length
+    body += -body % ALIGNMENT
+    wanted = set(columns) if columns is not None else None
+    result = {}
+    for name, kind in header["schema"]:
+        if wanted is not None and name not in wanted:
+            continue
+        buffers = {}
+        for buffer_name, (offset, length, *codec) in header["buffers"][name].items():
+            buffer = data[body + offset:body + offset + length]
+            buffers[buffer_name] = zlib.decompress(buffer) if codec == ["zlib"] else buffer
+        result[name] = decode_column(kind, buffers, header["rows"], header["dictionaries"].get(name))
+    return result
+
+
+def write_packed(path: Path, table: Table) -> None:
+    path.write_bytes(encode_packed(table))
+
+
+def read_packed(path: Path, columns: Iterable[str] | None = None) -> dict[str, list[Any]]:
+    """Columnas (todas o las pedidas) como listas de Python; fechas como `datetime.date`."""
+    return decode_packed(path.read_bytes(), columns)
+
+
+def resolve_format(name: str) -> str:
+    if name == "auto":
+        return "parquet" if pa is not None else "packed"
+    return name
+
+
+def run(
+    proposals_json: Path = DEFAULT_PROPOSALS_JSON,
+    output: Path | None = None,
+    format_name: str = "auto",
+    proposals: list[dict[str, Any]] | None = None,
+) -> tuple[Path, Table]:
+    """Escribe el export columnar; devuelve la ruta escrita y la tabla."""
+    format_name = resolve_format(format_name)
+    if proposals is None:
+        proposals = json.loads(proposals_json.read_text(encoding="utf-8"))
+    if output is None:
+        output = DEFAULT_PARQUET if format_name == "parquet" else DEFAULT_PACKED
+    table = columnarize(proposals)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if format_name == "parquet":
+        write_parquet(output, table)
+    else:
+        write_packed(output, table)
+    return output, table
+
+
+def timed(function: Any) -> tuple[Any, float]:
+    started = time.perf_counter()
+    value = function()
+    return value, time.perf_counter() - started
+
+
+def compare_with_csv(output: Path, format_name: str, proposals: list[dict[str, Any]]) -> None:
+    """Tamano y tiempo de carga del export frente al mismo dataset en CSV."""
+    csv_path = output.with_suffix(".compare.csv")
+    write_csv(csv_path, proposals)
+    try:
+        def load_csv() -> list[dict[str, Any]]:
+            with csv_path.open(encoding="utf-8", newline="") as fh:
+                rows = list(csv.DictReader(fh))
+            for row in rows:
+                # Para igualar tipos hay que volver a parsear cada valor.
+                for name in ("documents", "categories"):
+                    row[name] = json.loads(row[name]) if row[name] else []
+                row["votes"] = to_number(row["votes"], int)
+            return rows
+
+        def load_columnar() -> Any:
+            if format_name == "parquet":
+                return pq.read_table(output)
+            return read_packed(output)
+
+        _, csv_seconds = timed(load_csv)
+        _, columnar_seconds = timed(load_columnar)
+        csv_size = csv_path.stat().st_size
+    finally:
+        csv_path.unlink()
+    size = output.stat().st_size
+    print(f"CSV:      {csv_size / 1024:8.1f} KiB, carga {csv_seconds * 1000:7.1f} ms")
+    print(f"{format_name + ':':9s} {size / 1024:8.1f} KiB, carga {columnar_seconds * 1000:7.1f} ms ({size / csv_size:.0%} del CSV)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export columnar tipado de proposals_data.json")
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--output", type=Path, help="Por defecto data/proposals_data.parquet o .cols")
+    parser.add_argument("--format", choices=FORMATS, default="auto")
+    parser.add_argument("--compare-csv", action="store_true", help="Compara tamano y tiempo de carga con el CSV")
+    args = parser.parse_args()
+
+    proposals = json.loads(args.proposals_json.read_text(encoding="utf-8"))
+    format_name = resolve_format(args.format)
+    try:
+        output, table = run(args.proposals_json, args.output, format_name, proposals)
+    except RuntimeError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(f"{table.rows} propuestas, {len(SCHEMA)} columnas ({format_name})")
+    for name, values in table.dictionaries.items():
+        print(f"  {name}: diccionario de {len(values)} valores")
+    print(f"Guardado en {output}")
+    if args.compare_csv:
+        compare_with_csv(output, format_name, proposals)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
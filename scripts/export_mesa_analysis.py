@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Exporta `data/mesa-analysis.json`, los datos ya agregados de `mesas/`.
+
+La pagina de mesas descargaba `mesa-final-unificado.csv` y el listado final,
+los parseaba en el navegador y recalculaba los recuentos en cada cambio de
+filtro. Este script hace ese trabajo una vez:
+
+- `enums`: situaciones (en el orden de la pagina), zonas, categorias y tipos
+  de razon de exclusion. Las filas guardan indices a estas listas.
+- `rows`: una lista por propuesta con las columnas de `columns`, ordenadas
+  como la tabla por defecto. `categories` es una lista de indices y
+  `budget_cents` el importe final en centimos (o null), tomado de
+  `data/finales.json` (ver `scrape_finales.py`).
+- `aggregates`: recuentos por situacion, zona y tipo de exclusion, importes
+  por zona y situacion (y del listado final completo), y los indices de filas
+  de los bloques fijos (top de elegidas por mesa fuera de la final,
+  descartadas que llegan a la final).
+
+    python3 scripts/export_mesa_analysis.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import unicodedata
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_MESA_CSV = ROOT / "data" / "mesa-final-unificado.csv"
+DEFAULT_FINALES_JSON = ROOT / "data" / "finales.json"
+DEFAULT_OUTPUT_JSON = ROOT / "data" / "mesa-analysis.json"
+FORMAT_VERSION = 1
+
+STATUS_ORDER = [
+    "Mesa pero no final",
+    "Descartada por mesa y fuera de la final",
+    "Descartada por mesa y en la final",
+    "Mesa y final",
+    "Final pero no detectada en mesa",
+]
+NO_CATEGORY = "Sin categoría"
+TOP_PROPOSALS = 5
+
+# Categorias canonicas de la plataforma; cualquier otro token del CSV se descarta.
+KNOWN_CATEGORIES = {
+    "Asociaciones",
+    "Contaminación ambiental y acústica",
+    "Cultura",
+    "Cultura y Embellecimiento Urbano",
+    "Deporte",
+    "Deportes",
+    "Educación",
+    "Igualdad",
+    "Medio Ambiente",
+    "Medio Ambiente - Limpieza",
+    "Participación ciudadana",
+    "Participación ciudadana - Asociaciones",
+    "Patrimonio",
+    "Ruido - Contaminación acústica",
+    "Salud",
+    "Salud y consumo - Animales",
+    "Seguridad y emergencias",
+    "Servicios sociales",
+    "Transportes y movilidad",
+    "Turismo",
+    "Urbanismo",
+}
+
+COLUMNS = [
+    "status",
+    "zone",
+    "id",
+    "title",
+    "url",
+    "supports",
+    "categories",
+    "discarded_in_mesa",
+    "extract",
+    "reason",
+    "exclusion_type",
+    "budget_cents",
+]
+
+
+def normalize_text(value: Any) -> str:
+    return str(value or "").strip()
+
+
+def sort_key(value: str) -> str:
+    """Aproxima `localeCompare(..., 'es')`: sin tildes y sin distinguir mayusculas."""
+    decomposed = unicodedata.normalize("NFD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def normalize_categories(raw: str) -> list[str]:
+    cleaned = normalize_text(raw).replace('"', "").replace(";", "")
+    parts = [part.strip() for part in cleaned.split("|") if part.strip()]
+    return list(dict.fromkeys(part for part in parts if part in KNOWN_CATEGORIES))
+
+
+def read_csv(path: Path) -> list[dict[str, str]]:
+    with path.open(encoding="utf-8", newline="") as fh:
+        return list(csv.DictReader(fh))
+
+
+def load_finales(path: Path) -> dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def final_budgets(finales: dict[str, Any]) -> dict[str, int]:
+    amount = finales["columns"].index("amount_cents")
+    rows = finales["rows"]
+    return {
+        code: rows[row][amount]
+        for code, row in finales["index"]["by_code"].items()
+        if rows[row][amount] is not None
+    }
+
+
+def enum_index(values: list[str]) -> dict[str, int]:
+    return {value: index for index, value in enumerate(values)}
+
+
+def build_analysis(mesa_rows: list[dict[str, str]], finales: dict[str, Any]) -> dict[str, Any]:
+    budgets = final_budgets(finales)
+    categories_by_row = [normalize_categories(row.get("categoria", "")) or [NO_CATEGORY] for row in mesa_rows]
+
+    statuses = STATUS_ORDER + sorted(
+        {normalize_text(row.get("situacion")) for row in mesa_rows} - set(STATUS_ORDER) - {""},
+        key=sort_key,
+    )
+    zones = sorted({normalize_text(row.get("zona")) for row in mesa_rows} - {""}, key=sort_key)
+    categories = sorted({category for row in categories_by_row for category in row}, key=sort_key)
+    exclusion_types = sorted(
+        {normalize_text(row.get("tipo_razon_exclusion")) for row in mesa_rows} - {""},
+        key=sort_key,
+    )
+    status_index, zone_index = enum_index(statuses), enum_index(zones)
+    category_index, exclusion_index = enum_index(categories), enum_index(exclusion_types)
+
+    records = []
+    for row, row_categories in zip(mesa_rows, categories_by_row):
+        code = normalize_text(row.get("propuesta_id"))
+        exclusion_type = normalize_text(row.get("tipo_razon_exclusion"))
+        try:
+            supports = int(normalize_text(row.get("apoyos")))
+        except ValueError:
+            supports = 0
+        records.append([
+            status_index.get(normalize_text(row.get("situacion"))),
+            zone_index.get(normalize_text(row.get("zona"))),
+            code,
+            normalize_text(row.get("titulo_propuesta")),
+            normalize_text(row.get("enlace")),
+            supports,
+            [category_index[category] for category in row_categories],
+            1 if normalize_text(row.get("aparece_descartada_en_mesa")) == "SI" else 0,
+            normalize_text(row.get("extracto_acta")),
+            normalize_text(row.get("razon_exclusion")),
+            exclusion_index[exclusion_type] if exclusion_type else None,
+            budgets.get(code),
+        ])
+
+    # Orden por defecto de la tabla: situacion, apoyos descendentes, zona.
+    records.sort(key=lambda r: (
+        r[0] if r[0] is not None else len(statuses),
+        -r[5],
+        sort_key(zones[r[1]]) if r[1] is not None else "",
+    ))
+    return {
+        "version": FORMAT_VERSION,
+        "enums": {
+            "status": statuses,
+            "zone": zones,
+            "category": categories,
+            "exclusion_type": exclusion_types,
+        },
+        "columns": COLUMNS,
+        "rows": records,
+        "aggregates": build_aggregates(records, statuses, zones, exclusion_types, finales),
+    }
+
+
+def build_aggregates(
+    records: list[list[Any]],
+    statuses: list[str],
+    zones: list[str],
+    exclusion_types: list[str],
+    finales: dict[str, Any],
+) -> dict[str, Any]:
+    status_counts = [0] * len(statuses)
+    zone_status_counts = [[0] * len(statuses) for _ in zones]
+    exclusion_counts = [0] * len(exclusion_types)
+    budget_by_zone = [0] * len(zones)
+    budget_by_status = [0] * len(statuses)
+
+    for status, zone, *_, exclusion_type, budget_cents in records:
+        if status is not None:
+            status_counts[status] += 1
+            if zone is not None:
+                zone_status_counts[zone][status] += 1
+        if exclusion_type is not None:
+            exclusion_counts[exclusion_type] += 1
+        if budget_cents is not None:
+            if zone is not None:
+                budget_by_zone[zone] += budget_cents
+            if status is not None:
+                budget_by_status[status] += budget_cents
+
+    # Listado final completo: los totales por zona ya vienen sumados en finales.json.
+    final_totals = {zone["name"]: zone["total_cents"] for zone in finales["zones"]}
+    final_by_zone = [final_totals.get(zone, 0) for zone in zones]
+
+    mesa_no_final = statuses.index("Mesa pero no final")
+    discarded_final = statuses.index("Descartada por mesa y en la final")
+    by_supports = sorted(range(len(records)), key=lambda index: -records[index][5])
+    return {
+        "status_counts": status_counts,
+        "zone_status_counts": zone_status_counts,
+        "exclusion_type_counts": exclusion_counts,
+        "budget_cents": {
+            "total": sum(budget_by_zone),
+            "by_zone": budget_by_zone,
+            "by_status": budget_by_status,
+            "final_total": finales["total_cents"],
+            "final_by_zone": final_by_zone,
+        },
+        "top_mesa_no_final": [
+            index for index in by_supports
+            if records[index][0] == mesa_no_final and not records[index][7]
+        ][:TOP_PROPOSALS],
+        "discarded_in_final": [index for index in by_supports if records[index][0] == discarded_final],
+    }
+
+
+def write_analysis(path: Path, analysis: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(analysis, ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mesa-csv", type=Path, default=DEFAULT_MESA_CSV)
+    parser.add_argument("--finales-json", type=Path, default=DEFAULT_FINALES_JSON)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_JSON)
+    args = parser.parse_args()
+
+    analysis = build_analysis(read_csv(args.mesa_csv), load_finales(args.finales_json))
+    write_analysis(args.output, analysis)
+
+    aggregates = analysis["aggregates"]
+    print(f"Filas exportadas: {len(analysis['rows'])}")
+    for status, count in zip(analysis["enums"]["status"], aggregates["status_counts"]):
+        print(f"  {status}: {count}")
+    print(f"Importe del listado final: {aggregates['budget_cents']['final_total'] / 100:,.2f} €")
+    print(f"Guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
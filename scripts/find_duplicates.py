@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Grupos de propuestas casi duplicadas (MinHash + LSH) sobre titulo y descripcion.
+
+Comparar todas las parejas de descripciones crece con el cuadrado del numero
+de propuestas. En su lugar:
+
+1. Cada propuesta se reduce a un conjunto de "tejas": palabras y parejas de
+   palabras seguidas del titulo y la descripcion normalizados (minusculas,
+   sin acentos, sin palabras vacias, sin "(agrupada con 8424)").
+2. MinHash: `NUM_PERM` permutaciones de esas tejas; la fraccion de minimos
+   que coinciden entre dos propuestas estima su similitud de Jaccard.
+3. LSH: la firma se parte en `BANDS` bandas; dos propuestas son candidatas
+   si coinciden en alguna banda entera. Solo esas parejas se comparan, asi
+   que el coste crece casi linealmente.
+4. Las parejas con similitud estimada >= `--threshold` se unen en grupos.
+
+Las firmas se guardan en `data/cache/minhash_signatures.json` con el hash del
+texto: al volver a ejecutar solo se calculan las de propuestas nuevas o con
+texto cambiado. Con NumPy cada firma se calcula en bloque; sin NumPy, con
+bucles (mismo resultado).
+
+Escribe `data/duplicate_clusters.json`: los grupos (codigos, zonas y
+similitud minima y maxima entre sus parejas), las parejas en columnas e
+`index.by_code` con el grupo de cada codigo.
+
+    python3 scripts/find_duplicates.py
+    python3 scripts/find_duplicates.py --threshold 0.6 --show 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+from collections import defaultdict
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Iterable
+
+from datasets import normalize_code
+from generate_metadata import LEADING_CODE_PATTERN, np, source_hash, tokenize
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_SIGNATURES_JSON = ROOT / "data" / "cache" / "minhash_signatures.json"
+DEFAULT_OUTPUT_JSON = ROOT / "data" / "duplicate_clusters.json"
+FORMAT_VERSION = 1
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.5
+SEED = 2027
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+GROUPED_PATTERN = re.compile(r"\(\s*agrup\w*(?:\s+con)?\s*[\d\s,y]*\)", re.IGNORECASE)
+PAIR_COLUMNS = ["code_a", "code_b", "similarity"]
+EMPTY_SIGNATURE = [MAX_HASH] * NUM_PERM
+
+# Coeficientes fijos de las permutaciones: las firmas guardadas siguen valiendo entre ejecuciones.
+_rng = random.Random(SEED)
+PERMUTATIONS = [(_rng.randrange(1, MAX_HASH), _rng.randrange(0, MAX_HASH)) for _ in range(NUM_PERM)]
+
+
+def shingles(proposal: dict[str, Any]) -> set[str]:
+    title = GROUPED_PATTERN.sub(" ", LEADING_CODE_PATTERN.sub("", proposal.get("title") or ""))
+    keys = [key for key, _, _ in tokenize(f"{title}\n{proposal.get('description') or ''}")]
+    return set(keys) | {f"{a} {b}" for a, b in zip(keys, keys[1:])}
+
+
+def shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash(values: Iterable[str]) -> list[int]:
+    hashes = [shingle_hash(value) for value in values]
+    if not hashes:
+        return list(EMPTY_SIGNATURE)
+    if np is not None:
+        # a < 2^32 y h < 2^32: a*h + b cabe en uint64 sin desbordar, igual que con enteros de Python.
+        coefficients = np.array(PERMUTATIONS, dtype=np.uint64)
+        permuted = (coefficients[:, :1] * np.array(hashes, dtype=np.uint64) + coefficients[:, 1:]) % np.uint64(MERSENNE_PRIME)
+        return (permuted & np.uint64(MAX_HASH)).min(axis=1).tolist()
+    return [min(((a * value + b) % MERSENNE_PRIME) & MAX_HASH for value in hashes) for a, b in PERMUTATIONS]
+
+
+def similarity(signature_a: list[int], signature_b: list[int]) -> float:
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / NUM_PERM
+
+
+class LshIndex:
+    """Cubos por banda de firma; dos codigos en el mismo cubo son candidatos."""
+
+    def __init__(self) -> None:
+        self.buckets: list[dict[tuple[int, ...], list[str]]] = [defaultdict(list) for _ in range(BANDS)]
+
+    def add(self, code: str, signature: list[int]) -> None:
+        for band, buckets in enumerate(self.buckets):
+            buckets[tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])].append(code)
+
+    def candidate_pairs(self) -> set[tuple[str, str]]:
+        pairs = set()
+        for buckets in self.buckets:
+            for codes in buckets.values():
+                if len(codes) > 1:
+                    pairs.update(combinations(sorted(codes), 2))
+        return pairs
+
+
+def load_signatures(path: Path) -> dict[str, dict[str, Any]]:
+    if not path.exists():
+        return {}
+    try:
+        cache = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    if cache.get("num_perm") != NUM_PERM or cache.get("seed") != SEED:
+        return {}
+    return cache.get("entries", {})
+
+
+def save_signatures(path: Path, entries: dict[str, dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cache = {"version": FORMAT_VERSION, "num_perm": NUM_PERM, "seed": SEED, "entries": entries}
+    path.write_text(json.dumps(cache, separators=(",", ":")) + "\n", encoding="utf-8")
+
+
+def update_signatures(
+    proposals: list[dict[str, Any]],
+    entries: dict[str, dict[str, Any]],
+) -> tuple[dict[str, dict[str, Any]], int]:
+    """Firmas de todas las propuestas actuales; solo se calculan las nuevas o cambiadas."""
+    current: dict[str, dict[str, Any]] = {}
+    computed = 0
+    for proposal in proposals:
+        code = normalize_code(proposal.get("code"))
+        if not code or code in current:
+            continue
+        text_hash = source_hash(proposal)
+        entry = entries.get(code)
+        if entry is None or entry.get("hash") != text_hash:
+            entry = {"hash": text_hash, "signature": minhash(shingles(proposal))}
+            computed += 1
+        current[code] = entry
+    return current, computed
+
+
+def find_clusters(
+    signatures: dict[str, list[int]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> tuple[list[list[str]], list[tuple[str, str, float]], int]:
+    """Grupos (de 2 o mas codigos), parejas aceptadas y numero de candidatas de LSH."""
+    index = LshIndex()
+    for code, signature in signatures.items():
+        # Sin texto no hay tejas: todas las firmas vacias coincidirian entre si.
+        if signature != EMPTY_SIGNATURE:
+            index.add(code, signature)
+    candidates = index.candidate_pairs()
+
+    parent = {code: code for code in signatures}
+
+    def root(code: str) -> str:
+        while parent[code] != code:
+            parent[code] = parent[parent[code]]
+            code = parent[code]
+        return code
+
+    pairs = []
+    for code_a, code_b in sorted(candidates):
+        score = similarity(signatures[code_a], signatures[code_b])
+        if score >= threshold:
+            pairs.append((code_a, code_b, round(score, 3)))
+            parent[root(code_a)] = root(code_b)
+
+    groups: dict[str, list[str]] = defaultdict(list)
+    for code in signatures:
+        groups[root(code)].append(code)
+    clusters = sorted((codes for codes in groups.values() if len(codes) > 1), key=lambda codes: (-len(codes), codes[0]))
+    return clusters, pairs, len(candidates)
+
+
+def build_artifact(
+    proposals_by_code: dict[str, dict[str, Any]],
+    clusters: list[list[str]],
+    pairs: list[tuple[str, str, float]],
+    candidates: int,
+    threshold: float,
+) -> dict[str, Any]:
+    cluster_of = {code: position for position, codes in enumerate(clusters) for code in codes}
+    scores: dict[int, list[float]] = defaultdict(list)
+    for code_a, _, score in pairs:
+        scores[cluster_of[code_a]].append(score)
+    return {
+        "version": FORMAT_VERSION,
+        "num_perm": NUM_PERM,
+        "bands": BANDS,
+        "threshold": threshold,
+        "proposals": len(proposals_by_code),
+        "candidate_pairs": candidates,
+        "clusters": [
+            {
+                "codes": codes,
+                "zones": sorted({proposals_by_code[code].get("zone") or "" for code in codes}),
+                "min_similarity": min(scores[position]),
+                "max_similarity": max(scores[position]),
+            }
+            for position, codes in enumerate(clusters)
+        ],
+        "pair_columns": PAIR_COLUMNS,
+        "pairs": [list(pair) for pair in pairs],
+        "index": {"by_code": cluster_of},
+    }
+
+
+def run(
+    proposals_json: Path = DEFAULT_PROPOSALS_JSON,
+    output: Path = DEFAULT_OUTPUT_JSON,
+    signatures_json: Path = DEFAULT_SIGNATURES_JSON,
+    threshold: float = DEFAULT_THRESHOLD,
+    proposals: list[dict[str, Any]] | None = None,
+) -> tuple[dict[str, Any], int]:
+    """Escribe los grupos; devuelve el artefacto y cuantas firmas se han calculado."""
+    if proposals is None:
+        proposals = json.loads(proposals_json.read_text(encoding="utf-8"))
+    cached = load_signatures(signatures_json)
+    entries, computed = update_signatures(proposals, cached)
+    if computed or entries.keys() != cached.keys():
+        save_signatures(signatures_json, entries)
+
+    clusters, pairs, candidates = find_clusters({code: entry["signature"] for code, entry in entries.items()}, threshold)
+    proposals_by_code = {normalize_code(proposal.get("code")): proposal for proposal in proposals}
+    artifact = build_artifact(proposals_by_code, clusters, pairs, candidates, threshold)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(artifact, ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+    return artifact, computed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Grupos de propuestas casi duplicadas (MinHash + LSH)")
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--signatures-json", type=Path, default=DEFAULT_SIGNATURES_JSON)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_JSON)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Similitud de Jaccard minima (0-1)")
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="Muestra los N grupos mayores")
+    args = parser.parse_args()
+
+    proposals = json.loads(args.proposals_json.read_text(encoding="utf-8"))
+    artifact, computed = run(args.proposals_json, args.output, args.signatures_json, args.threshold, proposals)
+    titles = {normalize_code(proposal.get("code")): proposal.get("title") or "" for proposal in proposals}
+    for cluster in artifact["clusters"][:args.show]:
+        print(f"- {len(cluster['codes'])} propuestas ({cluster['min_similarity']}-{cluster['max_similarity']}), {', '.join(cluster['zones'])}")
+        for code in cluster["codes"]:
+            print(f"    {code}  {titles.get(code, '')[:90]}")
+    print(f"Firmas calculadas: {computed} de {artifact['proposals']}")
+    print(f"Parejas candidatas (LSH): {artifact['candidate_pairs']}, aceptadas: {len(artifact['pairs'])}")
+    print(f"Grupos: {len(artifact['clusters'])} con {len(artifact['index']['by_code'])} propuestas")
+    print(f"Guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Completa `data/proposals_metadata.json` (categoria, etiquetas, urgencia y resumen) sin red.
+
+Solo procesa los codigos de `proposals_data.json` que no tienen entrada y los
+que tienen una entrada generada que ya no corresponde al texto actual de la
+propuesta. Las entradas escritas a mano no se tocan salvo con `--codes`. Las
+generadas llevan `generated: true` y `source_hash` (hash de titulo +
+descripcion), asi que los cambios se detectan sin ninguna cache local.
+
+- Categoria y urgencia: votacion de los vecinos mas cercanos (TF-IDF, coseno)
+  entre las entradas escritas a mano. Los titulos con "inadmitida" van a
+  `Inadmitidas`, como hace el frontend.
+- Etiquetas: las parejas de palabras y palabras del titulo con mas peso TF-IDF.
+- Resumen: el titulo limpio, completado con la primera frase de la
+  descripcion si es corto.
+
+Con NumPy la similitud es un producto matriz-vector; sin NumPy se calcula
+con vectores dispersos en diccionarios (mismo resultado).
+
+    python3 scripts/generate_metadata.py
+    python3 scripts/generate_metadata.py --dry-run
+    python3 scripts/generate_metadata.py --codes 8486 8490
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from datasets import index_by_code, normalize_code
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_METADATA_JSON = ROOT / "data" / "proposals_metadata.json"
+NEIGHBOURS = 7
+TAG_COUNT = 4
+SUMMARY_MAX = 110
+INADMITTED = "Inadmitidas"
+
+STOPWORDS = set("""
+a al algo algun alguna algunas alguno algunos ante antes asi aun cada casi como con contra cual cuando de del desde
+donde dos el ella ellas ellos en entre era es esa esas ese eso esos esta estan estas este esto estos etc fue ha hace
+hacer hacia han hasta hay la las le les lo los mas me mediante mi mismo mucho muy nada ni no nos nuestra nuestro o
+otra otras otro otros para pero poco por porque pues que quien se sea ser si sido sin sobre solo son su sus tambien
+tan tanto te tiene tienen todo todos tras tu un una uno unos usted vez y ya zona propuesta proponemos propone
+solicita solicitamos solicito calle ademas ello dicha dicho desde cual cuales puede pueden seria hacen
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:-[^\W_]+)*")
+LEADING_CODE_PATTERN = re.compile(r"^\s*\d{3,5}\s*[-.:]\s*")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> list[tuple[str, str, int]]:
+    """(clave normalizada, palabra original, posicion) sin palabras vacias ni numeros."""
+    tokens = []
+    for position, match in enumerate(TOKEN_PATTERN.finditer(text or "")):
+        surface = match.group(0)
+        key = strip_accents(surface.lower())
+        if len(key) >= 3 and key not in STOPWORDS and not key.isdigit():
+            tokens.append((key, surface, position))
+    return tokens
+
+
+def document_terms(proposal: dict[str, Any]) -> list[str]:
+    # El titulo cuenta doble: es lo mas representativo de la propuesta.
+    title = [key for key, _, _ in tokenize(proposal.get("title") or "")]
+    return title * 2 + [key for key, _, _ in tokenize(proposal.get("description") or "")]
+
+
+def source_hash(proposal: dict[str, Any]) -> str:
+    text = f"{proposal.get('title') or ''}\n{proposal.get('description') or ''}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def clean_category(category: str) -> str:
+    # Algunas categorias escritas a mano llevan un emoji o un caracter roto delante.
+    return re.sub(r"^\W+", "", category or "").strip()
+
+
+def sentence_case(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    if text.isupper():
+        text = text.lower()
+    return text[:1].upper() + text[1:]
+
+
+class TfidfIndex:
+    """Vectores TF-IDF (tf sublineal, normalizados) de un conjunto de documentos."""
+
+    def __init__(self, documents: list[list[str]]):
+        self.size = len(documents)
+        document_frequency = Counter(term for terms in documents for term in set(terms))
+        self.idf = {
+            term: math.log((1 + self.size) / (1 + count)) + 1
+            for term, count in document_frequency.items()
+        }
+        self.default_idf = math.log(1 + self.size) + 1
+        self.vectors = [self.vector(terms) for terms in documents]
+        self.matrix = None
+        if np is not None and self.vectors:
+            self.columns = {term: column for column, term in enumerate(self.idf)}
+            self.matrix = np.zeros((self.size, len(self.columns)), dtype=np.float32)
+            for row, vector in enumerate(self.vectors):
+                for term, weight in vector.items():
+                    self.matrix[row, self.columns[term]] = weight
+
+    def weight(self, term: str) -> float:
+        return self.idf.get(term, self.default_idf)
+
+    def vector(self, terms: list[str]) -> dict[str, float]:
+        counts = Counter(terms)
+        vector = {term: (1 + math.log(count)) * self.weight(term) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def similarities(self, vector: dict[str, float]) -> list[float]:
+        if self.matrix is not None:
+            query = np.zeros(self.matrix.shape[1], dtype=np.float32)
+            for term, weight in vector.items():
+                column = self.columns.get(term)
+                if column is not None:
+                    query[column] = weight
+            return (self.matrix @ query).tolist()
+        return [sum(weight * other.get(term, 0.0) for term, weight in vector.items()) for other in self.vectors]
+
+
+class MetadataModel:
+    """Clasificador por vecinos sobre las entradas de metadatos escritas a mano."""
+
+    def __init__(self, examples: list[tuple[list[str], str, bool]]):
+        self.labels = [(category, urgent) for _, category, urgent in examples]
+        self.index = TfidfIndex([terms for terms, _, _ in examples])
+        self.fallback_category = Counter(category for category, _ in self.labels).most_common(1)[0][0] if self.labels else ""
+
+    def classify(self, terms: list[str]) -> tuple[str, bool]:
+        similarities = self.index.similarities(self.index.vector(terms))
+        nearest = sorted(range(len(similarities)), key=lambda i: similarities[i], reverse=True)[:NEIGHBOURS]
+        nearest = [i for i in nearest if similarities[i] > 0]
+        if not nearest:
+            return self.fallback_category, False
+        votes: Counter[str] = Counter()
+        urgent_weight = 0.0
+        for i in nearest:
+            category, urgent = self.labels[i]
+            votes[category] += similarities[i]
+            urgent_weight += similarities[i] if urgent else 0.0
+        return votes.most_common(1)[0][0], urgent_weight * 2 >= sum(similarities[i] for i in nearest)
+
+    def tags(self, proposal: dict[str, Any]) -> list[str]:
+        title_tokens = tokenize(LEADING_CODE_PATTERN.sub("", proposal.get("title") or ""))
+        if not title_tokens:
+            title_tokens = tokenize(proposal.get("description") or "")[:12]
+        counts = Counter(key for key, _, _ in title_tokens)
+        score = {key: (1 + math.log(count)) * self.index.weight(key) for key, count in counts.items()}
+
+        candidates: dict[str, tuple[float, tuple[str, ...], str]] = {}
+        # Solo parejas contiguas en el titulo ("centro ciudad"), sin saltar palabras vacias.
+        for (key_a, word_a, position_a), (key_b, word_b, position_b) in zip(title_tokens, title_tokens[1:]):
+            if key_a != key_b and position_b == position_a + 1:
+                candidates.setdefault(f"{key_a} {key_b}", (score[key_a] + score[key_b], (key_a, key_b), f"{word_a} {word_b}"))
+        for key, word, _ in title_tokens:
+            candidates.setdefault(key, (score[key], (key,), word))
+
+        tags: list[str] = []
+        used: set[str] = set()
+        for _, keys, words in sorted(candidates.values(), key=lambda item: item[0], reverse=True):
+            if used.intersection(keys):
+                continue
+            used.update(keys)
+            tags.append(sentence_case(words))
+            if len(tags) == TAG_COUNT:
+                break
+        return tags
+
+    @staticmethod
+    def summary(proposal: dict[str, Any]) -> str:
+        title = sentence_case(LEADING_CODE_PATTERN.sub("", proposal.get("title") or ""))
+        description = re.sub(r"\s+", " ", proposal.get("description") or "").strip()
+        if len(title) >= SUMMARY_MAX // 2 or not description:
+            return title
+        first_sentence = sentence_case(SENTENCE_END_PATTERN.split(description, maxsplit=1)[0].rstrip("."))
+        if strip_accents(first_sentence.lower()).startswith(strip_accents(title.lower())):
+            return first_sentence[:SUMMARY_MAX].rsplit(" ", 1)[0] if len(first_sentence) > SUMMARY_MAX else first_sentence
+        summary = f"{title}: {first_sentence[:1].lower()}{first_sentence[1:]}"
+        if len(summary) > SUMMARY_MAX:
+            summary = summary[:SUMMARY_MAX].rsplit(" ", 1)[0].rstrip(",;:")
+        return summary
+
+    def generate(self, proposal: dict[str, Any]) -> dict[str, Any]:
+        terms = document_terms(proposal)
+        category, urgent = self.classify(terms)
+        if "inadmitida" in (proposal.get("title") or "").lower():
+            category = INADMITTED
+        return {
+            "code": normalize_code(proposal.get("code")),
+            "category": category,
+            "tags": self.tags(proposal),
+            "urgent": urgent,
+            "summary": self.summary(proposal),
+            "generated": True,
+            "source_hash": source_hash(proposal),
+        }
+
+
+def training_examples(
+    metadata_by_code: dict[str, dict[str, Any]],
+    proposals_by_code: dict[str, dict[str, Any]],
+) -> list[tuple[list[str], str, bool]]:
+    examples = []
+    for code, entry in metadata_by_code.items():
+        if entry.get("generated"):
+            continue
+        category = clean_category(entry.get("category") or "")
+        # Inadmitidas depende de la decision municipal, no del texto: no sirve para entrenar.
+        source = proposals_by_code.get(code) or (entry if entry.get("title") else None)
+        if not category or category == INADMITTED or source is None:
+            continue
+        examples.append((document_terms(source), category, bool(entry.get("urgent"))))
+    return examples
+
+
+def pending_codes(
+    proposals_by_code: dict[str, dict[str, Any]],
+    metadata_by_code: dict[str, dict[str, Any]],
+    forced: set[str],
+) -> dict[str, str]:
+    """Codigo -> motivo ("nueva", "cambiada" o "forzada") de las propuestas a generar."""
+    pending = {}
+    for code, proposal in proposals_by_code.items():
+        entry = metadata_by_code.get(code)
+        if code in forced:
+            pending[code] = "forzada"
+        elif entry is None:
+            pending[code] = "nueva"
+        elif entry.get("generated") and entry.get("source_hash") != source_hash(proposal):
+            pending[code] = "cambiada"
+    return pending
+
+
+def update_metadata(metadata: list[dict[str, Any]], entries: list[dict[str, Any]]) -> None:
+    """Sustituye la primera entrada de cada codigo (la que usa el frontend) o anade una nueva al final."""
+    positions: dict[str, int] = {}
+    for position, entry in enumerate(metadata):
+        positions.setdefault(normalize_code(entry.get("code")), position)
+    for entry in entries:
+        position = positions.get(entry["code"])
+        if position is None:
+            metadata.append(entry)
+        else:
+            metadata[position] = entry
+
+
+def run(proposals_json: Path, metadata_json: Path, forced: set[str] = frozenset(), *, dry_run: bool = False) -> int:
+    proposals_by_code = index_by_code(json.loads(proposals_json.read_text(encoding="utf-8")))
+    metadata = json.loads(metadata_json.read_text(encoding="utf-8")) if metadata_json.exists() else []
+    metadata_by_code = index_by_code(metadata)
+
+    pending = pending_codes(proposals_by_code, metadata_by_code, forced)
+    if not pending:
+        return 0
+
+    model = MetadataModel(training_examples(metadata_by_code, proposals_by_code))
+    entries = [model.generate(proposals_by_code[code]) for code in pending]
+    for entry in entries:
+        print(f"  [{pending[entry['code']]}] {entry['code']}: {entry['category']} | {', '.join(entry['tags'])} | {entry['summary']}")
+    if dry_run:
+        return len(entries)
+
+    update_metadata(metadata, entries)
+    metadata_json.write_text(json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8")
+    return len(entries)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Genera metadatos de las propuestas nuevas o cambiadas")
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--metadata-json", type=Path, default=DEFAULT_METADATA_JSON)
+    parser.add_argument("--codes", nargs="+", default=[], help="Regenera estos codigos aunque esten escritos a mano")
+    parser.add_argument("--dry-run", action="store_true", help="Muestra lo que se generaria sin escribir")
+    args = parser.parse_args()
+
+    changed = run(args.proposals_json, args.metadata_json, set(args.codes), dry_run=args.dry_run)
+    print(f"Entradas generadas: {changed}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+"""Servidor local que imita el portal de presupuestos participativos.
+
+Sirve las mismas rutas que leen los scrapers:
+
+- `/presupuestosparticipativos/budgets` (indice con los enlaces por zona),
+- `/presupuestosparticipativos/budgets/<b>/investments?heading_id=<h>&page=<n>`
+  y `.../investments?page=<n>` (listados paginados con tarjetas
+  `div.investment-project`); con `filter=selected` el listado final de
+  `finales-web-clean.csv`, con la zona y el importe en cada tarjeta,
+- `/presupuestosparticipativos/budgets/<b>/investments/<id>` (ficha),
+- `POST /presupuestosparticipativos/graphql` con la consulta
+  `budgetInvestments` de `api_ingest.py` (paginas con cursor); con
+  `--no-api` responde 404, como un portal sin API.
+
+Cada respuesta sale de una pagina grabada en `--recordings` si existe; si no,
+se genera a partir de `proposals_data.json` con el mismo marcado que espera
+`scrape_proposal_details`. Con `--record` las paginas que faltan se piden al
+servidor real y se guardan, para poder repetir despues la misma sesion offline.
+
+Permite simular latencia y fallos (429, 5xx, timeouts y cuerpos truncados) y
+cuenta las peticiones; `GET /__stats` devuelve los contadores en JSON y
+`POST /__reset` los pone a cero.
+
+    python3 scripts/mock_site.py --port 8765 --latency-ms 40 --error-rate 0.05
+    PARTICIPATIVOS_BASE_URL=http://127.0.0.1:8765 python3 scripts/update_votes.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import html
+import json
+import random
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, quote, urlsplit
+
+from site_config import SITE_ORIGIN
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_DISCOVERED_URLS = ROOT / "data" / "discovered_urls.json"
+DEFAULT_FINALES_CSV = ROOT / "data" / "finales-web-clean.csv"
+DEFAULT_PORT = 8765
+DEFAULT_PAGE_SIZE = 10
+BUDGET_ID = 6
+ERROR_KINDS = ("429", "500", "502", "503", "timeout", "truncated")
+
+BUDGETS_PATH = "/presupuestosparticipativos/budgets"
+GRAPHQL_PATH = "/presupuestosparticipativos/graphql"
+LISTING_PATTERN = re.compile(r"^/presupuestosparticipativos/budgets/(\d+)/investments/?$")
+DETAIL_PATTERN = re.compile(r"^/presupuestosparticipativos/budgets/(\d+)/investments/(\d+)/?$")
+
+
+def page_html(title: str, body: str) -> str:
+    return (
+        "<!DOCTYPE html><html lang=\"es\"><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(title)}</title></head><body>"
+        "<h1 class=\"show-for-sr\">Presupuestos Participativos Valladolid</h1>"
+        f"{body}</body></html>"
+    )
+
+
+def supports_html(votes: int) -> str:
+    text = "Sin apoyos" if not votes else f"{votes} apoyos"
+    return f"<div class=\"supports\"><span class=\"total-supports\">{text}</span></div>"
+
+
+def short_zone_name(zone: str | None) -> str:
+    match = re.search(r"Zona [^:]+", zone or "")
+    return match.group(0).strip() if match else ""
+
+
+class SiteData:
+    """Propuestas agrupadas por zona (heading_id) para generar las paginas."""
+
+    def __init__(
+        self,
+        proposals: list[dict[str, Any]],
+        discovered: list[dict[str, Any]],
+        page_size: int,
+        finals: list[dict[str, str]] | None = None,
+    ) -> None:
+        self.page_size = page_size
+        self.by_code = {str(p["code"]): p for p in proposals if p.get("code")}
+        # Listado final (`filter=selected`) en el orden del CSV, con zona corta e importe.
+        self.finals = [
+            {
+                "code": row["propuesta_id"],
+                "title": row["titulo_web"],
+                "votes": (self.by_code.get(row["propuesta_id"]) or {}).get("votes"),
+                "heading_name": row["zona_web"],
+                "amount": row["importe_web"],
+            }
+            for row in finals or []
+        ]
+
+        # heading_id real de cada zona, tal como aparece en discovered_urls.json.
+        heading_by_zone: dict[str, str] = {}
+        for item in discovered:
+            heading = str(item.get("zone_id") or "")
+            if item.get("zone_name") and heading.isdigit() and int(heading) > 10:
+                heading_by_zone.setdefault(item["zone_name"], heading)
+
+        self.zones: dict[str, tuple[str, list[dict[str, Any]]]] = {}
+        for proposal in proposals:
+            zone = proposal.get("zone") or ""
+            heading = heading_by_zone.get(zone) or str(78 + int(proposal.get("zone_id") or 0))
+            self.zones.setdefault(heading, (zone, []))[1].append(proposal)
+
+    def budgets_page(self) -> str:
+        links = "".join(
+            f"<li><h3><a href=\"{BUDGETS_PATH}/{BUDGET_ID}/investments?heading_id={heading}\">"
+            f"{html.escape(zone)}</a></h3></li>"
+            for heading, (zone, _) in sorted(self.zones.items(), key=lambda item: int(item[0]))
+        )
+        return page_html(
+            "Presupuestos",
+            f"<a href=\"{BUDGETS_PATH}/{BUDGET_ID}\">Presupuestos {BUDGET_ID}</a><ul>{links}</ul>",
+        )
+
+    def listing_page(self, budget_id: str, heading: str | None, page: int, listing_filter: str | None = None) -> str | None:
+        if listing_filter == "selected":
+            zone = short_zone_name(self.zones[heading][0]) if heading in self.zones else None
+            items = [p for p in self.finals if heading is None or p["heading_name"] == zone]
+        elif heading is None:
+            items = list(self.by_code.values())
+        elif heading in self.zones:
+            items = self.zones[heading][1]
+        else:
+            return None
+
+        start = (page - 1) * self.page_size
+        chunk = items[start:start + self.page_size]
+        cards = "".join(self.card_html(budget_id, p) for p in chunk)
+        pagination = ""
+        if start + self.page_size < len(items):
+            query = f"heading_id={heading}&" if heading else ""
+            if listing_filter:
+                query += f"filter={listing_filter}&"
+            pagination = (
+                "<ul class=\"pagination\"><li class=\"next\">"
+                f"<a rel=\"next\" href=\"{BUDGETS_PATH}/{budget_id}/investments?{query}page={page + 1}\">Siguiente</a>"
+                "</li></ul>"
+            )
+        return page_html("Proyectos", f"<div class=\"budget-investments-list\">{cards}</div>{pagination}")
+
+    @staticmethod
+    def card_html(budget_id: str, proposal: dict[str, Any]) -> str:
+        extra = ""
+        if proposal.get("heading_name"):
+            extra += f"<span class=\"heading\">{html.escape(proposal['heading_name'])}</span>"
+        if proposal.get("amount"):
+            extra += f"<p class=\"investment-project-amount\">{html.escape(proposal['amount'])}</p>"
+        return (
+            "<div class=\"budget-investment investment-project\">"
+            f"<h3><a href=\"{BUDGETS_PATH}/{budget_id}/investments/{proposal['code']}\">{html.escape(proposal.get('title') or '')}</a></h3>"
+            f"{extra}{supports_html(int(proposal.get('votes') or 0))}</div>"
+        )
+
+    def detail_page(self, code: str) -> str | None:
+        proposal = self.by_code.get(code)
+        if proposal is None:
+            return None
+
+        paragraphs = "".join(
+            f"<p>{html.escape(line)}</p>" for line in (proposal.get("description") or "").splitlines() if line.strip()
+        )
+        if proposal.get("address"):
+            paragraphs += f"<p>Ubicación: {html.escape(proposal['address'])}</p>"
+        if proposal.get("author"):
+            paragraphs += f"<p>Propuesto en nombre de: {html.escape(proposal['author'])}</p>"
+
+        documents = "".join(
+            f"<li><a href=\"{html.escape(doc.get('url') or '')}\">Descargar archivo</a> <strong>{html.escape(doc.get('title') or '')}</strong></li>"
+            for doc in proposal.get("documents") or []
+        )
+        tags = "".join(f"<a href=\"#\">{html.escape(tag)}</a>" for tag in proposal.get("categories") or [])
+        map_attrs = ""
+        if proposal.get("latitude") is not None and proposal.get("longitude") is not None:
+            map_attrs = (
+                f" data-marker-latitude=\"{proposal['latitude']}\""
+                f" data-marker-longitude=\"{proposal['longitude']}\""
+            )
+        image = ""
+        if proposal.get("image_url"):
+            image = (
+                "<div class=\"image-preview\">"
+                f"<img class=\"persisted-image\" src=\"{html.escape(proposal['image_url'])}\"></div>"
+            )
+        inviability = ""
+        if proposal.get("inviability_report"):
+            inviability = f"<h2>Informe de inviabilidad</h2><p>{html.escape(proposal['inviability_report'])}</p>"
+
+        body = (
+            "<div class=\"budget-investment-show\">"
+            f"<h1>{html.escape(proposal.get('title') or '')}</h1>{image}"
+            f"<div class=\"budget-investment-info\">{html.escape(proposal.get('date') or '')} "
+            f"&bull; <span class=\"heading\">{html.escape(short_zone_name(proposal.get('zone')))}</span></div>"
+            f"<p id=\"investment_code\">Código de propuesta: <strong>{code}</strong></p>"
+            f"{paragraphs}{inviability}</div>"
+            f"<div id=\"documents\"><ul class=\"document-link\">{documents}</ul></div>"
+            f"<div class=\"tags\">{tags}</div>"
+            f"<div class=\"map_location\"{map_attrs}></div>"
+            f"{supports_html(int(proposal.get('votes') or 0))}"
+        )
+        return page_html(proposal.get("title") or code, body)
+
+    @staticmethod
+    def investment_node(heading: str, proposal: dict[str, Any]) -> dict[str, Any]:
+        """Nodo `budgetInvestments` de la API con los datos de la propuesta."""
+        day, month, year = (proposal.get("date") or "//").split("/")
+        description = "".join(
+            f"<p>{html.escape(line)}</p>" for line in (proposal.get("description") or "").splitlines() if line.strip()
+        )
+        latitude, longitude = proposal.get("latitude"), proposal.get("longitude")
+        return {
+            "id": str(proposal["code"]),
+            "title": proposal.get("title") or "",
+            "description": description,
+            "location": proposal.get("address"),
+            "organizationName": proposal.get("author"),
+            "publicCreatedAt": f"{year}-{month}-{day}T10:00:00+01:00" if year else None,
+            "cachedVotesUp": int(proposal.get("votes") or 0),
+            "unfeasibilityExplanation": proposal.get("inviability_report") or None,
+            "heading": {"id": heading, "name": proposal.get("zone")},
+            "tags": [{"name": tag} for tag in proposal.get("categories") or []],
+            "image": {"url": proposal["image_url"]} if proposal.get("image_url") else None,
+            "documents": [{"title": doc.get("title"), "url": doc.get("url")} for doc in proposal.get("documents") or []],
+            "mapLocation": (
+                {"latitude": latitude, "longitude": longitude}
+                if latitude is not None and longitude is not None else None
+            ),
+        }
+
+    def graphql_investments(self, first: int, after: str | None) -> dict[str, Any]:
+        items = [(heading, proposal) for heading, (_, proposals) in self.zones.items() for proposal in proposals]
+        start = int(after) if after and after.isdigit() else 0
+        chunk = items[start:start + first]
+        end = start + len(chunk)
+        return {"data": {"budgetInvestments": {
+            "pageInfo": {"hasNextPage": end < len(items), "endCursor": str(end)},
+            "edges": [{"node": self.investment_node(heading, proposal)} for heading, proposal in chunk],
+        }}}
+
+    def render(self, path: str, query: dict[str, list[str]]) -> str | None:
+        if path.rstrip("/") == BUDGETS_PATH:
+            return self.budgets_page()
+        match = DETAIL_PATTERN.match(path)
+        if match:
+            return self.detail_page(match.group(2))
+        match = LISTING_PATTERN.match(path)
+        if match:
+            page = int((query.get("page") or ["1"])[0] or 1)
+            heading = (query.get("heading_id") or [None])[0]
+            listing_filter = (query.get("filter") or [None])[0]
+            return self.listing_page(match.group(1), heading, max(page, 1), listing_filter)
+        return None
+
+
+class Recordings:
+    """Paginas grabadas en disco, una por ruta + query."""
+
+    def __init__(self, directory: Path | None, record: bool, upstream: str) -> None:
+        self.directory = directory
+        self.record = record and directory is not None
+        self.upstream = upstream.rstrip("/")
+
+    def path_for(self, target: str) -> Path:
+        assert self.directory is not None
+        parts = urlsplit(target)
+        query = "&".join(sorted(p for p in parts.query.split("&") if p and not p.startswith("order=")))
+        name = quote(parts.path.strip("/") + (f"?{query}" if query else ""), safe="")
+        return self.directory / f"{name}.html"
+
+    def load(self, target: str) -> str | None:
+        if self.directory is None:
+            return None
+        path = self.path_for(target)
+        if path.exists():
+            return path.read_text(encoding="utf-8")
+        if not self.record:
+            return None
+        with urllib.request.urlopen(self.upstream + target, timeout=30) as response:
+            body = response.read().decode("utf-8", errors="replace")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(body, encoding="utf-8")
+        return body
+
+
+class RequestStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.total = 0
+            self.bytes_sent = 0
+            self.by_status: Counter[str] = Counter()
+            self.by_route: Counter[str] = Counter()
+            self.started_at = time.time()
+
+    def record(self, route: str, status: str, size: int) -> None:
+        with self.lock:
+            self.total += 1
+            self.bytes_sent += size
+            self.by_status[status] += 1
+            self.by_route[route] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.total,
+                "bytes_sent": self.bytes_sent,
+                "by_status": dict(self.by_status),
+                "by_route": dict(self.by_route),
+                "elapsed_seconds": round(time.time() - self.started_at, 3),
+            }
+
+
+def route_name(path: str) -> str:
+    if DETAIL_PATTERN.match(path):
+        return "detail"
+    if LISTING_PATTERN.match(path):
+        return "listing"
+    if path.rstrip("/") == BUDGETS_PATH:
+        return "budgets"
+    if path == GRAPHQL_PATH:
+        return "graphql"
+    return "other"
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    server: MockSiteServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status: int, body: bytes, content_type: str, *, declared_length: int | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(declared_length if declared_length is not None else len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/__reset":
+            self.server.stats.reset()
+            self.send_body(204, b"", "text/plain")
+        elif self.path == GRAPHQL_PATH and not self.server.no_api:
+            self.do_graphql(body)
+        else:
+            self.server.stats.record(route_name(self.path), "404", len(b"Not found"))
+            self.send_body(404, b"Not found", "text/plain")
+
+    def do_graphql(self, body: bytes) -> None:
+        config = self.server
+        if config.latency > 0 or config.jitter > 0:
+            time.sleep(config.latency + config.rng.uniform(0, config.jitter))
+        try:
+            request = json.loads(body or b"{}")
+            variables = request.get("variables") or {}
+            if "budgetInvestments" not in (request.get("query") or ""):
+                raise ValueError("consulta no soportada")
+            payload = config.site.graphql_investments(int(variables.get("first") or 20), variables.get("after"))
+        except (ValueError, TypeError, AttributeError) as exc:
+            payload = {"errors": [{"message": str(exc)}]}
+        response = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        config.stats.record("graphql", "200", len(response))
+        self.send_body(200, response, "application/json")
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        if parts.path == "/__stats":
+            body = json.dumps(self.server.stats.snapshot(), indent=2).encode("utf-8")
+            self.send_body(200, body, "application/json")
+            return
+
+        route = route_name(parts.path)
+        config = self.server
+        if config.latency > 0 or config.jitter > 0:
+            time.sleep(config.latency + config.rng.uniform(0, config.jitter))
+
+        error = config.pick_error()
+        if error == "timeout":
+            config.stats.record(route, "timeout", 0)
+            time.sleep(config.timeout_seconds)
+            self.close_connection = True
+            return
+        if error in {"429", "500", "502", "503"}:
+            body = f"Error {error}".encode("utf-8")
+            config.stats.record(route, error, len(body))
+            self.send_body(int(error), body, "text/plain")
+            return
+
+        page = config.recordings.load(self.path) or config.site.render(parts.path, parse_qs(parts.query))
+        if page is None:
+            body = b"Not found"
+            config.stats.record(route, "404", len(body))
+            self.send_body(404, body, "text/plain")
+            return
+
+        body = page.encode("utf-8")
+        if error == "truncated":
+            cut = body[: len(body) // 2]
+            config.stats.record(route, "truncated", len(cut))
+            self.send_body(200, cut, "text/html; charset=utf-8", declared_length=len(body))
+            self.close_connection = True
+            return
+
+        config.stats.record(route, "200", len(body))
+        self.send_body(200, body, "text/html; charset=utf-8")
+
+
+class MockSiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        site: SiteData,
+        recordings: Recordings,
+        *,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        error_kinds: tuple[str, ...] = ERROR_KINDS,
+        timeout_seconds: float = 30,
+        seed: int | None = None,
+        no_api: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(address, MockSiteHandler)
+        self.site = site
+        self.recordings = recordings
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.error_kinds = error_kinds
+        self.timeout_seconds = timeout_seconds
+        self.no_api = no_api
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = RequestStats()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def pick_error(self) -> str | None:
+        if self.error_rate <= 0 or not self.error_kinds:
+            return None
+        with self.rng_lock:
+            if self.rng.random() >= self.error_rate:
+                return None
+            return self.rng.choice(self.error_kinds)
+
+
+def build_server(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    *,
+    proposals_json: Path = DEFAULT_PROPOSALS_JSON,
+    discovered_urls: Path = DEFAULT_DISCOVERED_URLS,
+    finales_csv: Path = DEFAULT_FINALES_CSV,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    recordings_dir: Path | None = None,
+    record: bool = False,
+    upstream: str = SITE_ORIGIN,
+    **options: Any,
+) -> MockSiteServer:
+    """Crea el servidor sin arrancarlo. `port=0` elige un puerto libre."""
+    proposals = json.loads(proposals_json.read_text(encoding="utf-8"))
+    discovered = json.loads(discovered_urls.read_text(encoding="utf-8")) if discovered_urls.exists() else []
+    finals = []
+    if finales_csv.exists():
+        with finales_csv.open(encoding="utf-8", newline="") as fh:
+            finals = list(csv.DictReader(fh))
+    site = SiteData(proposals, discovered, page_size, finals)
+    return MockSiteServer((host, port), site, Recordings(recordings_dir, record, upstream), **options)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--discovered-urls", type=Path, default=DEFAULT_DISCOVERED_URLS)
+    parser.add_argument("--finales-csv", type=Path, default=DEFAULT_FINALES_CSV, help="Listado final servido con filter=selected")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Tarjetas por pagina de listado")
+    parser.add_argument("--recordings", type=Path, default=None, help="Directorio de paginas grabadas")
+    parser.add_argument("--record", action="store_true", help="Graba en --recordings las paginas que falten")
+    parser.add_argument("--upstream", default=SITE_ORIGIN, help="Servidor real usado con --record")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraccion de peticiones que fallan (0-1)")
+    parser.add_argument(
+        "--error-kinds",
+        default=",".join(ERROR_KINDS),
+        help=f"Tipos de fallo separados por comas: {', '.join(ERROR_KINDS)}",
+    )
+    parser.add_argument("--timeout-seconds", type=float, default=30, help="Espera de los fallos 'timeout'")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--no-api", action="store_true", help="Sin endpoint GraphQL (404), para probar la vuelta al HTML")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    error_kinds = tuple(kind.strip() for kind in args.error_kinds.split(",") if kind.strip())
+    unknown = set(error_kinds) - set(ERROR_KINDS)
+    if unknown:
+        parser.error(f"Tipos de fallo desconocidos: {', '.join(sorted(unknown))}")
+
+    server = build_server(
+        args.host,
+        args.port,
+        proposals_json=args.proposals_json,
+        discovered_urls=args.discovered_urls,
+        finales_csv=args.finales_csv,
+        page_size=args.page_size,
+        recordings_dir=args.recordings,
+        record=args.record,
+        upstream=args.upstream,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_kinds=error_kinds,
+        timeout_seconds=args.timeout_seconds,
+        seed=args.seed,
+        no_api=args.no_api,
+        verbose=args.verbose,
+    )
+    print(f"Servidor simulado en {server.base_url} (PARTICIPATIVOS_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.snapshot(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Lee por OCR las actas de mesa y regenera las columnas derivadas del acta.
+
+Reglas:
+- Cada pagina de `data/actas-mesa/*.pdf` se pasa por tesseract a traves de
+  PyMuPDF. Si la pagina ya tiene capa de texto se usa directamente.
+- El texto de cada pagina se guarda en una cache indexada por SHA-256 del PDF,
+  DPI e idioma, de modo que solo las actas nuevas o modificadas pagan el OCR.
+- Una fila de tabla es una linea que empieza por un codigo de propuesta
+  conocido; su posicion entre las filas del acta da `orden_detectado_en_mesa`.
+- Solo se reescriben filas cuya lectura procede del OCR (o que aun no tienen
+  lectura del acta). Las filas revisadas a mano no se tocan. Una fila OCR de
+  una zona leida que ya no aparece en su acta pierde `aparece_en_mesa` y
+  `orden_detectado_en_mesa`.
+- El OCR no distingue la tabla de seleccionadas de la de descartadas, asi que
+  no decide nada: las propuestas detectadas que aun no estan en el CSV se
+  anaden (con los datos de `proposals_data.json` y `finales-web-clean.csv`)
+  con la decision de la mesa sin determinar, y las filas sin lectura del acta
+  no pasan a seleccionadas por aparecer en una tabla.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+import fitz
+
+from datasets import index_by_code
+from sanitize_acta_pdfs import file_sha256, iter_input_files
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_ACTAS_DIR = ROOT / "data" / "actas-mesa"
+DEFAULT_MESA_CSV = ROOT / "data" / "mesa-final-unificado.csv"
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_FINAL_CSV = ROOT / "data" / "finales-web-clean.csv"
+DEFAULT_CACHE_DIR = ROOT / "data" / "cache" / "acta-ocr"
+OCR_DPI = 300
+OCR_LANGUAGE = "spa"
+
+OCR_RELIABILITY = "media (OCR acta, conviene revisar)"
+OCR_EXTRACT = "ID detectada en tabla/listado de propuestas seleccionadas o ratificadas por la mesa"
+OCR_DECISION = "Seleccionada / ratificada por la mesa"
+OCR_TABLE_EXTRACT = "ID detectada en una tabla del acta (OCR); falta ver si es la de seleccionadas o la de descartadas"
+UNDETERMINED_DECISION = "No detectada con claridad en acta"
+UNDETERMINED_STATUS = "Final pero no detectada en mesa"
+UNDETERMINED_STATUS_NOT_FINAL = "En acta sin decision clara y fuera de la final"
+TABLE_ROW_PATTERN = re.compile(r"^\s*(\d{4})\b")
+
+
+def normalize_text(value: Any) -> str:
+    return str(value or "").strip()
+
+
+def zone_from_acta_name(path: Path) -> str:
+    """`acta-zona-esgueva-1.pdf` -> `Zona Esgueva 1`."""
+    slug = path.stem
+    if slug.startswith("acta-"):
+        slug = slug[len("acta-"):]
+    return " ".join(part.capitalize() for part in slug.split("-"))
+
+
+def page_cache_path(cache_dir: Path, source_sha256: str, page_number: int, dpi: int, language: str) -> Path:
+    return cache_dir / source_sha256 / f"{language}-{dpi}" / f"page-{page_number:03d}.txt"
+
+
+def ocr_page(pdf_path: Path, page_number: int, dpi: int, language: str, tessdata: str | None) -> str:
+    """Worker entry point: devuelve el texto de una pagina, con OCR si hace falta."""
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc[page_number]
+        text = page.get_text() or ""
+        if text.strip():
+            return text
+        textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True, tessdata=tessdata)
+        return page.get_text(textpage=textpage) or ""
+    finally:
+        doc.close()
+
+
+class TesseractMissing(RuntimeError):
+    """Hay paginas sin texto en cache y no se encuentra Tesseract para leerlas."""
+
+
+def check_tesseract(tessdata: str | None) -> None:
+    get_tessdata = getattr(fitz, "get_tessdata", None)
+    if get_tessdata is None:
+        # PyMuPDF antiguo: si falta Tesseract, el error saldra al hacer el OCR.
+        return
+    try:
+        get_tessdata(tessdata)
+    except RuntimeError as exc:
+        raise TesseractMissing(str(exc)) from exc
+
+
+def read_actas(
+    pdfs: list[Path],
+    cache_dir: Path,
+    *,
+    dpi: int,
+    language: str,
+    tessdata: str | None,
+    jobs: int,
+) -> tuple[dict[Path, list[str]], int]:
+    """Devuelve el texto por pagina de cada acta y cuantas paginas se han leido por OCR."""
+    pages_by_pdf: dict[Path, list[str]] = {}
+    missing: list[tuple[Path, int, Path]] = []
+
+    for pdf_path in pdfs:
+        source_sha256 = file_sha256(pdf_path)
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        pages = [""] * page_count
+        for page_number in range(page_count):
+            cache_path = page_cache_path(cache_dir, source_sha256, page_number, dpi, language)
+            if cache_path.exists():
+                pages[page_number] = cache_path.read_text(encoding="utf-8")
+            else:
+                missing.append((pdf_path, page_number, cache_path))
+        pages_by_pdf[pdf_path] = pages
+
+    if missing:
+        check_tesseract(tessdata)
+
+    def store(pdf_path: Path, page_number: int, cache_path: Path, text: str) -> None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(text, encoding="utf-8")
+        pages_by_pdf[pdf_path][page_number] = text
+
+    if jobs > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            future_to_page = {
+                executor.submit(ocr_page, pdf_path, page_number, dpi, language, tessdata): (pdf_path, page_number, cache_path)
+                for pdf_path, page_number, cache_path in missing
+            }
+            for future in as_completed(future_to_page):
+                store(*future_to_page[future], future.result())
+    else:
+        for pdf_path, page_number, cache_path in missing:
+            store(pdf_path, page_number, cache_path, ocr_page(pdf_path, page_number, dpi, language, tessdata))
+
+    return pages_by_pdf, len(missing)
+
+
+def find_table_ids(pages: list[str], known_codes: set[str]) -> list[str]:
+    """Codigos de propuesta que abren una fila de tabla, en orden de aparicion."""
+    found: list[str] = []
+    seen: set[str] = set()
+    for text in pages:
+        for line in text.splitlines():
+            match = TABLE_ROW_PATTERN.match(line)
+            if not match:
+                continue
+            code = match.group(1)
+            if code in known_codes and code not in seen:
+                seen.add(code)
+                found.append(code)
+    return found
+
+
+def load_final_codes(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    with path.open(encoding="utf-8", newline="") as fh:
+        return {normalize_text(row.get("propuesta_id")) for row in csv.DictReader(fh)}
+
+
+def is_ocr_row(row: dict[str, str]) -> bool:
+    return normalize_text(row.get("fiabilidad_lectura_mesa")) in {"", "no aplica", OCR_RELIABILITY}
+
+
+def new_row(
+    headers: list[str],
+    zone: str,
+    code: str,
+    order: int,
+    proposal: dict[str, Any],
+    in_final: bool,
+) -> dict[str, str]:
+    row = {header: "" for header in headers}
+    row.update({
+        "situacion": UNDETERMINED_STATUS if in_final else UNDETERMINED_STATUS_NOT_FINAL,
+        "zona": zone,
+        "propuesta_id": code,
+        "titulo_propuesta": normalize_text(proposal.get("title")),
+        "enlace": normalize_text(proposal.get("url")),
+        "apoyos": normalize_text(proposal.get("votes")),
+        "categoria": " | ".join(proposal.get("categories") or []),
+        "aparece_en_mesa": "SI",
+        "orden_detectado_en_mesa": str(order),
+        "aparece_descartada_en_mesa": "",
+        "decision_mesa": UNDETERMINED_DECISION,
+        "aparece_en_final_126": "SI" if in_final else "NO",
+        "fiabilidad_lectura_mesa": OCR_RELIABILITY,
+        "extracto_acta": OCR_TABLE_EXTRACT,
+    })
+    return row
+
+
+def apply_detections(
+    rows: list[dict[str, str]],
+    headers: list[str],
+    detections: dict[str, list[str]],
+    proposals_by_code: dict[str, dict[str, Any]],
+    final_codes: set[str],
+) -> dict[str, int]:
+    stats = {"updated_rows": 0, "added_rows": 0, "cleared_rows": 0, "manual_rows_kept": 0}
+    rows_by_key = {(row.get("zona"), normalize_text(row.get("propuesta_id"))): row for row in rows}
+    detected = {(zone, code) for zone, codes in detections.items() for code in codes}
+
+    for zone, codes in detections.items():
+        for order, code in enumerate(codes, start=1):
+            row = rows_by_key.get((zone, code))
+            if row is None:
+                row = new_row(headers, zone, code, order, proposals_by_code.get(code, {}), code in final_codes)
+                rows.append(row)
+                rows_by_key[(zone, code)] = row
+                stats["added_rows"] += 1
+                continue
+
+            if not is_ocr_row(row):
+                stats["manual_rows_kept"] += 1
+                continue
+
+            new_values = {
+                "aparece_en_mesa": "SI",
+                "orden_detectado_en_mesa": str(order),
+                "fiabilidad_lectura_mesa": OCR_RELIABILITY,
+                "extracto_acta": OCR_EXTRACT if row.get("decision_mesa") == OCR_DECISION else OCR_TABLE_EXTRACT,
+            }
+            if any(normalize_text(row.get(key)) != value for key, value in new_values.items()):
+                row.update(new_values)
+                stats["updated_rows"] += 1
+
+    # Filas OCR de las actas leidas que esta vez no aparecen en ninguna tabla.
+    for row in rows:
+        key = (row.get("zona"), normalize_text(row.get("propuesta_id")))
+        if key[0] not in detections or key in detected or not is_ocr_row(row):
+            continue
+        if row.get("aparece_en_mesa") == "SI" or normalize_text(row.get("orden_detectado_en_mesa")):
+            row.update({"aparece_en_mesa": "NO", "orden_detectado_en_mesa": ""})
+            if row.get("extracto_acta") in (OCR_EXTRACT, OCR_TABLE_EXTRACT):
+                row["extracto_acta"] = ""
+            stats["cleared_rows"] += 1
+
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actas", type=Path, default=DEFAULT_ACTAS_DIR, help="Acta PDF o directorio de actas")
+    parser.add_argument("--mesa-csv", type=Path, default=DEFAULT_MESA_CSV)
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--final-csv", type=Path, default=DEFAULT_FINAL_CSV)
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--dpi", type=int, default=OCR_DPI)
+    parser.add_argument("--language", default=OCR_LANGUAGE)
+    parser.add_argument("--tessdata", default=None, help="Directorio tessdata si no se detecta solo")
+    parser.add_argument("--jobs", type=int, default=0, help="Procesos de OCR (0 = todos los nucleos)")
+    args = parser.parse_args()
+
+    pdfs = iter_input_files(args.actas)
+    if not pdfs:
+        raise SystemExit(f"No hay actas en {args.actas}")
+
+    proposals_by_code = index_by_code(json.loads(args.proposals_json.read_text(encoding="utf-8")))
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    try:
+        pages_by_pdf, ocr_pages = read_actas(
+            pdfs,
+            args.cache_dir,
+            dpi=args.dpi,
+            language=args.language,
+            tessdata=args.tessdata,
+            jobs=jobs,
+        )
+    except TesseractMissing as exc:
+        raise SystemExit(f"{exc}: instala tesseract con el idioma {args.language} o indica --tessdata")
+    detections = {
+        zone_from_acta_name(pdf_path): find_table_ids(pages, set(proposals_by_code))
+        for pdf_path, pages in pages_by_pdf.items()
+    }
+
+    with args.mesa_csv.open(encoding="utf-8", newline="") as fh:
+        reader = csv.DictReader(fh)
+        headers = list(reader.fieldnames or [])
+        rows = list(reader)
+
+    stats = apply_detections(rows, headers, detections, proposals_by_code, load_final_codes(args.final_csv))
+
+    with args.mesa_csv.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"Actas leidas: {len(pdfs)}")
+    print(f"Paginas leidas por OCR (resto desde cache): {ocr_pages}")
+    for zone, codes in detections.items():
+        print(f"  {zone}: {len(codes)} IDs en tablas")
+    print(f"Filas OCR actualizadas: {stats['updated_rows']}")
+    print(f"Filas nuevas: {stats['added_rows']}")
+    print(f"Filas OCR que ya no aparecen en su acta: {stats['cleared_rows']}")
+    print(f"Filas revisadas a mano sin tocar: {stats['manual_rows_kept']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
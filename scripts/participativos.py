@@ -0,0 +1,745 @@
+#!/usr/bin/env python3
+"""Pipeline completo de datos: un solo comando para todas las etapas.
+
+    python3 scripts/participativos.py                 # refresco completo
+    python3 scripts/participativos.py enrich          # enrich y lo que necesite antes
+    python3 scripts/participativos.py --offline       # sin etapas de red
+    python3 scripts/participativos.py --dry-run       # que se ejecutaria y por que
+
+Cada etapa declara sus dependencias, sus ficheros de entrada y de salida:
+
+    scrape ─> votes ─> retry ─┬──────────────┐
+                              └─> finales ───┼─> ocr ─> enrich ─> mesa_analysis, joined
+    sanitize ────────────────────────────────┘
+    retry + finales ─> projection, simulation
+    retry ─> duplicates, export
+    joined ─> static
+
+Reglas:
+- Las etapas de red (`scrape`, `votes`, `retry`, `finales`) siempre se lanzan salvo con
+  `--offline`; cada una decide si hay trabajo (propuestas nuevas, intervalo
+  minimo de `update_votes`, errores que reintentar).
+- Las etapas locales se saltan si sus entradas tienen el mismo SHA-256 que en
+  la ultima ejecucion correcta, sus salidas no se han tocado desde entonces y
+  ninguna dependencia ha cambiado sus salidas en esta ejecucion.
+- Los datos compartidos (`proposals_data.json`, `mesa-final-unificado.csv`) se
+  cargan una vez y pasan en memoria de una etapa a la siguiente. Las etapas
+  que leen `proposals_data.json` dependen de `retry`, la ultima que lo escribe.
+- Una etapa que no puede ejecutarse (sin NumPy, sin Tesseract, sin topes de zona)
+  lanza `StageSkipped`: no cuenta como fallo ni se guarda en el estado, asi que
+  se vuelve a intentar en la siguiente ejecucion.
+- Las etapas independientes corren en paralelo (`--jobs`).
+
+El estado se guarda en `data/cache/pipeline_state.json` y los tiempos por
+etapa en `logs/pipeline_metrics.json`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from datasets import index_by_code
+from run_metrics import RunMetrics
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = ROOT / "data"
+LOGS_DIR = ROOT / "logs"
+PROPOSALS_JSON = DATA_DIR / "proposals_data.json"
+PROPOSALS_CSV = DATA_DIR / "proposals_data.csv"
+DISCOVERED_URLS = DATA_DIR / "discovered_urls.json"
+ACTAS_DIR = DATA_DIR / "actas-mesa"
+MESA_CSV = DATA_DIR / "mesa-final-unificado.csv"
+FINAL_CSV = DATA_DIR / "finales-web-clean.csv"
+FINALES_JSON = DATA_DIR / "finales.json"
+ZONE_CAPS_JSON = DATA_DIR / "zone_caps.json"
+RULES_JSON = DATA_DIR / "exclusion_reason_rules.json"
+MESA_ANALYSIS_JSON = DATA_DIR / "mesa-analysis.json"
+METADATA_JSON = DATA_DIR / "proposals_metadata.json"
+JOINED_JSON = DATA_DIR / "cache" / "proposals_joined.json"
+PROJECTION_JSON = DATA_DIR / "projection.json"
+OUTCOMES_JSON = DATA_DIR / "outcome_probabilities.json"
+DUPLICATES_JSON = DATA_DIR / "duplicate_clusters.json"
+STATIC_MANIFEST_JSON = DATA_DIR / "static_pages.json"
+PROPOSALS_PARQUET = DATA_DIR / "proposals_data.parquet"
+PROPOSALS_PACKED = DATA_DIR / "proposals_data.cols"
+DEFAULT_STATE_JSON = DATA_DIR / "cache" / "pipeline_state.json"
+METRICS_JSON = LOGS_DIR / "pipeline_metrics.json"
+
+
+def relative(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(ROOT).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def path_fingerprint(path: Path) -> str | None:
+    """SHA-256 de un fichero, o de la lista (nombre, hash) de los PDF de un directorio."""
+    if path.is_dir():
+        digest = hashlib.sha256()
+        for child in sorted(path.glob("*.pdf")):
+            digest.update(child.name.encode("utf-8"))
+            digest.update(path_fingerprint(child).encode("ascii"))
+        return digest.hexdigest()
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SharedData:
+    """Ficheros de datos cargados una sola vez y compartidos entre etapas."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        # Clave (fichero, vista): la vista "" es el contenido; las demas se derivan de el.
+        self._values: dict[tuple[Path, str], tuple[tuple[int, int], Any]] = {}
+
+    @staticmethod
+    def _stamp(path: Path) -> tuple[int, int]:
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: Path, loader: Callable[[Path], Any], view: str = "") -> Any:
+        with self._lock:
+            cached = self._values.get((path, view))
+            if cached is not None and cached[0] == self._stamp(path):
+                return cached[1]
+            value = loader(path)
+            self._values[(path, view)] = (self._stamp(path), value)
+            return value
+
+    def put(self, path: Path, value: Any) -> None:
+        """Registra el valor que una etapa acaba de escribir en `path`."""
+        with self._lock:
+            self._values[(path, "")] = (self._stamp(path), value)
+
+    def proposals(self) -> list[dict[str, Any]]:
+        return self.get(PROPOSALS_JSON, lambda path: json.loads(path.read_text(encoding="utf-8")))
+
+    def proposals_by_code(self) -> dict[str, dict[str, Any]]:
+        # Indexa los mismos dicts de `proposals()`; se rehace cuando cambia el fichero.
+        return self.get(PROPOSALS_JSON, lambda path: index_by_code(self.proposals()), view="by_code")
+
+    def mesa_table(self) -> tuple[list[str], list[dict[str, str]]]:
+        def load(path: Path) -> tuple[list[str], list[dict[str, str]]]:
+            with path.open(encoding="utf-8", newline="") as fh:
+                reader = csv.DictReader(fh)
+                return list(reader.fieldnames or []), list(reader)
+
+        return self.get(MESA_CSV, load)
+
+
+@dataclass
+class PipelineContext:
+    args: argparse.Namespace
+    data: SharedData = field(default_factory=SharedData)
+    metrics: RunMetrics = field(default_factory=lambda: RunMetrics("pipeline"))
+    # Codigos que `votes` no pudo actualizar en esta ejecucion (los consume `retry`).
+    vote_errors: list[str] = field(default_factory=list)
+
+
+class StageSkipped(Exception):
+    """La etapa no puede ejecutarse aqui (falta una herramienta opcional); el mensaje es la nota."""
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[PipelineContext], str | None]
+    description: str
+    deps: tuple[str, ...] = ()
+    inputs: tuple[Path, ...] = ()
+    # Entradas que son solo una parte de un fichero: (nombre, funcion sobre los datos compartidos).
+    derived_inputs: tuple[tuple[str, Callable[[SharedData], Any]], ...] = ()
+    outputs: tuple[Path, ...] = ()
+    network: bool = False
+
+
+STAGES: dict[str, Stage] = {}
+
+
+def stage(name: str, description: str, **options: Any) -> Callable:
+    def decorator(run: Callable[[PipelineContext], str | None]) -> Callable:
+        STAGES[name] = Stage(name, run, description, **options)
+        return run
+
+    return decorator
+
+
+def ensure_logs_dir() -> None:
+    # update_votes y retry_failed_proposals abren su log en logs/ al importarse.
+    LOGS_DIR.mkdir(exist_ok=True)
+
+
+@stage(
+    "scrape",
+    "Descubre propuestas y extrae las que faltan (scrape_budgets.py)",
+    outputs=(PROPOSALS_JSON, PROPOSALS_CSV, DISCOVERED_URLS),
+    network=True,
+)
+def run_scrape(ctx: PipelineContext) -> str | None:
+    import scrape_budgets
+
+    scrape_budgets.run(argparse.Namespace(
+        force_discovery=ctx.args.discover,
+        backfill_budget=None,
+        backfill_ids=None,
+        audit_budget=None,
+        audit_all_budgets=False,
+        sync_missing=False,
+        backfill_zones=False,
+        api=ctx.args.api,
+    ))
+    return None
+
+
+@stage(
+    "votes",
+    "Refresca los apoyos de todas las propuestas (update_votes.py)",
+    deps=("scrape",),
+    outputs=(PROPOSALS_JSON,),
+    network=True,
+)
+def run_votes(ctx: PipelineContext) -> str | None:
+    ensure_logs_dir()
+    import update_votes
+
+    updater = update_votes.VoteUpdater(from_listings=ctx.args.votes_from_listings)
+    progress = updater.load_progress()
+    should_update, reason = updater.should_update(progress)
+    if not should_update:
+        return f"sin refresco: {reason}"
+    if not updater.create_backup():
+        raise RuntimeError("No se pudo crear el backup de proposals_data.json")
+
+    proposals = ctx.data.proposals()
+    previous_errors = len(progress.get("errors", []))
+    if updater.from_listings:
+        updater.update_from_listings(proposals, progress)
+    else:
+        updater.update_proposals(proposals, progress)
+    updater.save_proposals(proposals)
+    ctx.data.put(PROPOSALS_JSON, proposals)
+    updater.mark_complete(progress)
+    updater.generate_report(progress)
+
+    ctx.vote_errors = [error["code"] for error in progress.get("errors", [])[previous_errors:]]
+    return f"{updater.processed_count} procesadas, {updater.updated_count} actualizadas, {updater.error_count} errores"
+
+
+@stage(
+    "retry",
+    "Reintenta las propuestas que fallaron en votes (retry_failed_proposals.py)",
+    deps=("votes",),
+    outputs=(PROPOSALS_JSON,),
+    network=True,
+)
+def run_retry(ctx: PipelineContext) -> str | None:
+    if not ctx.vote_errors:
+        return "sin errores que reintentar"
+    ensure_logs_dir()
+    import retry_failed_proposals
+
+    retry = retry_failed_proposals.FailedProposalsRetry()
+    proposals = ctx.data.proposals()
+    failed_codes = set(ctx.vote_errors)
+    failed = [proposal for proposal in proposals if proposal.get("code") in failed_codes]
+    # Las propuestas son los mismos dicts de `proposals`: se actualizan en su sitio.
+    _, results = retry.retry_failed_proposals(failed)
+    retry.save_proposals(proposals)
+    ctx.data.put(PROPOSALS_JSON, proposals)
+    retry.generate_report(results)
+    return f"{retry.updated_count} actualizadas, {retry.error_count} errores persistentes"
+
+
+@stage(
+    "finales",
+    "Lee el listado final con importes en centimos y valida los topes por zona (scrape_finales.py)",
+    deps=("retry",),
+    outputs=(FINAL_CSV, FINALES_JSON),
+    network=True,
+)
+def run_finales(ctx: PipelineContext) -> str | None:
+    import scrape_finales
+
+    artifact = scrape_finales.run(argparse.Namespace(
+        budget_id=scrape_finales.DEFAULT_BUDGET_ID,
+        filter=scrape_finales.DEFAULT_FILTER,
+        csv=FINAL_CSV,
+        output=FINALES_JSON,
+        proposals_json=PROPOSALS_JSON,
+        caps_json=ZONE_CAPS_JSON,
+        from_csv=False,
+    ))
+    problems = scrape_finales.validate(artifact)
+    for problem in problems:
+        print(f"[!] finales: {problem}")
+    return f"{len(artifact['rows'])} propuestas, {len(problems)} avisos de validacion"
+
+
+@stage(
+    "sanitize",
+    "Aplana las actas originales de --actas-src en data/actas-mesa (sanitize_acta_pdfs.py)",
+    outputs=(ACTAS_DIR,),
+)
+def run_sanitize(ctx: PipelineContext) -> str | None:
+    if ctx.args.actas_src is None:
+        return "sin --actas-src"
+    import sanitize_acta_pdfs as sanitize
+
+    settings = sanitize.RasterSettings()
+    manifest_path = ACTAS_DIR / sanitize.MANIFEST_NAME
+    manifest = sanitize.load_manifest(manifest_path)
+    jobs = [(pdf, ACTAS_DIR / pdf.name) for pdf in sanitize.iter_input_files(ctx.args.actas_src)]
+    hashes = {pdf: sanitize.file_sha256(pdf) for pdf, _ in jobs}
+    pending = [
+        (pdf, output)
+        for pdf, output in jobs
+        if not sanitize.is_up_to_date(manifest.get(output.name), hashes[pdf], settings, output)
+    ]
+    if not pending:
+        return "actas al dia"
+
+    ACTAS_DIR.mkdir(parents=True, exist_ok=True)
+    residuals = sanitize.sanitize_pdfs_parallel(pending, settings, os.cpu_count() or 1)
+    for (pdf, output), residual_chars in zip(pending, residuals):
+        manifest[output.name] = {
+            "source": pdf.name,
+            "source_sha256": hashes[pdf],
+            "settings": asdict(settings),
+            "residual_text_chars": residual_chars,
+        }
+    sanitize.save_manifest(manifest_path, manifest)
+    return f"{len(pending)} actas aplanadas"
+
+
+@stage(
+    "ocr",
+    "Relee las actas de mesa y actualiza mesa-final-unificado.csv (ocr_mesa_actas.py)",
+    deps=("retry", "finales", "sanitize"),
+    inputs=(ACTAS_DIR, FINAL_CSV),
+    # Los apoyos no cambian lo que se detecta en las actas: solo cuenta que codigos existen.
+    derived_inputs=(("proposal_codes", lambda data: sorted(data.proposals_by_code()) if PROPOSALS_JSON.exists() else None),),
+    outputs=(MESA_CSV,),
+)
+def run_ocr(ctx: PipelineContext) -> str | None:
+    import ocr_mesa_actas as ocr
+
+    proposals_by_code = ctx.data.proposals_by_code()
+    try:
+        pages_by_pdf, ocr_pages = ocr.read_actas(
+            ocr.iter_input_files(ACTAS_DIR),
+            ocr.DEFAULT_CACHE_DIR,
+            dpi=ocr.OCR_DPI,
+            language=ocr.OCR_LANGUAGE,
+            tessdata=None,
+            jobs=os.cpu_count() or 1,
+        )
+    except ocr.TesseractMissing:
+        raise StageSkipped("sin Tesseract ni texto en cache; se mantiene mesa-final-unificado.csv")
+    detections = {
+        ocr.zone_from_acta_name(pdf_path): ocr.find_table_ids(pages, set(proposals_by_code))
+        for pdf_path, pages in pages_by_pdf.items()
+    }
+    headers, rows = ctx.data.mesa_table()
+    stats = ocr.apply_detections(rows, headers, detections, proposals_by_code, ocr.load_final_codes(FINAL_CSV))
+    with MESA_CSV.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+    ctx.data.put(MESA_CSV, (headers, rows))
+    return (
+        f"{ocr_pages} paginas por OCR, {stats['updated_rows']} filas actualizadas, {stats['added_rows']} nuevas, "
+        f"{stats['cleared_rows']} ya no detectadas"
+    )
+
+
+@stage(
+    "enrich",
+    "Completa motivos y tipos de exclusion de la mesa (enrich_mesa_exclusion_reasons.py)",
+    deps=("ocr",),
+    inputs=(PROPOSALS_JSON, RULES_JSON),
+    outputs=(MESA_CSV,),
+)
+def run_enrich(ctx: PipelineContext) -> str | None:
+    import enrich_mesa_exclusion_reasons as enrich
+
+    proposals_by_code = ctx.data.proposals_by_code()
+    cache_json = enrich.DEFAULT_CACHE_JSON
+    reason_cache = enrich.load_reason_cache(cache_json)
+    headers, rows = ctx.data.mesa_table()
+    rows, changed, stats = enrich.enrich_rows(
+        rows,
+        proposals_by_code,
+        skip_web=ctx.args.offline,
+        reason_cache=reason_cache,
+        cache_ttl=timedelta(hours=enrich.DEFAULT_CACHE_TTL_HOURS),
+        metrics=ctx.metrics,
+    )
+    enrich.write_csv(MESA_CSV, rows)
+    if stats["fetched_urls"]:
+        enrich.save_reason_cache(cache_json, reason_cache)
+    ctx.data.put(MESA_CSV, (headers, rows))
+    ctx.metrics.count("cache_lookups", stats["store_reason_rows"] + stats["cached_reason_rows"], cache="inviability_reasons", result="hit")
+    ctx.metrics.count("cache_lookups", stats["fetched_urls"], cache="inviability_reasons", result="miss")
+    return f"{changed} filas actualizadas, {stats['fetched_urls']} fichas descargadas"
+
+
+@stage(
+    "mesa_analysis",
+    "Precalcula los datos de la pagina de mesas (export_mesa_analysis.py)",
+    deps=("enrich", "finales"),
+    inputs=(MESA_CSV, FINALES_JSON),
+    outputs=(MESA_ANALYSIS_JSON,),
+)
+def run_mesa_analysis(ctx: PipelineContext) -> str | None:
+    import export_mesa_analysis
+
+    _, rows = ctx.data.mesa_table()
+    analysis = export_mesa_analysis.build_analysis(rows, export_mesa_analysis.load_finales(FINALES_JSON))
+    export_mesa_analysis.write_analysis(MESA_ANALYSIS_JSON, analysis)
+    return f"{len(analysis['rows'])} filas exportadas"
+
+
+@stage(
+    "metadata",
+    "Genera categoria, etiquetas y resumen de las propuestas nuevas o cambiadas (generate_metadata.py)",
+    deps=("retry",),
+    inputs=(PROPOSALS_JSON,),
+    outputs=(METADATA_JSON,),
+)
+def run_metadata(ctx: PipelineContext) -> str | None:
+    import generate_metadata
+
+    generated = generate_metadata.run(PROPOSALS_JSON, METADATA_JSON)
+    return f"{generated} entradas generadas"
+
+
+@stage(
+    "joined",
+    "Vista unida de propuestas, metadatos, mesa y listado final por codigo (datasets.py)",
+    deps=("enrich", "finales", "metadata"),
+    inputs=(PROPOSALS_JSON, METADATA_JSON, MESA_CSV, FINALES_JSON),
+    outputs=(JOINED_JSON,),
+)
+def run_joined(ctx: PipelineContext) -> str | None:
+    import datasets
+
+    artifact = datasets.Datasets(DATA_DIR).write_joined(JOINED_JSON)
+    return f"{len(artifact['rows'])} propuestas unidas"
+
+
+@stage(
+    "projection",
+    "Ganadoras proyectadas por zona con los apoyos actuales (project_winners.py)",
+    deps=("retry", "finales"),
+    inputs=(PROPOSALS_JSON, FINALES_JSON, ZONE_CAPS_JSON),
+    outputs=(PROJECTION_JSON,),
+)
+def run_projection(ctx: PipelineContext) -> str | None:
+    import project_winners
+
+    try:
+        artifact, touched = project_winners.run(
+            finales_json=FINALES_JSON,
+            output=PROJECTION_JSON,
+            votes_by_code=project_winners.votes_from_proposals(ctx.data.proposals()),
+            caps_json=ZONE_CAPS_JSON,
+        )
+    except project_winners.MissingCaps as exc:
+        raise StageSkipped(f"sin tope en {len(exc.names)} zonas (data/zone_caps.json)")
+    winners = sum(zone["winners"] for zone in artifact["zones"])
+    return f"{winners} ganadoras proyectadas, {touched} zonas recalculadas"
+
+
+@stage(
+    "simulation",
+    "Probabilidad de entrar al cierre de apoyos por Monte Carlo (simulate_outcomes.py)",
+    deps=("retry", "finales"),
+    inputs=(PROPOSALS_JSON, FINALES_JSON, ZONE_CAPS_JSON),
+    outputs=(OUTCOMES_JSON,),
+)
+def run_simulation(ctx: PipelineContext) -> str | None:
+    import project_winners
+    import simulate_outcomes
+
+    if simulate_outcomes.np is None:
+        raise StageSkipped("sin NumPy")
+    try:
+        artifact = simulate_outcomes.run(PROPOSALS_JSON, FINALES_JSON, OUTCOMES_JSON, caps_json=ZONE_CAPS_JSON)
+    except project_winners.MissingCaps as exc:
+        raise StageSkipped(f"sin tope en {len(exc.names)} zonas (data/zone_caps.json)")
+    return f"{artifact['trials']} escenarios, {artifact['horizon_hours']} horas hasta el cierre"
+
+
+@stage(
+    "duplicates",
+    "Agrupa propuestas casi duplicadas con MinHash + LSH (find_duplicates.py)",
+    deps=("retry",),
+    inputs=(PROPOSALS_JSON,),
+    outputs=(DUPLICATES_JSON,),
+)
+def run_duplicates(ctx: PipelineContext) -> str | None:
+    import find_duplicates
+
+    artifact, computed = find_duplicates.run(output=DUPLICATES_JSON, proposals=ctx.data.proposals())
+    return f"{len(artifact['clusters'])} grupos, {computed} firmas nuevas"
+
+
+@stage(
+    "export",
+    "Export columnar tipado: Parquet con pyarrow, formato propio sin el (export_columnar.py)",
+    deps=("retry",),
+    inputs=(PROPOSALS_JSON,),
+    outputs=(PROPOSALS_PARQUET, PROPOSALS_PACKED),
+)
+def run_export(ctx: PipelineContext) -> str | None:
+    import export_columnar
+
+    output, table = export_columnar.run(PROPOSALS_JSON, proposals=ctx.data.proposals())
+    return f"{table.rows} filas en {relative(output)}"
+
+
+@stage(
+    "static",
+    "Paginas HTML de cada propuesta y zona, solo las que cambian (render_static.py)",
+    deps=("joined",),
+    inputs=(PROPOSALS_JSON, METADATA_JSON, MESA_CSV, FINALES_JSON),
+    outputs=(STATIC_MANIFEST_JSON,),
+)
+def run_static(ctx: PipelineContext) -> str | None:
+    import render_static
+
+    stats = render_static.run(DATA_DIR, ROOT, STATIC_MANIFEST_JSON)
+    return f"{stats['written']} paginas escritas, {stats['unchanged']} sin cambios, {stats['removed']} borradas"
+
+
+def load_state(path: Path) -> dict[str, Any]:
+    if not path.exists():
+        return {"files": {}, "stages": {}}
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"files": {}, "stages": {}}
+    state.setdefault("files", {})
+    state.setdefault("stages", {})
+    return state
+
+
+def save_state(path: Path, state: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def stage_inputs(spec: Stage, data: SharedData) -> dict[str, str | None]:
+    # Un fichero que la etapa tambien escribe no cuenta como entrada: lo vigila `outputs_untouched`.
+    own_outputs = set(spec.outputs)
+    inputs = {relative(path): path_fingerprint(path) for path in spec.inputs if path not in own_outputs}
+    for name, derive in spec.derived_inputs:
+        value = json.dumps(derive(data), sort_keys=True, ensure_ascii=False)
+        inputs[name] = hashlib.sha256(value.encode("utf-8")).hexdigest()
+    return inputs
+
+
+def outputs_untouched(spec: Stage, state: dict[str, Any]) -> bool:
+    files = state["files"]
+    return all(
+        relative(path) in files and path_fingerprint(path) == files[relative(path)]
+        for path in spec.outputs
+    )
+
+
+def select_stages(targets: list[str], with_deps: bool) -> list[str]:
+    """Etapas pedidas (y sus dependencias) en orden topologico."""
+    wanted = set(targets or STAGES)
+    if with_deps:
+        pending = list(wanted)
+        while pending:
+            for dep in STAGES[pending.pop()].deps:
+                if dep not in wanted:
+                    wanted.add(dep)
+                    pending.append(dep)
+
+    ordered: list[str] = []
+    visiting: set[str] = set()
+
+    def visit(name: str) -> None:
+        if name in ordered:
+            return
+        if name in visiting:
+            raise SystemExit(f"Ciclo en el pipeline en la etapa {name}")
+        visiting.add(name)
+        for dep in STAGES[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        if name in wanted:
+            ordered.append(name)
+
+    for name in STAGES:
+        visit(name)
+    return ordered
+
+
+class Pipeline:
+    def __init__(self, ctx: PipelineContext, selected: list[str], state_path: Path):
+        self.ctx = ctx
+        self.selected = selected
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        self.state_lock = threading.Lock()
+        self.changed: dict[str, bool] = {}
+        self.failed: set[str] = set()
+
+    def skip_reason(self, spec: Stage) -> str | None:
+        args = self.ctx.args
+        if spec.name in args.skip:
+            return "--skip"
+        if spec.network:
+            return "--offline" if args.offline else None
+        if spec.name in args.force or "all" in args.force:
+            return None
+        if any(self.changed.get(dep) for dep in spec.deps):
+            return None
+        previous = self.state["stages"].get(spec.name)
+        if previous is None:
+            return None
+        if previous.get("inputs") != stage_inputs(spec, self.ctx.data) or not outputs_untouched(spec, self.state):
+            return None
+        return "entradas sin cambios"
+
+    def execute(self, name: str) -> tuple[str, str | None]:
+        spec = STAGES[name]
+        before = {relative(path): path_fingerprint(path) for path in spec.outputs}
+        inputs = stage_inputs(spec, self.ctx.data)
+        started = time.perf_counter()
+        try:
+            with self.ctx.metrics.stage(name):
+                note = spec.run(self.ctx)
+        except StageSkipped as skipped:
+            # Sin guardar estado: en cuanto el entorno lo permita se ejecuta de nuevo.
+            with self.state_lock:
+                self.changed[name] = False
+            return "omitida", str(skipped)
+        after = {relative(path): path_fingerprint(path) for path in spec.outputs}
+
+        with self.state_lock:
+            self.changed[name] = before != after
+            self.state["files"].update(after)
+            self.state["stages"][name] = {
+                "inputs": inputs,
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+            save_state(self.state_path, self.state)
+        return "cambios" if self.changed[name] else "sin cambios", note
+
+    def run(self) -> int:
+        remaining = list(self.selected)
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.ctx.args.jobs)) as executor:
+            while remaining or running:
+                for name in list(remaining):
+                    spec = STAGES[name]
+                    deps = [dep for dep in spec.deps if dep in self.selected]
+                    if any(dep in self.failed for dep in deps):
+                        remaining.remove(name)
+                        self.failed.add(name)
+                        print(f"[-] {name}: omitida (fallo en una dependencia)")
+                        continue
+                    if any(dep in remaining or dep in running.values() for dep in deps):
+                        continue
+                    remaining.remove(name)
+                    reason = self.skip_reason(spec)
+                    if reason:
+                        self.changed[name] = False
+                        print(f"[=] {name}: omitida ({reason})")
+                        continue
+                    print(f"[>] {name}: {spec.description}")
+                    running[executor.submit(self.execute, name)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    elapsed = self.state["stages"].get(name, {}).get("seconds", 0)
+                    try:
+                        outcome, note = future.result()
+                    except Exception as exc:
+                        self.failed.add(name)
+                        print(f"[!] {name}: error: {exc}", file=sys.stderr)
+                        continue
+                    suffix = f" - {note}" if note else ""
+                    print(f"[+] {name}: {outcome} en {elapsed:.1f}s{suffix}")
+
+        LOGS_DIR.mkdir(exist_ok=True)
+        self.ctx.metrics.write_json(METRICS_JSON)
+        return 1 if self.failed else 0
+
+    def plan(self) -> None:
+        # Sin ejecutar no se sabe si las dependencias cambiaran sus salidas: una etapa
+        # marcada para omitir aun se ejecutara si alguna dependencia produce cambios.
+        for name in self.selected:
+            reason = self.skip_reason(STAGES[name])
+            print(f"{name:14} {f'omitir ({reason})' if reason else 'ejecutar'}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pipeline de datos de participativos")
+    parser.add_argument("targets", nargs="*", metavar="etapa",
+                        help=f"Etapas a ejecutar (por defecto todas): {', '.join(STAGES)}")
+    parser.add_argument("--no-deps", action="store_true", help="No ejecutar las dependencias de las etapas pedidas")
+    parser.add_argument("--skip", nargs="+", default=[], choices=list(STAGES), help="Etapas que no se ejecutan")
+    parser.add_argument("--force", nargs="*", default=None, help="Ejecuta aunque no haya cambios (sin nombres: todas)")
+    parser.add_argument("--offline", action="store_true", help="Omite las etapas de red y no descarga motivos en enrich")
+    parser.add_argument("--discover", action="store_true", help="Redescubre las URLs de propuestas en scrape")
+    parser.add_argument("--api", action="store_true", help="En scrape, pide las propuestas nuevas a la API GraphQL")
+    parser.add_argument("--votes-from-listings", action="store_true",
+                        help="En votes, lee los apoyos de los listados por zona en vez de ficha a ficha")
+    parser.add_argument("--actas-src", type=Path, default=None, help="Directorio de actas originales para sanitize")
+    parser.add_argument("--jobs", type=int, default=2, help="Etapas independientes en paralelo")
+    parser.add_argument("--state", type=Path, default=DEFAULT_STATE_JSON)
+    parser.add_argument("--dry-run", action="store_true", help="Muestra que etapas se ejecutarian")
+    parser.add_argument("--list", action="store_true", help="Lista las etapas")
+    args = parser.parse_args()
+
+    if args.list:
+        for spec in STAGES.values():
+            deps = f" (tras {', '.join(spec.deps)})" if spec.deps else ""
+            print(f"{spec.name:14} {spec.description}{deps}")
+        return 0
+
+    if args.force is None:
+        args.force = []
+    elif not args.force:
+        args.force = ["all"]
+    for option, names in (("etapa", args.targets), ("--force", args.force)):
+        unknown = set(names) - set(STAGES) - {"all"}
+        if unknown:
+            parser.error(f"{option}: etapas desconocidas: {', '.join(sorted(unknown))}")
+
+    pipeline = Pipeline(PipelineContext(args), select_stages(args.targets, not args.no_deps), args.state)
+    if args.dry_run:
+        pipeline.plan()
+        return 0
+    return pipeline.run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Perfilado opcional de los scripts (`--profile`).
+
+`profile_run(nombre)` envuelve una ejecucion y deja en `logs/`:
+
+- `<nombre>-profile-<fecha>.folded`: pilas colapsadas (formato de
+  `flamegraph.pl`, inferno o speedscope) de todos los hilos, obtenidas por
+  muestreo, con peso en milisegundos de pared.
+- `<nombre>-profile-<fecha>.prof`: salida de cProfile del hilo principal,
+  legible con `pstats` o snakeviz.
+- `<nombre>-profile-<fecha>.txt`: funciones con mas tiempo de pared y de CPU
+  (propio e inclusivo) segun el muestreo, y el top de cProfile.
+
+cProfile solo ve el hilo en el que se activa; el muestreo cubre tambien los
+hilos de `ThreadPoolExecutor`, que es donde los scrapers pasan el tiempo. El
+CPU por funcion se reparte a partir del reloj de CPU de cada hilo
+(`pthread_getcpuclockid`); donde no existe solo se informa del tiempo de pared.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROFILE_DIR = ROOT / "logs"
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 30
+
+Stack = tuple[str, ...]
+
+
+@lru_cache(maxsize=None)
+def code_label(code) -> str:
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({'/'.join(path.parts[-2:])}:{code.co_firstlineno})"
+
+
+def thread_cpu_clock(ident: int | None) -> int | None:
+    getter = getattr(time, "pthread_getcpuclockid", None)
+    if getter is None or ident is None:
+        return None
+    try:
+        return getter(ident)
+    except (OSError, OverflowError):
+        return None
+
+
+class SamplingProfiler:
+    """Muestrea las pilas de todos los hilos cada `interval` segundos desde un hilo propio."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.wall: Counter[Stack] = Counter()
+        self.cpu: Counter[Stack] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._cpu_clocks: dict[int, int | None] = {}
+        self._last_cpu: dict[int, float] = {}
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _thread_cpu(self, ident: int) -> float | None:
+        if ident not in self._cpu_clocks:
+            self._cpu_clocks[ident] = thread_cpu_clock(ident)
+        clock = self._cpu_clocks[ident]
+        if clock is None:
+            return None
+        try:
+            return time.clock_gettime(clock)
+        except OSError:
+            # El hilo ha terminado entre la enumeracion y la lectura.
+            return None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            names = {thread.ident: re.sub(r"_\d+$", "", thread.name) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack: list[str] = []
+                while frame is not None:
+                    stack.append(code_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(f"thread:{names.get(ident, ident)}")
+                key = tuple(reversed(stack))
+                self.wall[key] += elapsed
+
+                cpu_now = self._thread_cpu(ident)
+                if cpu_now is not None:
+                    previous = self._last_cpu.get(ident, cpu_now)
+                    self._last_cpu[ident] = cpu_now
+                    self.cpu[key] += max(cpu_now - previous, 0.0)
+            self.samples += 1
+
+    def folded(self) -> str:
+        lines = [
+            f"{';'.join(stack)} {max(1, round(seconds * 1000))}"
+            for stack, seconds in sorted(self.wall.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+    def function_table(self, limit: int = TOP_FUNCTIONS) -> list[dict[str, float | str]]:
+        totals: dict[str, dict[str, float]] = {}
+        for source, kind in ((self.wall, "wall"), (self.cpu, "cpu")):
+            for stack, seconds in source.items():
+                frames = [label for label in stack if not label.startswith("thread:")]
+                if not frames:
+                    continue
+                for label in set(frames):
+                    entry = totals.setdefault(label, {"wall_self": 0.0, "wall_total": 0.0, "cpu_self": 0.0, "cpu_total": 0.0})
+                    entry[f"{kind}_total"] += seconds
+                totals[frames[-1]][f"{kind}_self"] += seconds
+        ranked = sorted(totals.items(), key=lambda item: (item[1]["cpu_self"], item[1]["wall_self"]), reverse=True)
+        return [{"function": label, **values} for label, values in ranked[:limit]]
+
+
+def render_report(name: str, sampler: SamplingProfiler, profile: cProfile.Profile, elapsed: float) -> str:
+    out = io.StringIO()
+    out.write(f"Perfil de {name} ({datetime.now().isoformat(timespec='seconds')})\n")
+    out.write(f"Duracion: {elapsed:.2f} s, muestras: {sampler.samples} cada {sampler.interval * 1000:.0f} ms\n")
+    if not sampler.cpu:
+        out.write("(sin reloj de CPU por hilo en esta plataforma: columnas de CPU a cero)\n")
+    out.write("\nFunciones por CPU propia (muestreo, todos los hilos; segundos):\n")
+    out.write(f"{'cpu_self':>9} {'cpu_total':>9} {'wall_self':>9} {'wall_total':>10}  funcion\n")
+    for row in sampler.function_table():
+        out.write(
+            f"{row['cpu_self']:9.3f} {row['cpu_total']:9.3f} {row['wall_self']:9.3f} {row['wall_total']:10.3f}  {row['function']}\n"
+        )
+    out.write("\ncProfile del hilo principal (top por tiempo acumulado):\n")
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+@contextmanager
+def profile_run(
+    name: str,
+    output_dir: str | os.PathLike = DEFAULT_PROFILE_DIR,
+    *,
+    interval: float = SAMPLE_INTERVAL,
+) -> Iterator[Path]:
+    """Perfila el bloque y escribe los ficheros al salir (tambien si hay excepcion)."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    prefix = output_dir / f"{name}-profile-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    sampler = SamplingProfiler(interval)
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    sampler.start()
+    profile.enable()
+    try:
+        yield prefix
+    finally:
+        profile.disable()
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        profile.dump_stats(str(prefix.with_suffix(".prof")))
+        prefix.with_suffix(".folded").write_text(sampler.folded(), encoding="utf-8")
+        prefix.with_suffix(".txt").write_text(render_report(name, sampler, profile, elapsed), encoding="utf-8")
+        print(f"Perfil guardado en {prefix}.{{folded,prof,txt}}", file=sys.stderr)
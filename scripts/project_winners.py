@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""Ganadoras proyectadas por zona con los apoyos actuales y el tope de cada zona.
+
+La seleccion final se decide zona a zona: las propuestas del listado final
+(`finales.json`) se ordenan por apoyos y se recorren en ese orden; entra cada
+una cuyo importe cabe en lo que queda del tope de la zona y las que no caben
+se saltan (puede entrar una mas barata que vaya detras). A igualdad de apoyos
+va antes el codigo menor.
+
+Para cada propuesta se calcula ademas `votes_needed`: los apoyos que le faltan
+para entrar con el resto de apoyos como estan (0 si ya entra, null si su
+importe supera el tope o la zona no tiene tope conocido). Subir puestos solo
+puede dejarle mas presupuesto libre, asi que basta con buscar la primera
+propuesta por delante tras la cual ya no cabria y superarla.
+
+Escribe `data/projection.json` en columnas, como el resto de artefactos
+(`columns`, `rows`, `index.by_code`, `index.by_zone`), sin marcas de tiempo:
+si los apoyos no cambian, el fichero tampoco.
+
+Es incremental: si el artefacto anterior se hizo con los mismos candidatos,
+importes y topes, se parte de su orden y sus resultados, se aplican solo las
+diferencias de apoyos (cada propuesta que cambia se recoloca con una busqueda
+binaria) y solo se recalculan las zonas tocadas. Con NumPy los calculos de
+una zona se hacen en bloque (una fila por candidata); sin NumPy, con bucles.
+`greedy_selection` sirve igual para muchas zonas o muchos escenarios a la vez
+(lo usa `simulate_outcomes.py`).
+
+Los topes salen de `finales.json` (`cap_cents`) y, para las zonas que no lo
+tienen, de la tabla `data/zone_caps.json`; `--cap "Zona Centro=645000"` los
+fija o corrige a mano, en euros. Sin tope no hay seleccion: si alguna zona
+tiene candidatas y ningun tope conocido, no se escribe nada y el script sale
+con codigo 3 (`EXIT_MISSING_CAPS`). `--check-caps` hace solo esa comprobacion,
+para que el workflow no lance la proyeccion mientras falten topes.
+
+    python3 scripts/project_winners.py
+    python3 scripts/project_winners.py --cap "Zona Centro=645000" --full
+    python3 scripts/project_winners.py --check-caps
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable
+
+from datasets import DEFAULT_ZONE_CAPS_JSON, load_zone_caps, normalize_code, to_int
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_FINALES_JSON = ROOT / "data" / "finales.json"
+DEFAULT_OUTPUT_JSON = ROOT / "data" / "projection.json"
+FORMAT_VERSION = 1
+EXIT_MISSING_CAPS = 3
+
+COLUMNS = ["code", "zone", "votes", "amount_cents", "rank", "winner", "votes_needed"]
+# Importe de relleno: nunca cabe, asi una candidata excluida o un hueco no cuenta.
+NEVER_FITS = 1 << 62
+
+
+class MissingCaps(RuntimeError):
+    """Zonas con candidatas y sin tope conocido: su seleccion no se puede calcular."""
+
+    def __init__(self, names: list[str]) -> None:
+        super().__init__(
+            f"{len(names)} zonas con candidatas y sin tope conocido ({', '.join(names)}); "
+            "anota su tope en data/zone_caps.json o pasalo con --cap"
+        )
+        self.names = names
+
+
+def code_order(code: str) -> tuple[int, int, str]:
+    return (0, int(code), "") if code.isdigit() else (1, 0, code)
+
+
+def rank_key(votes: int, code: str) -> tuple[int, tuple[int, int, str]]:
+    return -votes, code_order(code)
+
+
+def greedy_selection(amounts: Any, caps: Any) -> tuple[Any, Any]:
+    """Seleccion por orden con tope sobre el ultimo eje de `amounts`.
+
+    `amounts` va en orden de ranking y `caps` tiene la forma del resto de
+    ejes. Devuelve (seleccionadas, restante) con el presupuesto que queda
+    antes de cada posicion y al final (un elemento mas que `amounts`). Con
+    NumPy acepta arrays de cualquier numero de ejes (zonas, escenarios...);
+    sin NumPy, una lista y un tope.
+    """
+    if np is None:
+        remaining = [caps]
+        selected = []
+        for amount in amounts:
+            take = amount <= remaining[-1]
+            selected.append(take)
+            remaining.append(remaining[-1] - amount if take else remaining[-1])
+        return selected, remaining
+
+    amounts = np.asarray(amounts, dtype=np.int64)
+    left = np.array(caps, dtype=np.int64)
+    selected = np.zeros(amounts.shape, dtype=bool)
+    remaining = np.empty(amounts.shape[:-1] + (amounts.shape[-1] + 1,), dtype=np.int64)
+    remaining[..., 0] = left
+    for position in range(amounts.shape[-1]):
+        take = amounts[..., position] <= left
+        selected[..., position] = take
+        left = np.where(take, left - amounts[..., position], left)
+        remaining[..., position + 1] = left
+    return selected, remaining
+
+
+def blocker_positions(amounts: list[int], cap: int) -> list[int | None]:
+    """Para cada candidata, posicion de la primera otra tras la cual ya no cabe.
+
+    -1 si cabe aunque quede la ultima; None si su importe supera el tope.
+    """
+    size = len(amounts)
+    if np is not None:
+        others = np.tile(np.asarray(amounts, dtype=np.int64), (size, 1))
+        np.fill_diagonal(others, NEVER_FITS)
+        _, remaining = greedy_selection(others, np.full(size, cap, dtype=np.int64))
+        own = np.asarray(amounts, dtype=np.int64)[:, None]
+        short = remaining[:, 1:] < own
+        first = np.where(short.any(axis=1), short.argmax(axis=1), -1)
+        return [None if amount > cap else int(position) for amount, position in zip(amounts, first)]
+
+    blockers: list[int | None] = []
+    for index, own in enumerate(amounts):
+        if own > cap:
+            blockers.append(None)
+            continue
+        others = [NEVER_FITS if other == index else amount for other, amount in enumerate(amounts)]
+        _, remaining = greedy_selection(others, cap)
+        blockers.append(next((position for position in range(size) if remaining[position + 1] < own), -1))
+    return blockers
+
+
+def zone_members(finales: dict[str, Any], caps: dict[str, int] | None = None) -> tuple[list[dict[str, Any]], list[list[tuple[str, int]]]]:
+    """Zonas (id, nombre, tope) y (codigo, importe) de las candidatas de cada una en `finales.json`."""
+    caps = caps or {}
+    zones = [
+        {"id": zone.get("id"), "name": zone["name"], "cap_cents": caps.get(zone["name"], zone.get("cap_cents"))}
+        for zone in finales.get("zones") or []
+    ]
+    members: list[list[tuple[str, int]]] = [[] for _ in zones]
+    zone_column = finales["columns"].index("zone")
+    amount_column = finales["columns"].index("amount_cents")
+    for row in finales["rows"]:
+        zone, amount = row[zone_column], row[amount_column]
+        if zone is not None and amount is not None:
+            members[zone].append((normalize_code(row[0]), amount))
+    return zones, members
+
+
+def known_caps(finales: dict[str, Any], caps: dict[str, int] | None = None, caps_json: Path = DEFAULT_ZONE_CAPS_JSON) -> dict[str, int]:
+    """Tope de cada zona: el de `caps` (`--cap`), si no el de `finales.json` y si no el de la tabla."""
+    merged = load_zone_caps(caps_json)
+    merged.update({zone["name"]: zone["cap_cents"] for zone in finales.get("zones") or [] if zone.get("cap_cents") is not None})
+    merged.update(caps or {})
+    return merged
+
+
+def check_caps(zones: list[dict[str, Any]], members: list[list[tuple[str, int]]]) -> None:
+    missing = [zone["name"] for zone, candidates in zip(zones, members) if candidates and zone["cap_cents"] is None]
+    if missing:
+        raise MissingCaps(missing)
+
+
+def candidates_fingerprint(zones: list[dict[str, Any]], members: list[list[tuple[str, int]]]) -> str:
+    """Hash de candidatas, importes y topes: si cambia, el artefacto anterior no sirve."""
+    digest = hashlib.sha256()
+    for zone, candidates in zip(zones, members):
+        digest.update(f"{zone['name']}|{zone['cap_cents']}\n".encode("utf-8"))
+        for code, amount in sorted(candidates):
+            digest.update(f"{code}|{amount}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+@dataclass
+class Candidate:
+    code: str
+    amount_cents: int
+    votes: int
+    rank: int = 0
+    winner: bool = False
+    votes_needed: int | None = None
+
+
+@dataclass
+class ZoneBoard:
+    """Candidatas de una zona en orden de ranking, con su proyeccion."""
+
+    index: int
+    zone_id: int | None
+    name: str
+    cap_cents: int | None
+    order: list[Candidate] = field(default_factory=list)
+    dirty: bool = True
+
+    def __post_init__(self) -> None:
+        self.keys = [rank_key(candidate.votes, candidate.code) for candidate in self.order]
+
+    @classmethod
+    def ranked(cls, index: int, zone_id: int | None, name: str, cap_cents: int | None, candidates: Iterable[Candidate]) -> ZoneBoard:
+        order = sorted(candidates, key=lambda candidate: rank_key(candidate.votes, candidate.code))
+        return cls(index, zone_id, name, cap_cents, order)
+
+    def set_votes(self, candidate: Candidate, votes: int) -> None:
+        """Recoloca una candidata sin reordenar la zona entera."""
+        old_key = rank_key(candidate.votes, candidate.code)
+        position = bisect_left(self.keys, old_key)
+        while self.order[position] is not candidate:
+            position += 1
+        del self.order[position], self.keys[position]
+        candidate.votes = votes
+        new_key = rank_key(votes, candidate.code)
+        position = bisect_right(self.keys, new_key)
+        self.order.insert(position, candidate)
+        self.keys.insert(position, new_key)
+        self.dirty = True
+
+    def project(self) -> None:
+        for rank, candidate in enumerate(self.order, start=1):
+            candidate.rank = rank
+        self.dirty = False
+        if self.cap_cents is None:
+            for candidate in self.order:
+                candidate.winner, candidate.votes_needed = False, None
+            return
+
+        amounts = [candidate.amount_cents for candidate in self.order]
+        selected, _ = greedy_selection(amounts, self.cap_cents)
+        for candidate, blocker, winner in zip(self.order, blocker_positions(amounts, self.cap_cents), selected):
+            candidate.winner = bool(winner)
+            if blocker is None:
+                candidate.votes_needed = None
+            elif blocker < 0 or candidate.winner:
+                candidate.votes_needed = 0
+            else:
+                rival = self.order[blocker]
+                tie_wins = code_order(candidate.code) < code_order(rival.code)
+                candidate.votes_needed = max(0, rival.votes - candidate.votes + (0 if tie_wins else 1))
+
+    def summary(self) -> dict[str, Any]:
+        winners = [candidate for candidate in self.order if candidate.winner]
+        spent = sum(candidate.amount_cents for candidate in winners)
+        return {
+            "id": self.zone_id,
+            "name": self.name,
+            "cap_cents": self.cap_cents,
+            "spent_cents": spent if self.cap_cents is not None else None,
+            "candidates": len(self.order),
+            "winners": len(winners),
+            # Linea de corte: apoyos de la ultima que entra y de la primera que se queda fuera.
+            "cut_votes": winners[-1].votes if winners else None,
+            "first_out_votes": next((candidate.votes for candidate in self.order if not candidate.winner), None),
+        }
+
+
+class ProjectionEngine:
+    def __init__(self, boards: list[ZoneBoard], fingerprint: str) -> None:
+        self.boards = boards
+        self.fingerprint = fingerprint
+        self.by_code = {candidate.code: (board, candidate) for board in boards for candidate in board.order}
+
+    @classmethod
+    def from_finales(cls, finales: dict[str, Any], votes_by_code: dict[str, int], caps: dict[str, int] | None = None) -> ProjectionEngine:
+        zones, members = zone_members(finales, caps)
+        boards = [
+            ZoneBoard.ranked(index, zone["id"], zone["name"], zone["cap_cents"], (
+                Candidate(code, amount, votes_by_code.get(code, 0)) for code, amount in members[index]
+            ))
+            for index, zone in enumerate(zones)
+        ]
+        return cls(boards, candidates_fingerprint(zones, members))
+
+    @classmethod
+    def from_artifact(cls, artifact: dict[str, Any]) -> ProjectionEngine:
+        """Reconstruye el motor tal como quedo, con orden y resultados, sin recalcular nada."""
+        zones = artifact["zones"]
+        boards = [ZoneBoard(index, zone["id"], zone["name"], zone["cap_cents"], dirty=False) for index, zone in enumerate(zones)]
+        for rows in artifact["index"]["by_zone"]:
+            for position in rows:
+                code, zone, votes, amount, rank, winner, needed = artifact["rows"][position]
+                boards[zone].order.append(Candidate(code, amount, votes, rank, winner, needed))
+        for board in boards:
+            board.keys = [rank_key(candidate.votes, candidate.code) for candidate in board.order]
+        return cls(boards, artifact.get("fingerprint", ""))
+
+    def update(self, votes_by_code: dict[str, int]) -> int:
+        """Aplica los apoyos que han cambiado; devuelve cuantas candidatas se han movido."""
+        changed = 0
+        for code, (board, candidate) in self.by_code.items():
+            votes = votes_by_code.get(code, 0)
+            if votes != candidate.votes:
+                board.set_votes(candidate, votes)
+                changed += 1
+        return changed
+
+    def project(self) -> list[ZoneBoard]:
+        """Recalcula solo las zonas con cambios; devuelve las recalculadas."""
+        touched = [board for board in self.boards if board.dirty]
+        for board in touched:
+            board.project()
+        return touched
+
+    def artifact(self) -> dict[str, Any]:
+        rows: list[list[Any]] = []
+        by_zone: list[list[int]] = []
+        for board in self.boards:
+            positions = []
+            for candidate in board.order:
+                positions.append(len(rows))
+                rows.append([
+                    candidate.code,
+                    board.index,
+                    candidate.votes,
+                    candidate.amount_cents,
+                    candidate.rank,
+                    candidate.winner,
+                    candidate.votes_needed,
+                ])
+            by_zone.append(positions)
+        return {
+            "version": FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "zones": [board.summary() for board in self.boards],
+            "columns": COLUMNS,
+            "rows": rows,
+            "index": {
+                "by_code": {row[0]: position for position, row in enumerate(rows)},
+                "by_zone": by_zone,
+            },
+        }
+
+
+def load_votes(path: Path) -> dict[str, int]:
+    proposals = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+    return votes_from_proposals(proposals)
+
+
+def votes_from_proposals(proposals: Iterable[dict[str, Any]]) -> dict[str, int]:
+    votes: dict[str, int] = {}
+    for proposal in proposals:
+        code = normalize_code(proposal.get("code"))
+        if code and code not in votes:
+            votes[code] = to_int(proposal.get("votes")) or 0
+    return votes
+
+
+def load_previous(path: Path) -> dict[str, Any] | None:
+    if not path.exists():
+        return None
+    try:
+        artifact = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+    if artifact.get("version") != FORMAT_VERSION or artifact.get("columns") != COLUMNS:
+        return None
+    return artifact
+
+
+def parse_caps(values: list[str]) -> dict[str, int]:
+    """`["Zona Centro=645000"]` -> `{"Zona Centro": 64500000}` (euros a centimos)."""
+    caps = {}
+    for value in values:
+        name, _, euros = value.partition("=")
+        try:
+            caps[name.strip()] = round(float(euros.replace(".", "").replace(",", ".")) * 100)
+        except ValueError:
+            raise SystemExit(f"Tope no valido: {value!r} (formato: \"Zona Centro=645000\")")
+    return caps
+
+
+def build_engine(
+    finales: dict[str, Any],
+    votes_by_code: dict[str, int],
+    caps: dict[str, int] | None = None,
+    previous: dict[str, Any] | None = None,
+) -> tuple[ProjectionEngine, bool]:
+    """Motor al dia con `votes_by_code`; el booleano indica si se reutilizo `previous`."""
+    if previous is None or previous.get("fingerprint") != candidates_fingerprint(*zone_members(finales, caps)):
+        return ProjectionEngine.from_finales(finales, votes_by_code, caps), False
+    engine = ProjectionEngine.from_artifact(previous)
+    engine.update(votes_by_code)
+    return engine, True
+
+
+def write_artifact(path: Path, artifact: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(artifact, ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+
+
+def run(
+    proposals_json: Path = DEFAULT_PROPOSALS_JSON,
+    finales_json: Path = DEFAULT_FINALES_JSON,
+    output: Path = DEFAULT_OUTPUT_JSON,
+    caps: dict[str, int] | None = None,
+    full: bool = False,
+    votes_by_code: dict[str, int] | None = None,
+    caps_json: Path = DEFAULT_ZONE_CAPS_JSON,
+) -> tuple[dict[str, Any], int]:
+    """Escribe la proyeccion; devuelve el artefacto y cuantas zonas se han recalculado.
+
+    Lanza `MissingCaps` sin escribir nada si alguna zona con candidatas no tiene tope.
+    """
+    finales = json.loads(finales_json.read_text(encoding="utf-8"))
+    caps = known_caps(finales, caps, caps_json)
+    check_caps(*zone_members(finales, caps))
+    votes = votes_by_code if votes_by_code is not None else load_votes(proposals_json)
+    engine, _ = build_engine(finales, votes, caps, None if full else load_previous(output))
+    touched = engine.project()
+    artifact = engine.artifact()
+    write_artifact(output, artifact)
+    return artifact, len(touched)
+
+
+def format_euros(cents: int) -> str:
+    return f"{cents // 100:,} €".replace(",", ".")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ganadoras proyectadas por zona con los apoyos actuales")
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--finales-json", type=Path, default=DEFAULT_FINALES_JSON)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_JSON)
+    parser.add_argument("--caps-json", type=Path, default=DEFAULT_ZONE_CAPS_JSON, help="Tabla de topes por zona")
+    parser.add_argument("--cap", action="append", default=[], metavar="ZONA=EUROS", help="Tope de una zona (repetible)")
+    parser.add_argument("--full", action="store_true", help="Recalcula todo sin partir del artefacto anterior")
+    parser.add_argument("--check-caps", action="store_true", help="Solo comprueba que cada zona con candidatas tiene tope")
+    args = parser.parse_args()
+
+    if args.check_caps:
+        finales = json.loads(args.finales_json.read_text(encoding="utf-8"))
+        try:
+            check_caps(*zone_members(finales, known_caps(finales, parse_caps(args.cap), args.caps_json)))
+        except MissingCaps as exc:
+            print(f"[!] {exc}")
+            return EXIT_MISSING_CAPS
+        print("Todas las zonas con candidatas tienen tope")
+        return 0
+
+    try:
+        artifact, touched = run(
+            args.proposals_json, args.finales_json, args.output, parse_caps(args.cap), args.full, caps_json=args.caps_json
+        )
+    except MissingCaps as exc:
+        print(f"[!] {exc}")
+        return EXIT_MISSING_CAPS
+    for zone in artifact["zones"]:
+        if zone["cap_cents"] is None:
+            print(f"  {zone['name']:16} {zone['candidates']:2} candidatas, sin tope conocido")
+            continue
+        cut = zone["cut_votes"] if zone["cut_votes"] is not None else "-"
+        print(
+            f"  {zone['name']:16} {zone['winners']:2}/{zone['candidates']:<2} ganadoras  corte {cut:>5} apoyos  "
+            f"{format_euros(zone['spent_cents'])} / {format_euros(zone['cap_cents'])}"
+        )
+    print(f"Zonas recalculadas: {touched} de {len(artifact['zones'])}")
+    print(f"Guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Paginas HTML estaticas de cada propuesta y de cada zona, para enlaces directos.
+
+La web renderiza cada propuesta en el navegador tras descargar todo
+`proposals_data.json`. Un enlace compartido en redes necesita algo mas ligero:
+`/propuestas/<codigo>/` y `/zonas/<zone_id>/` son HTML plano, con sus
+etiquetas Open Graph, sin JavaScript ni datos que descargar.
+
+Las plantillas estan en `scripts/templates/` (`string.Template`: `layout.html`
+envuelve el cuerpo de `proposal.html` o `zone.html`). Los datos salen de
+`datasets.Datasets` (propuesta, metadatos, mesa y listado final).
+
+Es incremental: `data/static_pages.json` guarda el hash del contenido de cada
+pagina (sus datos mas las plantillas) y solo se reescriben las que cambian o
+faltan. Las paginas de propuestas que ya no existen se borran. Cambiar una
+plantilla rehace todas.
+
+    python3 scripts/render_static.py
+    python3 scripts/render_static.py --full
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import json
+from pathlib import Path
+from string import Template
+from typing import Any, Callable
+from urllib.parse import urlencode
+
+from datasets import DATA_DIR, Datasets
+
+ROOT = Path(__file__).resolve().parents[1]
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+DEFAULT_OUTPUT_DIR = ROOT
+DEFAULT_MANIFEST_JSON = DATA_DIR / "static_pages.json"
+SITE_URL = "https://presupuestos.aldeapucela.org"
+DEFAULT_IMAGE = f"{SITE_URL}/img/social.jpg"
+PROPOSALS_PATH = "propuestas"
+ZONES_PATH = "zonas"
+FORMAT_VERSION = 1
+DESCRIPTION_MAX = 200
+
+
+def load_templates(directory: Path = TEMPLATES_DIR) -> tuple[dict[str, Template], str]:
+    """Plantillas por nombre y un hash de todas (si cambia, se rehacen todas las paginas)."""
+    digest = hashlib.sha256()
+    templates = {}
+    for name in ("layout", "proposal", "zone"):
+        text = (directory / f"{name}.html").read_text(encoding="utf-8")
+        digest.update(text.encode("utf-8"))
+        templates[name] = Template(text)
+    return templates, digest.hexdigest()[:16]
+
+
+def escape(value: Any) -> str:
+    return html.escape(str(value if value is not None else ""))
+
+
+def short_text(text: str, limit: int = DESCRIPTION_MAX) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rsplit(" ", 1)[0] + "…"
+
+
+def format_euros(cents: int) -> str:
+    return f"{cents // 100:,} €".replace(",", ".")
+
+
+def zone_label(zone: str | None) -> str:
+    """`"1. Zona Este 1: Delicias, ..."` -> `"Zona Este 1"`."""
+    if not zone:
+        return "Varias zonas"
+    return zone.split(":", 1)[0].split(". ", 1)[-1].strip()
+
+
+def proposal_page(code: str) -> str:
+    return f"{PROPOSALS_PATH}/{code}/index.html"
+
+
+def zone_page(zone_id: int) -> str:
+    return f"{ZONES_PATH}/{zone_id}/index.html"
+
+
+def page_url(page: str) -> str:
+    return f"{SITE_URL}/{page[:-len('index.html')]}"
+
+
+def app_url(zone_id: int | None = None) -> str:
+    return f"{SITE_URL}/?{urlencode({'z': zone_id})}" if zone_id else f"{SITE_URL}/"
+
+
+def proposal_context(proposal: dict[str, Any], view: dict[str, Any]) -> dict[str, Any]:
+    """Todo lo que se pinta en la pagina de una propuesta (y de lo que depende su hash)."""
+    return {
+        "code": view["code"],
+        "title": view["title"],
+        "zone": proposal.get("zone"),
+        "zone_id": view["zone_id"],
+        "date": proposal.get("date"),
+        "votes": view["votes"],
+        "summary": view["summary"],
+        "category": view["category"],
+        "tags": view["tags"],
+        "urgent": view["urgent"],
+        "description": proposal.get("description") or "",
+        "address": proposal.get("address"),
+        "author": proposal.get("author"),
+        "image_url": proposal.get("image_url"),
+        "documents": proposal.get("documents") or [],
+        "url": view["url"],
+        "mesa_status": view["mesa_status"],
+        "exclusion_type": view["exclusion_type"],
+        "in_final": view["in_final"],
+        "final_amount_cents": view["final_amount_cents"],
+    }
+
+
+def render_proposal(templates: dict[str, Template], context: dict[str, Any]) -> str:
+    badges = []
+    if context["category"]:
+        badges.append(f'<span class="badge">{escape(context["category"])}</span>')
+    if context["in_final"]:
+        amount = f' · {format_euros(context["final_amount_cents"])}' if context["final_amount_cents"] else ""
+        badges.append(f'<span class="badge final">En el listado final{amount}</span>')
+    elif context["mesa_status"]:
+        badges.append(f'<span class="badge out">{escape(context["mesa_status"])}</span>')
+    if context["urgent"]:
+        badges.append('<span class="badge out">Urgente</span>')
+    badges += [f'<span class="badge">{escape(tag)}</span>' for tag in context["tags"]]
+
+    details = []
+    if context["address"]:
+        details.append(f"<li>Ubicación: {escape(context['address'])}</li>")
+    if context["author"]:
+        details.append(f"<li>Propuesta en nombre de: {escape(context['author'])}</li>")
+    if context["exclusion_type"]:
+        details.append(f"<li>Motivo en la mesa: {escape(context['exclusion_type'])}</li>")
+    details += [
+        f'<li><a href="{escape(document["url"])}" rel="noopener">{escape(document.get("title") or "Documento")}</a></li>'
+        for document in context["documents"]
+        if document.get("url")
+    ]
+
+    paragraphs = [line.strip() for line in context["description"].splitlines() if line.strip()]
+    zone_url = f"/{zone_page(context['zone_id'])[:-len('index.html')]}" if context["zone_id"] else "/"
+    body = templates["proposal"].substitute(
+        zone_url=escape(zone_url),
+        zone=escape(zone_label(context["zone"])),
+        date=escape(context["date"] or ""),
+        title=escape(context["title"]),
+        votes=context["votes"],
+        badges=" ".join(badges),
+        image=f'<img class="cover" src="{escape(context["image_url"])}" alt="">' if context["image_url"] else "",
+        summary=escape(context["summary"] or ""),
+        description="\n".join(f"<p>{escape(paragraph)}</p>" for paragraph in paragraphs),
+        details=f"<ul>{''.join(details)}</ul>" if details else "",
+        source_url=escape(context["url"]),
+    )
+    return templates["layout"].substitute(
+        page_title=escape(context["title"]),
+        description=escape(short_text(context["summary"] or context["description"] or context["title"])),
+        canonical_url=escape(page_url(proposal_page(context["code"]))),
+        image_url=escape(context["image_url"] or DEFAULT_IMAGE),
+        app_url=escape(app_url(context["zone_id"])),
+        body=body,
+    )
+
+
+def zone_context(zone_id: int, views: list[dict[str, Any]]) -> dict[str, Any]:
+    ranked = sorted(views, key=lambda view: (-view["votes"], view["code"]))
+    return {
+        "zone_id": zone_id,
+        "zone": zone_label(ranked[0]["zone"]),
+        "items": [[view["code"], view["title"], view["votes"], view["category"], view["in_final"]] for view in ranked],
+    }
+
+
+def render_zone(templates: dict[str, Template], context: dict[str, Any]) -> str:
+    items = []
+    for code, title, votes, category, in_final in context["items"]:
+        badges = f' <span class="badge">{escape(category)}</span>' if category else ""
+        if in_final:
+            badges += ' <span class="badge final">Final</span>'
+        items.append(
+            f'<li><a href="/{PROPOSALS_PATH}/{escape(code)}/">{escape(title)}</a> '
+            f'<span class="votes">{votes}</span>{badges}</li>'
+        )
+    final_count = sum(1 for item in context["items"] if item[4])
+    body = templates["zone"].substitute(
+        zone=escape(context["zone"]),
+        count=len(context["items"]),
+        final_count=final_count,
+        items="\n".join(items),
+    )
+    return templates["layout"].substitute(
+        page_title=escape(f"Propuestas de {context['zone']}"),
+        description=escape(f"{len(context['items'])} propuestas de {context['zone']}, ordenadas por apoyos"),
+        canonical_url=escape(page_url(zone_page(context["zone_id"]))),
+        image_url=escape(DEFAULT_IMAGE),
+        app_url=escape(app_url(context["zone_id"])),
+        body=body,
+    )
+
+
+def content_hash(context: dict[str, Any], templates_hash: str) -> str:
+    payload = json.dumps(context, ensure_ascii=False, sort_keys=True) + templates_hash
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_manifest(path: Path) -> dict[str, str]:
+    if not path.exists():
+        return {}
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    return manifest.get("pages", {}) if manifest.get("version") == FORMAT_VERSION else {}
+
+
+def save_manifest(path: Path, pages: dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {"version": FORMAT_VERSION, "pages": dict(sorted(pages.items()))}
+    path.write_text(json.dumps(manifest, indent=1) + "\n", encoding="utf-8")
+
+
+def collect_pages(data: Datasets) -> dict[str, tuple[dict[str, Any], str]]:
+    """Pagina -> (contexto, tipo) de cada propuesta con ficha y de cada zona."""
+    pages: dict[str, tuple[dict[str, Any], str]] = {}
+    by_zone: dict[int, list[dict[str, Any]]] = {}
+    for code, proposal in data.proposals_by_code.items():
+        if not code.isdigit():  # el codigo va en la ruta de la pagina
+            continue
+        view = data.joined(code)
+        pages[proposal_page(code)] = (proposal_context(proposal, view), "proposal")
+        if view["zone_id"] is not None:
+            by_zone.setdefault(view["zone_id"], []).append(view)
+    for zone_id, views in sorted(by_zone.items()):
+        pages[zone_page(zone_id)] = (zone_context(zone_id, views), "zone")
+    return pages
+
+
+def run(
+    data_dir: Path = DATA_DIR,
+    output_dir: Path = DEFAULT_OUTPUT_DIR,
+    manifest_json: Path = DEFAULT_MANIFEST_JSON,
+    full: bool = False,
+) -> dict[str, int]:
+    """Renderiza las paginas que han cambiado; devuelve cuantas se escriben, se saltan y se borran."""
+    templates, templates_hash = load_templates()
+    renderers: dict[str, Callable[[dict[str, Template], dict[str, Any]], str]] = {
+        "proposal": render_proposal,
+        "zone": render_zone,
+    }
+    previous = {} if full else load_manifest(manifest_json)
+    pages = collect_pages(Datasets(data_dir))
+
+    manifest: dict[str, str] = {}
+    stats = {"written": 0, "unchanged": 0, "removed": 0}
+    for page, (context, kind) in pages.items():
+        digest = content_hash(context, templates_hash)
+        manifest[page] = digest
+        target = output_dir / page
+        if previous.get(page) == digest and target.exists():
+            stats["unchanged"] += 1
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(renderers[kind](templates, context), encoding="utf-8")
+        stats["written"] += 1
+
+    for page in set(load_manifest(manifest_json)) - set(pages):
+        target = output_dir / page
+        if target.exists():
+            target.unlink()
+            if not any(target.parent.iterdir()):
+                target.parent.rmdir()
+        stats["removed"] += 1
+
+    save_manifest(manifest_json, manifest)
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Paginas estaticas de propuestas y zonas para enlaces directos")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR, help=f"Raiz de la web (se escriben {PROPOSALS_PATH}/ y {ZONES_PATH}/)")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST_JSON)
+    parser.add_argument("--full", action="store_true", help="Rehace todas las paginas")
+    args = parser.parse_args()
+
+    stats = run(args.data_dir, args.output_dir, args.manifest, args.full)
+    print(f"Paginas escritas: {stats['written']}, sin cambios: {stats['unchanged']}, borradas: {stats['removed']}")
+    print(f"Manifiesto: {args.manifest}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
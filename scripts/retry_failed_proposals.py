@@ -16,9 +16,15 @@ from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import sys
+import argparse
+from contextlib import nullcontext
+
+from concurrency import AdaptiveLimiter
+from profiling import profile_run
+from run_metrics import RunMetrics, instrument_session
+from site_config import site_url
 
 # Configuración
-BASE_URL = "https://www10.ava.es"
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'data'))
 LOGS_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'logs'))
@@ -26,12 +32,15 @@ PROPOSALS_FILE = os.path.join(DATA_DIR, "proposals_data.json")
 PROGRESS_FILE = os.path.join(DATA_DIR, "retry_progress.json")
 BACKUP_DIR = os.path.join(DATA_DIR, "backups")
 LOG_FILE = os.path.join(LOGS_DIR, "retry_vote_update.log")
+METRICS_FILE = os.path.join(LOGS_DIR, "retry_metrics.json")
 
 # Configuración más conservadora para reintentos
 BASE_DELAY = 0.5  # delay más conservador
 MAX_RETRIES = 3  # más reintentos
 TIMEOUT = 15  # timeout más generoso
-MAX_WORKERS = 4  # menos hilos concurrentes
+# Límite adaptativo de peticiones en vuelo (ver concurrency.py), más prudente que en update_votes
+INITIAL_CONCURRENCY = 2
+MAX_CONCURRENCY = 8
 
 # Headers optimizados
 HEADERS = {
@@ -58,9 +67,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class FailedProposalsRetry:
-    def __init__(self):
+    def __init__(self, metrics=None, prometheus_file=None):
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
+        self.metrics = metrics or RunMetrics("retry_failed_proposals")
+        self.prometheus_file = prometheus_file
+        self.limiter = AdaptiveLimiter(INITIAL_CONCURRENCY, maximum=MAX_CONCURRENCY, metrics=self.metrics, stage="retry")
+        instrument_session(self.session, self.metrics, "retry", limiter=self.limiter)
         self.start_time = time.time()
         self.processed_count = 0
         self.error_count = 0
@@ -83,16 +96,16 @@ class FailedProposalsRetry:
         latest_report = max(report_files, key=os.path.getctime)
         logger.info(f"Cargando errores del reporte: {os.path.basename(latest_report)}")
         
-        failed_codes = []
+        failed_codes = set()
         try:
             with open(latest_report, 'r') as f:
                 content = f.read()
                 
-            # Extraer códigos de propuestas con errores
+            # Extraer códigos de propuestas con errores (en un conjunto: el filtro de abajo es O(1) por propuesta)
             import re
             error_pattern = r'- Propuesta (\d+):'
             matches = re.findall(error_pattern, content)
-            failed_codes = [code for code in matches if code]
+            failed_codes = {code for code in matches if code}
             
         except Exception as e:
             logger.error(f"Error leyendo reporte: {e}")
@@ -123,10 +136,11 @@ class FailedProposalsRetry:
                 # Delay más conservador
                 time.sleep(BASE_DELAY + random.uniform(0, 0.2))
                 
-                response = self.session.get(proposal_url, timeout=TIMEOUT)
+                response = self.session.get(site_url(proposal_url), timeout=TIMEOUT)
                 response.raise_for_status()
                 
-                soup = BeautifulSoup(response.content, 'html.parser')
+                with self.metrics.timer("parse_seconds", stage="retry"):
+                    soup = BeautifulSoup(response.content, 'html.parser')
                 
                 # Búsqueda directa del span con clase total-supports
                 vote_span = soup.find('span', class_='total-supports')
@@ -165,6 +179,7 @@ class FailedProposalsRetry:
                 if attempt == MAX_RETRIES - 1:
                     logger.warning(f"Error final para propuesta {proposal_code}: {e}")
                     return None
+                self.metrics.count("retries", stage="retry")
                 logger.warning(f"Intento {attempt + 1}/{MAX_RETRIES} para propuesta {proposal_code}: {e}. Esperando {wait_time}s...")
                 time.sleep(wait_time)
                 
@@ -224,7 +239,7 @@ class FailedProposalsRetry:
         
         with tqdm(total=len(proposals), desc="Reintentando propuestas fallidas") as pbar:
             
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
                 # Enviar todas las propuestas
                 future_to_proposal = {
                     executor.submit(self.process_proposal, proposal): proposal 
@@ -243,8 +258,11 @@ class FailedProposalsRetry:
     def save_proposals(self, proposals):
         """Guardar las propuestas actualizadas"""
         try:
-            with open(PROPOSALS_FILE, 'w', encoding='utf-8') as f:
+            # Escritura atómica, como en update_votes.py
+            tmp_file = f"{PROPOSALS_FILE}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(proposals, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, PROPOSALS_FILE)
         except Exception as e:
             logger.error(f"Error guardando propuestas: {e}")
     
@@ -290,13 +308,28 @@ Detalles de actualizaciones:
             logger.info(f"Reporte de reintento guardado en: {report_file}")
         except Exception as e:
             logger.error(f"Error guardando reporte: {e}")
+        
+        self.save_metrics()
+    
+    def save_metrics(self):
+        """Volcar el resumen de métricas en JSON (y en formato Prometheus si se pidió)"""
+        for name, value in (("processed", self.processed_count), ("updated", self.updated_count), ("errors", self.error_count)):
+            self.metrics.set_gauge("proposals", value, result=name)
+        try:
+            self.metrics.write_json(METRICS_FILE)
+            logger.info(f"Métricas guardadas en: {METRICS_FILE}")
+            if self.prometheus_file:
+                self.metrics.write_prometheus(self.prometheus_file)
+        except Exception as e:
+            logger.error(f"Error guardando métricas: {e}")
     
     def run(self):
         """Ejecutar el proceso de reintento"""
         logger.info("Iniciando reintento de propuestas fallidas...")
         
         # 1. Cargar propuestas fallidas
-        failed_proposals = self.load_failed_proposals()
+        with self.metrics.stage("load_failed"):
+            failed_proposals = self.load_failed_proposals()
         if not failed_proposals:
             logger.info("No hay propuestas fallidas para reintentar")
             return True
@@ -321,7 +354,8 @@ Detalles de actualizaciones:
         
         # 4. Reintentar actualizar
         try:
-            updated_proposals, results = self.retry_failed_proposals(failed_proposals)
+            with self.metrics.stage("fetch_votes"):
+                updated_proposals, results = self.retry_failed_proposals(failed_proposals)
             
             # 5. Actualizar el archivo completo con los cambios
             code_to_proposal = {p["code"]: p for p in updated_proposals}
@@ -330,7 +364,8 @@ Detalles de actualizaciones:
                     proposal.update(code_to_proposal[proposal["code"]])
             
             # 6. Guardar datos actualizados
-            self.save_proposals(all_proposals)
+            with self.metrics.stage("save"):
+                self.save_proposals(all_proposals)
             
             # 7. Generar reporte
             self.generate_report(results)
@@ -347,10 +382,18 @@ Detalles de actualizaciones:
 
 def main():
     """Función principal"""
-    retry = FailedProposalsRetry()
+    parser = argparse.ArgumentParser(description="Reintentar las propuestas que fallaron en la última actualización")
+    parser.add_argument("--prometheus", default=None,
+                        help="Escribir también las métricas en formato Prometheus en este fichero")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfilar la ejecución (cProfile + muestreo de hilos) y guardar el perfil en logs/")
+    args = parser.parse_args()
+    
+    retry = FailedProposalsRetry(prometheus_file=args.prometheus)
     
     try:
-        success = retry.run()
+        with profile_run("retry_failed_proposals", LOGS_DIR) if args.profile else nullcontext():
+            success = retry.run()
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         logger.info("Proceso interrumpido")
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Metricas de ejecucion compartidas por los scrapers.
+
+Un `RunMetrics` acumula, de forma segura entre hilos:
+
+- tiempo de pared por etapa (`with metrics.stage("fetch_votes"): ...`),
+- contadores (`metrics.count("cache_lookups", result="hit")`),
+- histogramas de latencia (`metrics.observe(...)` o `with metrics.timer(...)`).
+
+`instrument_session` monta en una `requests.Session` un adaptador que mide
+cada peticion: conexion (resolucion DNS + TCP + TLS, que urllib3 hace en una
+sola llamada), tiempo hasta el primer byte, descarga, bytes, codigo de estado
+y reintentos de urllib3. Cada medida lleva la etiqueta `stage` del script.
+Con `limiter` (ver `concurrency.py`) cada peticion espera hueco en el limite
+adaptativo y le comunica su latencia o si el servidor esta saturado.
+
+Al terminar se vuelca un resumen JSON (`write_json`) y, si se pide, un
+fichero de texto en formato Prometheus (`write_prometheus`) apto para el
+textfile collector de node_exporter.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+METRIC_PREFIX = "participativos"
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def metric_key(name: str, labels: dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def format_key(key: LabelKey, extra: dict[str, str] | None = None) -> str:
+    name, labels = key
+    pairs = list(labels) + sorted((extra or {}).items())
+    if not pairs:
+        return name
+    rendered = ",".join(f'{label}="{value}"' for label, value in pairs)
+    return f"{name}{{{rendered}}}"
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos; guarda las muestras para percentiles exactos."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.samples: list[float] = []
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.bucket_counts):
+            self.bucket_counts[index] += 1
+        self.samples.append(value)
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        running = 0
+        rows = []
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            running += count
+            rows.append((f"{bound:g}", running))
+        rows.append(("+Inf", len(self.samples)))
+        return rows
+
+    def summary(self) -> dict[str, Any]:
+        count = len(self.samples)
+        if not count:
+            return {"count": 0, "sum": 0.0}
+        return {
+            "count": count,
+            "sum": round(self.total, 6),
+            "min": round(min(self.samples), 6),
+            "mean": round(self.total / count, 6),
+            "p50": round(self.quantile(0.50), 6),
+            "p90": round(self.quantile(0.90), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(max(self.samples), 6),
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class RunMetrics:
+    def __init__(self, run_name: str):
+        self.run_name = run_name
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.counters: dict[LabelKey, float] = {}
+        self.gauges: dict[LabelKey, float] = {}
+        self.histograms: dict[LabelKey, Histogram] = {}
+        self.stages: dict[str, dict[str, float]] = {}
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self.gauges[metric_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        key = metric_key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Cronometra una etapa del script; varias llamadas con el mismo nombre se suman."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                entry["seconds"] += elapsed
+                entry["calls"] += 1
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "run": self.run_name,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "duration_seconds": round(time.perf_counter() - self._started, 3),
+                "stages": {
+                    name: {"seconds": round(entry["seconds"], 3), "calls": entry["calls"]}
+                    for name, entry in self.stages.items()
+                },
+                "counters": {format_key(key): value for key, value in sorted(self.counters.items())},
+                "gauges": {format_key(key): value for key, value in sorted(self.gauges.items())},
+                "histograms": {
+                    format_key(key): histogram.summary()
+                    for key, histogram in sorted(self.histograms.items())
+                },
+            }
+
+    def write_json(self, path: str | os.PathLike) -> dict[str, Any]:
+        summary = self.summary()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(summary, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        return summary
+
+    def prometheus_text(self) -> str:
+        run = {"run": self.run_name}
+        lines: list[str] = []
+
+        def family(name: str, kind: str) -> str:
+            full = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        with self._lock:
+            stage_name = family("stage_duration_seconds", "gauge")
+            for name, entry in self.stages.items():
+                lines.append(f"{format_key((stage_name, ()), {**run, 'stage': name})} {entry['seconds']:.6f}")
+
+            for kind, values, suffix in (("counter", self.counters, "_total"), ("gauge", self.gauges, "")):
+                for name in sorted({key[0] for key in values}):
+                    full = family(name + suffix, kind)
+                    for key, value in sorted(values.items()):
+                        if key[0] == name:
+                            lines.append(f"{format_key((full, key[1]), run)} {value:g}")
+
+            for name in sorted({key[0] for key in self.histograms}):
+                full = family(name, "histogram")
+                for key, histogram in sorted(self.histograms.items()):
+                    if key[0] != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{format_key((full + '_bucket', key[1]), {**run, 'le': bound})} {count}")
+                    lines.append(f"{format_key((full + '_sum', key[1]), run)} {histogram.total:.6f}")
+                    lines.append(f"{format_key((full + '_count', key[1]), run)} {len(histogram.samples)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str | os.PathLike) -> None:
+        # Escritura atomica: el textfile collector puede leer el fichero en cualquier momento.
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(self.prometheus_text(), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+def timed_pool_classes(metrics: RunMetrics, stage: str) -> dict[str, type]:
+    """Pools de urllib3 cuyas conexiones registran el tiempo de `connect()`."""
+
+    def timed(connection_cls: type) -> type:
+        class TimedConnection(connection_cls):
+            def connect(self) -> None:
+                started = time.perf_counter()
+                try:
+                    super().connect()
+                finally:
+                    metrics.observe("http_connect_seconds", time.perf_counter() - started, stage=stage)
+                    metrics.count("http_connections", stage=stage)
+
+        return TimedConnection
+
+    return {
+        "http": type("TimedHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": timed(HTTPConnection)}),
+        "https": type("TimedHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": timed(HTTPSConnection)}),
+    }
+
+
+class MetricsAdapter(HTTPAdapter):
+    """HTTPAdapter que mide cada peticion y la anota en un `RunMetrics`."""
+
+    def __init__(self, metrics: RunMetrics, stage: str, limiter: Any = None, **kwargs: Any):
+        self.metrics = metrics
+        self.stage = stage
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = timed_pool_classes(self.metrics, self.stage)
+
+    def send(self, request, stream=False, **kwargs):
+        if self.limiter is None:
+            return self._send(request, stream=stream, **kwargs)
+        with self.limiter.slot():
+            started = time.perf_counter()
+            try:
+                response = self._send(request, stream=stream, **kwargs)
+            except (Timeout, RequestsConnectionError) as exc:
+                self.limiter.on_overload(type(exc).__name__)
+                raise
+            retries = getattr(response.raw, "retries", None)
+            retried_statuses = [entry.status for entry in (retries.history if retries else ()) if entry.status]
+            if response.status_code in OVERLOAD_STATUSES:
+                self.limiter.on_overload(str(response.status_code))
+            elif any(status in OVERLOAD_STATUSES for status in retried_statuses):
+                # urllib3 ya reintento un 429/5xx: el servidor estaba saturado aunque al final respondiera.
+                self.limiter.on_overload(f"retried_{retried_statuses[-1]}")
+            elif response.status_code < 400:
+                self.limiter.on_success(time.perf_counter() - started)
+            return response
+
+    def _send(self, request, stream=False, **kwargs):
+        metrics, stage = self.metrics, self.stage
+        started = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+        except Exception as exc:
+            metrics.count("http_errors", stage=stage, error=type(exc).__name__)
+            metrics.observe("http_request_seconds", time.perf_counter() - started, stage=stage)
+            raise
+
+        headers_at = time.perf_counter()
+        metrics.observe("http_ttfb_seconds", headers_at - started, stage=stage)
+        metrics.count("http_requests", stage=stage, status=response.status_code)
+
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            metrics.count("http_retries", len(retries.history), stage=stage)
+
+        if not stream:
+            # requests leeria el cuerpo justo despues; leerlo aqui permite medir la descarga.
+            body = response.content
+            finished = time.perf_counter()
+            metrics.observe("http_download_seconds", finished - headers_at, stage=stage)
+            metrics.observe("http_request_seconds", finished - started, stage=stage)
+            metrics.count("http_response_bytes", len(body), stage=stage)
+        return response
+
+
+def instrument_session(session, metrics: RunMetrics, stage: str, limiter: Any = None) -> None:
+    """Sustituye los adaptadores de la sesion conservando su politica de reintentos."""
+    # Con limite adaptativo el pool de conexiones debe admitir tantas como el tope del limite.
+    pool_options = {"pool_maxsize": limiter.maximum} if limiter is not None else {}
+    for prefix in ("https://", "http://"):
+        current = session.get_adapter(prefix)
+        session.mount(prefix, MetricsAdapter(metrics, stage, limiter, max_retries=current.max_retries, **pool_options))
+
+
+def write_github_outputs(values: dict[str, Any]) -> bool:
+    """Escribe `clave=valor` en `$GITHUB_OUTPUT` (sustituto de `::set-output`)."""
+    output_path = os.getenv("GITHUB_OUTPUT")
+    if not output_path:
+        return False
+    with open(output_path, "a", encoding="utf-8") as fh:
+        for key, value in values.items():
+            fh.write(f"{key}={value}\n")
+    return True
@@ -10,11 +10,39 @@ from the source document are not carried over.
 from __future__ import annotations
 
 import argparse
+import hashlib
 import io
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import chain
 from pathlib import Path
+from typing import Any, Iterable, Iterator
 
 import fitz
-from PIL import Image
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - PyMuPDF's own encoder is used instead
+    Image = None
+
+
+@dataclass(frozen=True)
+class RasterSettings:
+    dpi: int = 200
+    jpeg_quality: int = 82
+    grayscale: bool = False
+    text_page_dpi: int | None = None
+
+    def dpi_for(self, page: fitz.Page) -> int:
+        """Pages without embedded images are vector text and survive a lower DPI."""
+        if self.text_page_dpi and not page.get_images(full=False):
+            return self.text_page_dpi
+        return self.dpi
+
+
+MANIFEST_NAME = "sanitize_manifest.json"
 
 
 def parse_args() -> argparse.Namespace:
@@ -38,6 +66,43 @@ def parse_args() -> argparse.Namespace:
         default=82,
         help="JPEG quality for embedded page images (1-100).",
     )
+    parser.add_argument(
+        "--grayscale",
+        action="store_true",
+        help="Rasterize pages in grayscale. Scanned actas lose nothing and shrink noticeably.",
+    )
+    parser.add_argument(
+        "--text-page-dpi",
+        type=int,
+        default=None,
+        help=(
+            "Lower DPI used for pages with no embedded images (born-digital text "
+            "pages). Defaults to --dpi."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Worker processes used to rasterize pages. Pages of every input file "
+            "are split across the pool. 0 uses all available cores."
+        ),
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help=(
+            f"Skip-cache manifest. Defaults to {MANIFEST_NAME} in the output "
+            "directory. Inputs whose SHA-256 and raster settings match are skipped."
+        ),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-rasterize every input even if the manifest says it is up to date.",
+    )
     return parser.parse_args()
 
 
@@ -48,45 +113,153 @@ def iter_input_files(input_path: Path) -> list[Path]:
 
 
 def pixmap_to_jpeg_bytes(pixmap: fitz.Pixmap, quality: int) -> bytes:
-    mode = "RGB" if pixmap.n < 4 else "RGBA"
-    image = Image.frombytes(mode, [pixmap.width, pixmap.height], pixmap.samples)
-    if mode == "RGBA":
-        image = image.convert("RGB")
+    """Encode an alpha-free pixmap to JPEG without copying its samples.
+
+    Pillow reads the pixel buffer through a ``memoryview`` and writes into a
+    buffer whose contents are returned once. Without Pillow, PyMuPDF's native
+    encoder is used.
+    """
+    if Image is None:
+        return pixmap.tobytes("jpeg", jpg_quality=quality)
 
+    mode = "L" if pixmap.n == 1 else "RGB"
+    image = Image.frombuffer(
+        mode, (pixmap.width, pixmap.height), pixmap.samples_mv, "raw", mode, pixmap.stride, 1
+    )
     buffer = io.BytesIO()
     image.save(buffer, format="JPEG", quality=quality, optimize=True)
     return buffer.getvalue()
 
 
-def sanitize_pdf(input_pdf: Path, output_pdf: Path, dpi: int, jpeg_quality: int) -> None:
+def render_page_jpeg(page: fitz.Page, settings: RasterSettings) -> bytes:
+    colorspace = fitz.csGRAY if settings.grayscale else fitz.csRGB
+    pix = page.get_pixmap(dpi=settings.dpi_for(page), colorspace=colorspace, alpha=False)
+    return pixmap_to_jpeg_bytes(pix, settings.jpeg_quality)
+
+
+def iter_page_jpegs(src: fitz.Document, page_numbers: Iterable[int], settings: RasterSettings) -> Iterator[bytes]:
+    for page_number in page_numbers:
+        yield render_page_jpeg(src[page_number], settings)
+
+
+def render_page_chunk(input_pdf: Path, start: int, stop: int, settings: RasterSettings) -> list[bytes]:
+    """Worker entry point: rasterize pages ``start..stop-1`` of ``input_pdf``."""
     src = fitz.open(input_pdf)
-    dst = fitz.open()
+    try:
+        return list(iter_page_jpegs(src, range(start, stop), settings))
+    finally:
+        src.close()
+
 
+def split_pages(page_count: int, chunks: int) -> list[tuple[int, int]]:
+    size = max(1, -(-page_count // max(chunks, 1)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def count_text_chars(doc: fitz.Document) -> int:
+    return sum(len((page.get_text() or "").strip()) for page in doc)
+
+
+def write_sanitized_pdf(src: fitz.Document, output_pdf: Path, page_jpegs: Iterable[bytes]) -> int:
+    """Rebuild ``src`` from page images and return the residual text char count.
+
+    The residual-text check runs on the rebuilt document before it is saved, so
+    the output does not need to be re-opened to be verified.
+    """
+    dst = fitz.open()
     try:
-        for page in src:
-            pix = page.get_pixmap(dpi=dpi, alpha=False)
-            jpeg_bytes = pixmap_to_jpeg_bytes(pix, jpeg_quality)
+        for page, jpeg_bytes in zip(src, page_jpegs):
             rect = page.rect
-
             new_page = dst.new_page(width=rect.width, height=rect.height)
             new_page.insert_image(rect, stream=jpeg_bytes)
 
+        residual_chars = count_text_chars(dst)
         output_pdf.parent.mkdir(parents=True, exist_ok=True)
         dst.save(output_pdf, garbage=4, deflate=True)
+        return residual_chars
     finally:
         dst.close()
-        src.close()
 
 
-def verify_no_text(output_pdf: Path) -> int:
-    doc = fitz.open(output_pdf)
+def sanitize_pdf(input_pdf: Path, output_pdf: Path, settings: RasterSettings) -> int:
+    src = fitz.open(input_pdf)
     try:
-        total_chars = 0
-        for page in doc:
-            total_chars += len((page.get_text() or "").strip())
-        return total_chars
+        page_jpegs = iter_page_jpegs(src, range(src.page_count), settings)
+        return write_sanitized_pdf(src, output_pdf, page_jpegs)
     finally:
-        doc.close()
+        src.close()
+
+
+def submit_pdf(
+    executor: ProcessPoolExecutor,
+    input_pdf: Path,
+    settings: RasterSettings,
+    chunks: int,
+) -> list[Future[list[bytes]]]:
+    with fitz.open(input_pdf) as src:
+        page_count = src.page_count
+    return [
+        executor.submit(render_page_chunk, input_pdf, start, stop, settings)
+        for start, stop in split_pages(page_count, chunks)
+    ]
+
+
+def sanitize_pdfs_parallel(
+    jobs: list[tuple[Path, Path]],
+    settings: RasterSettings,
+    workers: int,
+) -> list[int]:
+    """Sanitize several PDFs, rasterizing their pages on a process pool.
+
+    Every file is split into ``workers`` page chunks and all chunks are queued
+    up front, so the pool stays busy across file boundaries. Files are then
+    assembled in order as their chunks complete.
+    """
+    residuals: list[int] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = [
+            (input_pdf, output_pdf, submit_pdf(executor, input_pdf, settings, workers))
+            for input_pdf, output_pdf in jobs
+        ]
+        for input_pdf, output_pdf, futures in pending:
+            page_jpegs = chain.from_iterable(future.result() for future in futures)
+            src = fitz.open(input_pdf)
+            try:
+                residuals.append(write_sanitized_pdf(src, output_pdf, page_jpegs))
+            finally:
+                src.close()
+    return residuals
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path) -> dict[str, dict[str, Any]]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: Path, manifest: dict[str, dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def is_up_to_date(entry: dict[str, Any] | None, source_sha256: str, settings: RasterSettings, output_pdf: Path) -> bool:
+    return (
+        entry is not None
+        and entry.get("source_sha256") == source_sha256
+        and entry.get("settings") == asdict(settings)
+        and output_pdf.exists()
+    )
 
 
 def main() -> int:
@@ -97,16 +270,52 @@ def main() -> int:
         raise SystemExit(f"No PDF files found in {args.input}")
 
     output_is_dir = args.output.suffix.lower() != ".pdf" or args.output.is_dir()
-    results: list[tuple[Path, Path, int]] = []
+    jobs = [
+        (input_pdf, args.output / input_pdf.name if output_is_dir else args.output)
+        for input_pdf in input_files
+    ]
+    workers = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    settings = RasterSettings(
+        dpi=args.dpi,
+        jpeg_quality=args.jpeg_quality,
+        grayscale=args.grayscale,
+        text_page_dpi=args.text_page_dpi,
+    )
+
+    manifest_path = args.manifest or (args.output if output_is_dir else args.output.parent) / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    hashes = {input_pdf: file_sha256(input_pdf) for input_pdf, _ in jobs}
+
+    pending = [
+        (input_pdf, output_pdf)
+        for input_pdf, output_pdf in jobs
+        if args.force or not is_up_to_date(manifest.get(output_pdf.name), hashes[input_pdf], settings, output_pdf)
+    ]
+
+    if workers > 1 and pending:
+        residuals = sanitize_pdfs_parallel(pending, settings, workers)
+    else:
+        residuals = [
+            sanitize_pdf(input_pdf, output_pdf, settings)
+            for input_pdf, output_pdf in pending
+        ]
 
-    for input_pdf in input_files:
-        output_pdf = args.output / input_pdf.name if output_is_dir else args.output
-        sanitize_pdf(input_pdf, output_pdf, args.dpi, args.jpeg_quality)
-        residual_chars = verify_no_text(output_pdf)
-        results.append((input_pdf, output_pdf, residual_chars))
+    for (input_pdf, output_pdf), residual_chars in zip(pending, residuals):
+        manifest[output_pdf.name] = {
+            "source": input_pdf.name,
+            "source_sha256": hashes[input_pdf],
+            "settings": asdict(settings),
+            "residual_text_chars": residual_chars,
+        }
+    if pending:
+        save_manifest(manifest_path, manifest)
 
-    for src, dst, residual_chars in results:
+    rebuilt = {output_pdf for _, output_pdf in pending}
+    for src, dst in jobs:
+        residual_chars = manifest[dst.name]["residual_text_chars"]
         status = "OK" if residual_chars == 0 else f"CHECK residual_text_chars={residual_chars}"
+        if dst not in rebuilt:
+            status += " (cached)"
         print(f"{status}\t{src}\t->\t{dst}")
 
     return 0
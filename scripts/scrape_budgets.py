@@ -20,16 +20,20 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import requests
 from bs4 import BeautifulSoup
 import json
-import csv
 import time
 import os
 import re
 import argparse
+import unicodedata
 from tqdm import tqdm
 
+from export_columnar import write_csv
+from profiling import profile_run
+from site_config import SITE_ORIGIN, site_url
+
 # Constantes
-BASE_URL = "https://www10.ava.es"
-START_URL = "https://www10.ava.es/presupuestosparticipativos/budgets"
+BASE_URL = SITE_ORIGIN  # Origen canónico de las URLs guardadas; las peticiones pasan por site_url()
+START_URL = f"{BASE_URL}/presupuestosparticipativos/budgets"
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'data'))
 OUTPUT_JSON = os.path.join(DATA_DIR, "proposals_data.json")
@@ -79,80 +83,96 @@ def normalize_investment_url(url):
         return BASE_URL + path
     return u
 
+# heading_id del portal para cada zona: discovered_urls.json guarda "79"…"88", el dataset 1-10
+HEADING_ID_OFFSET = 78
+
+# Nodo de la ficha que lleva la zona: "<div class="budget-investment-info">fecha • <span class="heading">Zona Este 1</span>"
+ZONE_HEADER_SELECTORS = ['.budget-investment-info .heading', 'span.heading', '.budget-investment-info']
+ZONE_IN_TEXT_PATTERN = re.compile(r'Zona [^\W\d_]+(?: \d+)?')
+
+def zone_alias_key(text):
+    """Clave de búsqueda de una zona: sin acentos, en minúsculas y con los espacios colapsados."""
+    decomposed = unicodedata.normalize('NFD', str(text))
+    plain = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(plain.lower().replace('.', '. ').split()).strip(' .:')
+
+def build_zone_tables():
+    """Tablas precalculadas: alias de nombre -> zone_id, zone_id -> nombre completo y heading_id/zone_id -> zone_id."""
+    aliases = {}
+    names = {}
+    refs = {}
+    for short_name, complete_name in ZONE_COMPLETE_MAPPING.items():
+        zone_id = ZONE_ID_MAPPING[complete_name]
+        names[zone_id] = complete_name
+        numbered_name = complete_name.split(':', 1)[0]  # "1. Zona Este 1"
+        for alias in (short_name, complete_name, numbered_name):
+            aliases[zone_alias_key(alias)] = zone_id
+        refs[str(zone_id)] = zone_id
+        refs[str(HEADING_ID_OFFSET + zone_id)] = zone_id
+    return aliases, names, refs
+
+ZONE_ALIASES, ZONE_NAMES, ZONE_REFS = build_zone_tables()
+
+def resolve_zone_id(zone_name):
+    """zone_id canónico (1-10) de un nombre de zona en cualquiera de sus variantes, o None.
+
+    Acepta el nombre corto ("Zona Este 1"), el numerado ("1. Zona Este 1"), el
+    completo con barrios y esas mismas formas con otros acentos, mayúsculas,
+    espacios o lista de barrios. Son como mucho tres consultas a diccionario.
+    """
+    if not zone_name:
+        return None
+    key = zone_alias_key(zone_name)
+    zone_id = ZONE_ALIASES.get(key)
+    if zone_id is None and ':' in key:
+        # Lista de barrios distinta: basta con "N. Zona X" / "Zona X"
+        key = key.split(':', 1)[0].strip(' .')
+        zone_id = ZONE_ALIASES.get(key)
+    if zone_id is None:
+        zone_id = ZONE_ALIASES.get(re.sub(r'^\d+\.\s*', '', key))
+    return zone_id
+
+def resolve_zone_ref(value):
+    """zone_id canónico de un heading_id del portal ("79") o de un zone_id ya canónico (1 o "1")."""
+    if value is None or isinstance(value, bool):
+        return None
+    return ZONE_REFS.get(str(value).strip())
+
 def extract_zone_from_html(soup):
-    """Extract zone information from the HTML page"""
+    """Zona de la ficha leyendo solo el nodo de cabecera; devuelve (nombre completo, zone_id) o (None, None)."""
     if not soup:
         return None, None
-    
-    # Look for zone information in the page structure
-    # The zone appears after the date in the header area
-    zone_text = None
-    zone_id = None
-    
-    # Strategy 1: Look for text patterns that match zone names
-    # Zone names typically follow patterns like "Zona Este 1", "Zona Sur 2", etc.
-    zone_patterns = [
-        r'Zona\s+\w+\s+\d+',  # Zona Este 1, Zona Sur 2, etc.
-        r'Zona\s+\w+',        # Zona Centro, Zona Norte, etc.
-    ]
-    
-    # Search in the entire page content for zone patterns
-    page_text = soup.get_text()
-    for pattern in zone_patterns:
-        matches = re.findall(pattern, page_text)
-        if matches:
-            # Take the first match that looks like a zone name
-            for match in matches:
-                if 'Zona' in match:
-                    zone_text = match.strip()
-                    break
-            if zone_text:
-                break
-    
-    # Strategy 2: Look in the specific header area where date and zone are displayed
-    # The zone is typically shown near the date
-    info_elements = soup.find_all(['div', 'p', 'span'])
-    for elem in info_elements:
-        text = elem.get_text(strip=True)
-        # Look for zone patterns in element text
-        for pattern in zone_patterns:
-            match = re.search(pattern, text)
-            if match:
-                zone_text = match.group(0).strip()
-                break
-        if zone_text:
-            break
-    
-    # Extract zone_id from zone name
-    if zone_text:
-        # Extract numeric ID from zone name (e.g., "1. Zona Este 1" -> 1, "Zona Sur 2" -> 2)
-        id_match = re.search(r'(\d+)', zone_text)
-        if id_match:
-            zone_id = int(id_match.group(1))
-    
-    return zone_text, zone_id
+
+    for selector in ZONE_HEADER_SELECTORS:
+        node = soup.select_one(selector)
+        if not node:
+            continue
+        text = node.get_text(' ', strip=True)
+        zone_id = resolve_zone_id(text)
+        if zone_id is None:
+            # En la línea de información la zona va junto a la fecha
+            match = ZONE_IN_TEXT_PATTERN.search(text)
+            zone_id = resolve_zone_id(match.group(0)) if match else None
+        if zone_id is not None:
+            return ZONE_NAMES[zone_id], zone_id
+
+    return None, None
 
 def normalize_zone_name(zone_name):
     """Normalize zone name to complete format"""
     if not zone_name:
         return None, None
-    
-    # If already in complete format, return as is
-    if zone_name in ZONE_ID_MAPPING:
-        return zone_name, ZONE_ID_MAPPING[zone_name]
-    
-    # If in short format, convert to complete format
-    if zone_name in ZONE_COMPLETE_MAPPING:
-        complete_name = ZONE_COMPLETE_MAPPING[zone_name]
-        zone_id = ZONE_ID_MAPPING[complete_name]
-        return complete_name, zone_id
-    
+
+    zone_id = resolve_zone_id(zone_name)
+    if zone_id is not None:
+        return ZONE_NAMES[zone_id], zone_id
+
     return zone_name, None
 
 def get_soup(url):
     """Realiza una petición GET y devuelve el objeto BeautifulSoup."""
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(site_url(url), timeout=10)
         response.raise_for_status()
         return BeautifulSoup(response.content, 'html.parser')
     except requests.RequestException as e:
@@ -355,6 +375,59 @@ def discover_investments_from_budget(budget_id):
 
     return proposals
 
+def split_description(paragraphs):
+    """Separa descripción, ubicación y autor de los párrafos de una ficha."""
+    full_desc = "\n".join(paragraphs)
+    address = None
+    author = None
+
+    # 2.1 Extracción de Ubicación / Dirección
+    address_match = re.search(r'Ubicación:(.*)', full_desc, re.IGNORECASE)
+    if address_match:
+        address = address_match.group(1).strip()
+        full_desc = full_desc.replace(address_match.group(0), "")
+
+    # 2.2 Extracción de Autor
+    # Patrón 1: "Propuesto en nombre de:..."
+    author_match = re.search(r'Propuesto en nombre de:(.*)', full_desc, re.IGNORECASE)
+    if author_match:
+        author = author_match.group(1).strip()
+        full_desc = full_desc.replace(author_match.group(0), "")
+    else:
+        # Patrón 2: Firma al final con "Atentamente,"
+        # Buscamos "Atentamente," y capturamos hasta "Quiero participar" (que es boilerplate) o fin de string
+        # Usamos re.DOTALL para que . incluya newlines
+        signature_match = re.search(r'Atentamente,[\s\n]*(.*?)(?=\n.*Quiero participar|\Z)', full_desc, re.IGNORECASE | re.DOTALL)
+        if signature_match:
+            possible_author = signature_match.group(1).strip()
+            # Limpiamos si hay saltos de línea extraños
+            possible_author = possible_author.replace('\n', ' ')
+
+            # Si es corto (menos de 100 chars), asumimos que es nombre
+            if len(possible_author) < 100:
+                author = possible_author
+
+                # Limpiamos todo desde "Atentamente," para abajo en la descripción
+                # Re-buscamos el match completo para reemplazar
+                full_match = re.search(r'Atentamente,.*', full_desc, re.IGNORECASE | re.DOTALL)
+                if full_match:
+                     full_desc = full_desc.replace(full_match.group(0), "")
+
+    # Limpieza de texto boilerplate
+    boilerplate_1 = "Puedes introducir cualquier enlace de Propuesta, Debate y Proyecto de gasto que esté dentro de Presupuestos Participativos Valladolid."
+    boilerplate_2 = "Necesitasiniciar sesiónpara continuar."
+
+    full_desc = full_desc.replace(boilerplate_1, "").replace(boilerplate_2, "")
+    return full_desc.strip(), address, author
+
+def normalize_longitude(lon):
+    """Normalizar longitud a rangos [-180, 180]"""
+    while lon < -180:
+        lon += 360
+    while lon > 180:
+        lon -= 360
+    return lon
+
 def scrape_proposal_details(url, zone_name, zone_id):
     """Extrae los detalles de una página de propuesta."""
     soup = get_soup(url)
@@ -390,26 +463,19 @@ def scrape_proposal_details(url, zone_name, zone_id):
         if id_match:
             data['code'] = id_match.group(1)
     # 0.5 Procesamiento de Zona
-    # Si no tenemos zona_name o está vacía, intentar extraer del HTML
-    if not zone_name or zone_name == '':
-        extracted_zone, extracted_id = extract_zone_from_html(soup)
+    # Nombre del listado, heading_id de discovered_urls y, si no, cabecera de la ficha
+    resolved_id = resolve_zone_id(zone_name) or resolve_zone_ref(zone_id)
+    if resolved_id is None:
+        extracted_zone, resolved_id = extract_zone_from_html(soup)
         if extracted_zone:
-            zone_name = extracted_zone
-            zone_id = extracted_id
-            print(f"  [+] Extraída zona del HTML para {data['code']}: {zone_name}")
-    
-    # Normalizar el nombre de zona al formato completo
-    if zone_name:
-        normalized_zone, normalized_id = normalize_zone_name(zone_name)
-        if normalized_zone:
-            data['zone'] = normalized_zone
-            data['zone_id'] = normalized_id
-        else:
-            # Si no se puede normalizar, usar el valor original
-            data['zone'] = zone_name
-            data['zone_id'] = zone_id
+            print(f"  [+] Extraída zona del HTML para {data['code']}: {extracted_zone}")
+
+    if resolved_id is not None:
+        data['zone'] = ZONE_NAMES[resolved_id]
+        data['zone_id'] = resolved_id
     else:
-        data['zone'] = None
+        # Zona desconocida: se guarda el nombre tal cual, pero nunca un heading_id como zone_id
+        data['zone'] = zone_name or None
         data['zone_id'] = None
 
     # 1. Información Meta (Fecha)
@@ -447,47 +513,9 @@ def scrape_proposal_details(url, zone_name, zone_id):
                  if text and not text.startswith('Código de propuesta') and not text.startswith('Compartir'):
                      visible_text.append(text)
         
-        full_desc = "\n".join(visible_text)
-        
-        # 2.1 Extracción de Ubicación / Dirección
-        address_match = re.search(r'Ubicación:(.*)', full_desc, re.IGNORECASE)
-        if address_match:
-            data['address'] = address_match.group(1).strip()
-            full_desc = full_desc.replace(address_match.group(0), "")
-
-        # 2.2 Extracción de Autor
-        # Patrón 1: "Propuesto en nombre de:..."
-        author_match = re.search(r'Propuesto en nombre de:(.*)', full_desc, re.IGNORECASE)
-        if author_match:
-            data['author'] = author_match.group(1).strip()
-            full_desc = full_desc.replace(author_match.group(0), "")
-        else:
-            # Patrón 2: Firma al final con "Atentamente,"
-            # Buscamos "Atentamente," y capturamos hasta "Quiero participar" (que es boilerplate) o fin de string
-            # Usamos re.DOTALL para que . incluya newlines
-            signature_match = re.search(r'Atentamente,[\s\n]*(.*?)(?=\n.*Quiero participar|\Z)', full_desc, re.IGNORECASE | re.DOTALL)
-            if signature_match:
-                possible_author = signature_match.group(1).strip()
-                # Limpiamos si hay saltos de línea extraños
-                possible_author = possible_author.replace('\n', ' ')
-                
-                # Si es corto (menos de 100 chars), asumimos que es nombre
-                if len(possible_author) < 100:
-                    data['author'] = possible_author
-                    
-                    # Limpiamos todo desde "Atentamente," para abajo en la descripción
-                    # Re-buscamos el match completo para reemplazar
-                    full_match = re.search(r'Atentamente,.*', full_desc, re.IGNORECASE | re.DOTALL)
-                    if full_match:
-                         full_desc = full_desc.replace(full_match.group(0), "")
-
-        
-        # Limpieza de texto boilerplate
-        boilerplate_1 = "Puedes introducir cualquier enlace de Propuesta, Debate y Proyecto de gasto que esté dentro de Presupuestos Participativos Valladolid."
-        boilerplate_2 = "Necesitasiniciar sesiónpara continuar."
-        
-        full_desc = full_desc.replace(boilerplate_1, "").replace(boilerplate_2, "")
-        data['description'] = full_desc.strip()
+        data['description'], address, author = split_description(visible_text)
+        data['address'] = address
+        data['author'] = author
         
     # 2.5 Documentos
     # <div id="documents"> ... <li ...><a href="...">...</a> <strong>Nombre</strong>
@@ -543,13 +571,7 @@ def scrape_proposal_details(url, zone_name, zone_id):
             if lat_str:
                 data['latitude'] = float(lat_str)
             if lon_str:
-                lon = float(lon_str)
-                # Normalizar longitud a rangos [-180, 180]
-                while lon < -180:
-                    lon += 360
-                while lon > 180:
-                    lon -= 360
-                data['longitude'] = lon
+                data['longitude'] = normalize_longitude(float(lon_str))
         except ValueError:
             pass
         
@@ -565,21 +587,7 @@ def scrape_proposal_details(url, zone_name, zone_id):
         
     return data
 
-def main():
-    print("=== Scraper de Presupuestos Participativos ===")
-
-    os.makedirs(DATA_DIR, exist_ok=True)
-
-    parser = argparse.ArgumentParser(add_help=True)
-    parser.add_argument('--force-discovery', action='store_true')
-    parser.add_argument('--backfill-budget', type=int, default=None)
-    parser.add_argument('--backfill-ids', type=str, default=None)
-    parser.add_argument('--audit-budget', type=int, default=None)
-    parser.add_argument('--audit-all-budgets', action='store_true')
-    parser.add_argument('--sync-missing', action='store_true')
-    parser.add_argument('--backfill-zones', action='store_true', help='Backfill missing zone information from existing proposals')
-    args = parser.parse_args()
-    
+def run(args):
     # --- BACKFILL DE ZONAS ---
     if args.backfill_zones:
         print("[*] Backfill de información de zonas...")
@@ -592,14 +600,13 @@ def main():
         with open(OUTPUT_JSON, 'r', encoding='utf-8') as f:
             proposals = json.load(f)
         
-        # Encontrar propuestas con información de zona incompleta
+        # Encontrar propuestas con información de zona incompleta o no canónica
         missing_zone_proposals = []
         for proposal in proposals:
-            zone = proposal.get('zone', '')
             zone_id = proposal.get('zone_id')
             
-            # Si la zona está vacía o el zone_id es None, necesita backfill
-            if not zone or zone == '' or zone_id is None:
+            # Zona vacía, zone_id ausente o que no es 1-10 (p. ej. un heading_id), o nombre distinto del canónico
+            if zone_id not in ZONE_NAMES or proposal.get('zone') != ZONE_NAMES[zone_id]:
                 missing_zone_proposals.append(proposal)
         
         print(f"[*] Encontradas {len(missing_zone_proposals)} propuestas con información de zona incompleta")
@@ -608,33 +615,49 @@ def main():
             print("[*] Todas las propuestas tienen información de zona completa")
             return
         
-        # Procesar cada propuesta con zona incompleta
+        # heading_id y nombre de zona de cada URL según discovered_urls.json
+        discovered_zones = {}
+        if os.path.exists(DISCOVERED_URLS):
+            with open(DISCOVERED_URLS, 'r', encoding='utf-8') as f:
+                for item in json.load(f):
+                    discovered_zones[normalize_investment_url(item.get('url'))] = item
+        
+        # Primero sin red: heading_id de discovered_urls, nombre o zone_id ya guardados
         updated_count = 0
+        pending = []
+        for proposal in missing_zone_proposals:
+            discovered = discovered_zones.get(normalize_investment_url(proposal.get('url')), {})
+            resolved_id = (
+                resolve_zone_ref(discovered.get('zone_id'))
+                or resolve_zone_id(discovered.get('zone_name'))
+                or resolve_zone_id(proposal.get('zone'))
+                or resolve_zone_ref(proposal.get('zone_id'))
+            )
+            if resolved_id is None:
+                pending.append(proposal)
+                continue
+            proposal['zone'] = ZONE_NAMES[resolved_id]
+            proposal['zone_id'] = resolved_id
+            updated_count += 1
+        
+        print(f"[*] Resueltas sin descargar la ficha: {updated_count}; pendientes: {len(pending)}")
+        
+        # Solo las que quedan: cabecera de la ficha
         try:
-            pbar = tqdm(missing_zone_proposals, desc="Backfill de zonas", unit="propuesta")
+            pbar = tqdm(pending, desc="Backfill de zonas", unit="propuesta")
             for proposal in pbar:
                 url = proposal['url']
                 pbar.set_postfix(url=url[-15:])
                 
                 soup = get_soup(url)
                 if soup:
-                    # Extraer zona del HTML
                     extracted_zone, extracted_id = extract_zone_from_html(soup)
                     
                     if extracted_zone:
-                        # Normalizar zona
-                        normalized_zone, normalized_id = normalize_zone_name(extracted_zone)
-                        
-                        if normalized_zone:
-                            proposal['zone'] = normalized_zone
-                            proposal['zone_id'] = normalized_id
-                            updated_count += 1
-                            print(f"  [+] Actualizada zona para {proposal['code']}: {normalized_zone}")
-                        else:
-                            proposal['zone'] = extracted_zone
-                            proposal['zone_id'] = extracted_id
-                            updated_count += 1
-                            print(f"  [+] Actualizada zona para {proposal['code']}: {extracted_zone}")
+                        proposal['zone'] = extracted_zone
+                        proposal['zone_id'] = extracted_id
+                        updated_count += 1
+                        print(f"  [+] Actualizada zona para {proposal['code']}: {extracted_zone}")
                     else:
                         print(f"  [!] No se pudo extraer zona para {proposal['code']}")
                 
@@ -647,13 +670,9 @@ def main():
         with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
             json.dump(proposals, f, ensure_ascii=False, indent=2)
         
-        # Exportar a CSV
+        # Exportar a CSV (columnas fijas: no depende de la primera propuesta)
         if proposals:
-            keys = proposals[0].keys()
-            with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
-                dict_writer = csv.DictWriter(f, fieldnames=keys)
-                dict_writer.writeheader()
-                dict_writer.writerows(proposals)
+            write_csv(OUTPUT_CSV, proposals)
         
         print(f"\n[*] Backfill de zonas completado:")
         print(f"    Propuestas procesadas: {len(missing_zone_proposals)}")
@@ -790,6 +809,13 @@ def main():
 
     print(f"[*] Fase 2: Extrayendo detalles de {len(to_process)} propuestas nuevas...")
     
+    # Con --api se piden en bloque a la API; lo que no venga de ahí se extrae de la ficha HTML
+    api_records = {}
+    if args.api:
+        import api_ingest
+        api_records = api_ingest.records_by_url(to_process)
+        print(f"[*] Fase 2: {len(api_records)} propuestas desde la API, {len(to_process) - len(api_records)} desde HTML")
+    
     total_new = 0
     try:
         # Barra de progreso tqdm
@@ -798,7 +824,10 @@ def main():
             p_url = normalize_investment_url(proposal['url'])
             pbar.set_postfix(url=p_url[-15:]) # Mostrar final de la URL
             
-            details = scrape_proposal_details(p_url, proposal.get('zone_name') or '', proposal.get('zone_id'))
+            details = api_records.get(p_url)
+            from_api = details is not None
+            if not from_api:
+                details = scrape_proposal_details(p_url, proposal.get('zone_name') or '', proposal.get('zone_id'))
             if details:
                 all_data.append(details)
                 scraped_urls.add(p_url)
@@ -809,7 +838,8 @@ def main():
                     with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
                         json.dump(all_data, f, ensure_ascii=False, indent=2)
             
-            time.sleep(DELAY)
+            if not from_api:
+                time.sleep(DELAY)
     except KeyboardInterrupt:
         print("\n[!] Proceso interrumpido por el usuario.")
     finally:
@@ -818,17 +848,35 @@ def main():
             with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
                 json.dump(all_data, f, ensure_ascii=False, indent=2)
             
-            # Exportar a CSV
-            keys = all_data[0].keys()
-            with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
-                dict_writer = csv.DictWriter(f, fieldnames=keys)
-                dict_writer.writeheader()
-                dict_writer.writerows(all_data)
+            # Exportar a CSV (columnas fijas: no depende de la primera propuesta)
+            write_csv(OUTPUT_CSV, all_data)
             
             print(f"\n[*] Proceso finalizado.")
             print(f"    Nuevas extraídas: {total_new}")
             print(f"    Total en dataset: {len(all_data)}")
             print(f"    Archivos: {OUTPUT_JSON}, {OUTPUT_CSV}")
 
+def main():
+    print("=== Scraper de Presupuestos Participativos ===")
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    parser = argparse.ArgumentParser(add_help=True)
+    parser.add_argument('--force-discovery', action='store_true')
+    parser.add_argument('--backfill-budget', type=int, default=None)
+    parser.add_argument('--backfill-ids', type=str, default=None)
+    parser.add_argument('--audit-budget', type=int, default=None)
+    parser.add_argument('--audit-all-budgets', action='store_true')
+    parser.add_argument('--sync-missing', action='store_true')
+    parser.add_argument('--backfill-zones', action='store_true', help='Backfill missing zone information from existing proposals')
+    parser.add_argument('--api', action='store_true', help='Fetch new proposals in bulk from the GraphQL API, falling back to HTML pages')
+    parser.add_argument('--profile', action='store_true', help='Profile the run (cProfile + thread sampling) and write the profile to logs/')
+    args = parser.parse_args()
+
+    if args.profile:
+        with profile_run("scrape_budgets"):
+            return run(args)
+    return run(args)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Listado final de propuestas (las que pasan a votacion) con sus importes.
+
+Recorre `.../budgets/<b>/investments?filter=selected&page=<n>` y escribe:
+
+- `data/finales-web-clean.csv`: el CSV de siempre (`importe_web` como texto,
+  "150.000 €"), para quien lo siga leyendo.
+- `data/finales.json`: el mismo listado tipado. `rows` son listas con las
+  columnas de `columns`, el importe en centimos enteros y la zona como indice
+  a `zones`. `index.by_code` da la fila de cada codigo e `index.by_zone` las
+  filas de cada zona, asi que los totales son sumas de enteros.
+
+Cada zona lleva su tope (`cap_cents`), la suma de sus importes y si la supera
+(`over_cap`). El tope es el importe del heading en el indice de presupuestos;
+si la web no lo da, el de `data/zone_caps.json` y, si tampoco, el del
+`finales.json` anterior. Un importe que no se puede leer, una propuesta sin
+zona, una zona con propuestas y sin tope conocido o una zona por encima de su
+tope se informan al final; con `--strict` el script sale con codigo 1.
+
+    python3 scripts/scrape_finales.py
+    python3 scripts/scrape_finales.py --from-csv   # sin red, desde el CSV actual
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from bs4 import BeautifulSoup
+
+import scrape_budgets
+from datasets import DEFAULT_ZONE_CAPS_JSON, load_zone_caps
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_CSV = ROOT / "data" / "finales-web-clean.csv"
+DEFAULT_OUTPUT_JSON = ROOT / "data" / "finales.json"
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_BUDGET_ID = 6
+DEFAULT_FILTER = "selected"
+FORMAT_VERSION = 1
+MAX_PAGES = 100
+
+CSV_FIELDS = ["propuesta_id", "titulo_web", "zona_web", "importe_web", "pagina_web", "url_web"]
+COLUMNS = ["code", "title", "zone", "amount_cents", "page", "url"]
+
+# Zonas en el orden de su zone_id, con el nombre corto que usa el listado.
+ZONES = sorted(
+    scrape_budgets.ZONE_COMPLETE_MAPPING,
+    key=lambda name: scrape_budgets.ZONE_ID_MAPPING[scrape_budgets.ZONE_COMPLETE_MAPPING[name]],
+)
+
+EURO_AMOUNT_PATTERN = re.compile(r"^\s*(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d{1,2}))?\s*€?\s*$")
+EURO_IN_TEXT_PATTERN = re.compile(r"(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d{1,2}))?\s*€")
+ZONE_IN_TEXT_PATTERN = re.compile(r"Zona [^\W\d_]+(?: \d+)?")
+CODE_PATTERN = re.compile(r"/investments/(\d+)")
+
+
+@dataclass
+class FinalProposal:
+    code: str
+    title: str
+    zone: str | None
+    amount_cents: int | None
+    page: int
+    url: str
+
+
+def cents_from_match(match: re.Match) -> int:
+    euros = int(match.group(1).replace(".", ""))
+    return euros * 100 + int((match.group(2) or "0").ljust(2, "0"))
+
+
+def parse_euro_cents(text: str) -> int | None:
+    """`"150.000 €"` -> 15000000; `"1.234,5 €"` -> 123450. None si no es un importe."""
+    match = EURO_AMOUNT_PATTERN.match(str(text or ""))
+    return cents_from_match(match) if match else None
+
+
+def format_euro_cents(cents: int) -> str:
+    """Inverso de `parse_euro_cents`, con el formato del portal: `15000000` -> `"150.000 €"`."""
+    euros = f"{cents // 100:,}".replace(",", ".")
+    rest = cents % 100
+    return f"{euros},{rest:02d} €" if rest else f"{euros} €"
+
+
+def short_zone_name(text: str | None) -> str | None:
+    """Nombre corto de zona ("Zona Sur 1") dentro de un texto, si es una zona conocida."""
+    for match in ZONE_IN_TEXT_PATTERN.finditer(text or ""):
+        if match.group(0) in scrape_budgets.ZONE_COMPLETE_MAPPING:
+            return match.group(0)
+    return None
+
+
+def load_zone_by_code(path: Path) -> dict[str, str]:
+    """Zona corta de cada propuesta segun proposals_data.json (respaldo si la tarjeta no la trae)."""
+    if not path.exists():
+        return {}
+    zones = {}
+    for proposal in json.loads(path.read_text(encoding="utf-8")):
+        zone = short_zone_name(proposal.get("zone"))
+        if proposal.get("code") and zone:
+            zones[str(proposal["code"])] = zone
+    return zones
+
+
+def parse_listing_page(soup: BeautifulSoup, page: int, zone_by_code: dict[str, str]) -> list[FinalProposal]:
+    entries = []
+    for card in soup.select("div.investment-project"):
+        link = card.find("a", href=CODE_PATTERN)
+        if not link:
+            continue
+        code = CODE_PATTERN.search(link["href"]).group(1)
+        amount_elem = card.select_one(".investment-project-amount")
+        amount_match = EURO_IN_TEXT_PATTERN.search(
+            amount_elem.get_text(" ", strip=True) if amount_elem else card.get_text(" ", strip=True)
+        )
+        heading_elem = card.select_one(".heading")
+        entries.append(FinalProposal(
+            code=code,
+            title=link.get_text(strip=True),
+            zone=short_zone_name(heading_elem.get_text(strip=True) if heading_elem else None) or zone_by_code.get(code),
+            amount_cents=cents_from_match(amount_match) if amount_match else None,
+            page=page,
+            url=scrape_budgets.normalize_investment_url(link["href"]),
+        ))
+    return entries
+
+
+def fetch_final_list(budget_id: int, listing_filter: str, zone_by_code: dict[str, str]) -> list[FinalProposal]:
+    entries: list[FinalProposal] = []
+    seen: set[str] = set()
+    for page in range(1, MAX_PAGES + 1):
+        url = f"{scrape_budgets.BASE_URL}/presupuestosparticipativos/budgets/{budget_id}/investments?filter={listing_filter}&page={page}"
+        print(f"  Leyendo página {page}: {url}")
+        soup = scrape_budgets.get_soup(url)
+        if not soup:
+            break
+        for entry in parse_listing_page(soup, page, zone_by_code):
+            if entry.code not in seen:
+                seen.add(entry.code)
+                entries.append(entry)
+        if not (soup.select_one('a[rel="next"]') or soup.select_one("li.next a")):
+            break
+        time.sleep(scrape_budgets.DELAY)
+    return entries
+
+
+def fetch_zone_caps(budget_id: int) -> dict[str, int]:
+    """Importe de cada zona tal como aparece junto a su enlace en el indice de presupuestos."""
+    soup = scrape_budgets.get_soup(scrape_budgets.START_URL)
+    if not soup:
+        return {}
+    caps = {}
+    for link in soup.find_all("a", href=re.compile(rf"budgets/{budget_id}/investments\?heading_id=")):
+        zone = short_zone_name(link.get_text(" ", strip=True))
+        container = link.find_parent("li") or link.parent
+        match = EURO_IN_TEXT_PATTERN.search(container.get_text(" ", strip=True)) if container else None
+        if zone and match:
+            caps[zone] = cents_from_match(match)
+    return caps
+
+
+def read_csv_entries(path: Path) -> list[FinalProposal]:
+    with path.open(encoding="utf-8", newline="") as fh:
+        return [
+            FinalProposal(
+                code=row["propuesta_id"].strip(),
+                title=row["titulo_web"].strip(),
+                zone=short_zone_name(row["zona_web"]),
+                amount_cents=parse_euro_cents(row["importe_web"]),
+                page=int(row["pagina_web"] or 0),
+                url=row["url_web"].strip(),
+            )
+            for row in csv.DictReader(fh)
+        ]
+
+
+def load_previous_caps(path: Path) -> dict[str, int]:
+    if not path.exists():
+        return {}
+    artifact = json.loads(path.read_text(encoding="utf-8"))
+    return {zone["name"]: zone["cap_cents"] for zone in artifact.get("zones", []) if zone.get("cap_cents") is not None}
+
+
+def merge_caps(*sources: dict[str, int]) -> dict[str, int]:
+    """Une los topes por zona; para cada zona gana la primera fuente que lo tiene."""
+    caps: dict[str, int] = {}
+    for source in reversed(sources):
+        caps.update(source)
+    return caps
+
+
+def build_artifact(entries: list[FinalProposal], caps: dict[str, int], budget_id: int, source: str) -> dict[str, Any]:
+    zone_index = {zone: index for index, zone in enumerate(ZONES)}
+    rows = []
+    by_zone: list[list[int]] = [[] for _ in ZONES]
+    for position, entry in enumerate(entries):
+        zone = zone_index.get(entry.zone)
+        rows.append([entry.code, entry.title, zone, entry.amount_cents, entry.page, entry.url])
+        if zone is not None:
+            by_zone[zone].append(position)
+
+    zones = []
+    for index, name in enumerate(ZONES):
+        total = sum(rows[row][3] or 0 for row in by_zone[index])
+        cap = caps.get(name)
+        zones.append({
+            "id": scrape_budgets.ZONE_ID_MAPPING[scrape_budgets.ZONE_COMPLETE_MAPPING[name]],
+            "name": name,
+            "count": len(by_zone[index]),
+            "total_cents": total,
+            "cap_cents": cap,
+            "over_cap": None if cap is None else total > cap,
+        })
+
+    return {
+        "version": FORMAT_VERSION,
+        "budget_id": budget_id,
+        "source": source,
+        "zones": zones,
+        "columns": COLUMNS,
+        "rows": rows,
+        "index": {
+            "by_code": {row[0]: position for position, row in enumerate(rows)},
+            "by_zone": by_zone,
+        },
+        "total_cents": sum(zone["total_cents"] for zone in zones),
+    }
+
+
+def validate(artifact: dict[str, Any]) -> list[str]:
+    problems = []
+    for code, _, zone, amount, *_ in artifact["rows"]:
+        if amount is None or amount <= 0:
+            problems.append(f"{code}: importe no valido")
+        if zone is None:
+            problems.append(f"{code}: sin zona")
+    for zone in artifact["zones"]:
+        if zone["count"] and zone["cap_cents"] is None:
+            problems.append(f"{zone['name']}: sin tope conocido ({zone['count']} propuestas)")
+        if zone["over_cap"]:
+            problems.append(
+                f"{zone['name']}: {format_euro_cents(zone['total_cents'])} supera el tope de {format_euro_cents(zone['cap_cents'])}"
+            )
+    return problems
+
+
+def write_csv(path: Path, entries: list[FinalProposal]) -> None:
+    with path.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow({
+                "propuesta_id": entry.code,
+                "titulo_web": entry.title,
+                "zona_web": entry.zone or "",
+                "importe_web": format_euro_cents(entry.amount_cents) if entry.amount_cents is not None else "",
+                "pagina_web": entry.page,
+                "url_web": entry.url,
+            })
+
+
+def write_artifact(path: Path, artifact: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(artifact, ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    if args.from_csv:
+        entries = read_csv_entries(args.csv)
+        caps = merge_caps(load_zone_caps(args.caps_json), load_previous_caps(args.output))
+        source = "csv"
+    else:
+        print("[*] Leyendo el listado final...")
+        entries = fetch_final_list(args.budget_id, args.filter, load_zone_by_code(args.proposals_json))
+        if not entries:
+            raise RuntimeError("El listado final esta vacio; no se sobrescribe nada")
+        caps = merge_caps(fetch_zone_caps(args.budget_id), load_zone_caps(args.caps_json), load_previous_caps(args.output))
+        source = "web"
+        write_csv(args.csv, entries)
+
+    artifact = build_artifact(entries, caps, args.budget_id, source)
+    write_artifact(args.output, artifact)
+    return artifact
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Listado final con importes en centimos y validacion por zona")
+    parser.add_argument("--budget-id", type=int, default=DEFAULT_BUDGET_ID)
+    parser.add_argument("--filter", default=DEFAULT_FILTER, help="Filtro del listado de inversiones (por defecto, selected)")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_JSON)
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--caps-json", type=Path, default=DEFAULT_ZONE_CAPS_JSON, help="Tabla de topes por zona")
+    parser.add_argument("--from-csv", action="store_true", help="No lee la web: reconstruye el JSON desde --csv")
+    parser.add_argument("--strict", action="store_true", help="Sale con codigo 1 si la validacion encuentra problemas")
+    args = parser.parse_args()
+
+    try:
+        artifact = run(args)
+    except RuntimeError as exc:
+        raise SystemExit(f"[!] {exc}")
+    print(f"Propuestas en el listado final: {len(artifact['rows'])}")
+    for zone in artifact["zones"]:
+        cap = format_euro_cents(zone["cap_cents"]) if zone["cap_cents"] is not None else "sin tope conocido"
+        print(f"  {zone['name']:16} {zone['count']:3}  {format_euro_cents(zone['total_cents']):>14}  / {cap}")
+    print(f"Total: {format_euro_cents(artifact['total_cents'])}")
+
+    problems = validate(artifact)
+    for problem in problems:
+        print(f"[!] {problem}")
+    print(f"Guardado en {args.output}")
+    return 1 if problems and args.strict else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
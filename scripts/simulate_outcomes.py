@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Probabilidad de cada propuesta del listado final de entrar al cierre de apoyos.
+
+Simula decenas de miles de escenarios de como crecen los apoyos hasta el
+cierre (`DEADLINE`, el mismo que comprueba el workflow: 19/02/2026 23:56 hora
+de Madrid) y en cada uno aplica la seleccion por zona con tope de
+`project_winners.py`. La probabilidad es la fraccion de escenarios en que la
+propuesta entra.
+
+Modelo de crecimiento, por propuesta:
+
+- Historial: las copias de `data/backups/` que deja `update_votes.py`, los
+  commits de `proposals_data.json` con `--from-git` y el fichero actual
+  (fechado con la ultima actualizacion completa de `update_progress.json`).
+- Ritmo observado: apoyos ganados / horas en la ventana reciente
+  (`--window-hours`). Con una sola foto, apoyos / horas desde su publicacion.
+- Cada ritmo se encoge hacia el de su zona (un Gamma con `PRIOR_HOURS` horas
+  de peso) para que una propuesta con pocos datos no se dispare. En cada
+  escenario el ritmo se saca de ese Gamma, se multiplica por un empuje comun
+  a todas (log-normal, `--momentum`: la participacion sube o baja para todas
+  a la vez) y los apoyos nuevos salen de una Poisson.
+
+Todo va en bloques de escenarios con NumPy (necesario): la ordenacion por
+zona y la seleccion con tope se hacen a la vez para todas las zonas y todos
+los escenarios del bloque. La semilla es fija, asi que con los mismos datos
+el resultado es el mismo.
+
+Escribe `data/outcome_probabilities.json` en columnas como el resto de
+artefactos. Los topes salen de `finales.json`, de `data/zone_caps.json` o de
+`--cap` (como en `project_winners.py`); si una zona con candidatas no tiene
+tope conocido no se simula nada.
+
+    python3 scripts/simulate_outcomes.py
+    python3 scripts/simulate_outcomes.py --trials 50000 --cap "Zona Centro=645000"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from datasets import DEFAULT_ZONE_CAPS_JSON
+from project_winners import (
+    NEVER_FITS,
+    check_caps,
+    code_order,
+    greedy_selection,
+    known_caps,
+    np,
+    parse_caps,
+    votes_from_proposals,
+    zone_members,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROPOSALS_JSON = ROOT / "data" / "proposals_data.json"
+DEFAULT_FINALES_JSON = ROOT / "data" / "finales.json"
+DEFAULT_PROGRESS_JSON = ROOT / "data" / "update_progress.json"
+DEFAULT_BACKUP_DIR = ROOT / "data" / "backups"
+DEFAULT_OUTPUT_JSON = ROOT / "data" / "outcome_probabilities.json"
+FORMAT_VERSION = 1
+
+# Cierre de apoyos (hora peninsular de invierno, CET).
+DEADLINE = datetime(2026, 2, 19, 23, 56, tzinfo=timezone(timedelta(hours=1)))
+DEFAULT_TRIALS = 20000
+DEFAULT_SEED = 2027
+DEFAULT_WINDOW_HOURS = 72
+DEFAULT_MOMENTUM = 0.3
+CHUNK_TRIALS = 5000
+# Peso del ritmo de la zona, en horas de observacion equivalentes.
+PRIOR_HOURS = 24.0
+MIN_SPAN_HOURS = 1.0
+
+COLUMNS = ["code", "zone", "votes", "rate_per_day", "votes_p10", "votes_p50", "votes_p90", "probability"]
+BACKUP_PATTERN = re.compile(r"proposals_data_backup_(\d{8}_\d{6})\.json$")
+
+Snapshot = tuple[datetime, dict[str, int]]
+
+
+def local_time(value: datetime) -> datetime:
+    """Las marcas sin zona que escriben los scripts son hora local de la maquina."""
+    return value.astimezone() if value.tzinfo is None else value
+
+
+def read_votes(path: Path) -> dict[str, int]:
+    return votes_from_proposals(json.loads(path.read_text(encoding="utf-8")))
+
+
+def backup_snapshots(backup_dir: Path) -> list[Snapshot]:
+    snapshots = []
+    for path in sorted(backup_dir.glob("proposals_data_backup_*.json")):
+        match = BACKUP_PATTERN.search(path.name)
+        if not match:
+            continue
+        try:
+            votes = read_votes(path)
+        except (OSError, ValueError):
+            continue
+        snapshots.append((local_time(datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")), votes))
+    return snapshots
+
+
+def git_snapshots(proposals_json: Path, limit: int = 200) -> list[Snapshot]:
+    """Versiones de `proposals_data.json` en el historial de git (fecha del commit)."""
+    relative = proposals_json.resolve().relative_to(ROOT).as_posix()
+    try:
+        log = subprocess.run(
+            ["git", "log", f"-{limit}", "--format=%H %cI", "--", relative],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    snapshots = []
+    for line in log.splitlines():
+        commit, _, committed_at = line.partition(" ")
+        try:
+            content = subprocess.run(
+                ["git", "show", f"{commit}:{relative}"], cwd=ROOT, capture_output=True, check=True,
+            ).stdout
+            votes = votes_from_proposals(json.loads(content))
+        except (subprocess.CalledProcessError, ValueError):
+            continue
+        snapshots.append((datetime.fromisoformat(committed_at), votes))
+    return snapshots
+
+
+def current_snapshot(proposals_json: Path, progress_json: Path) -> Snapshot:
+    observed_at = None
+    if progress_json.exists():
+        try:
+            stamp = json.loads(progress_json.read_text(encoding="utf-8")).get("last_complete_timestamp")
+            observed_at = local_time(datetime.fromisoformat(stamp)) if stamp else None
+        except ValueError:
+            observed_at = None
+    if observed_at is None:
+        observed_at = datetime.fromtimestamp(proposals_json.stat().st_mtime, timezone.utc)
+    return observed_at, read_votes(proposals_json)
+
+
+def merge_snapshots(snapshots: list[Snapshot]) -> list[Snapshot]:
+    """Ordenadas por fecha, sin repetir fecha ni fotos identicas seguidas."""
+    merged: list[Snapshot] = []
+    for observed_at, votes in sorted(snapshots, key=lambda snapshot: snapshot[0]):
+        if merged and (merged[-1][0] == observed_at or merged[-1][1] == votes):
+            continue
+        merged.append((observed_at, votes))
+    return merged
+
+
+def published_at(proposal: dict[str, Any]) -> datetime | None:
+    try:
+        return datetime.strptime(proposal.get("date") or "", "%d/%m/%Y").replace(tzinfo=DEADLINE.tzinfo)
+    except ValueError:
+        return None
+
+
+def observed_rates(
+    codes: list[str],
+    snapshots: list[Snapshot],
+    published: dict[str, datetime | None],
+    window_hours: float,
+) -> tuple[Any, Any]:
+    """Apoyos ganados y horas observadas por propuesta (arrays alineados con `codes`)."""
+    as_of, latest = snapshots[-1]
+    window_start = as_of - timedelta(hours=window_hours)
+    base_at, base = next(
+        ((observed_at, votes) for observed_at, votes in snapshots if observed_at >= window_start),
+        snapshots[0],
+    )
+    span = (as_of - base_at).total_seconds() / 3600
+    gained = np.zeros(len(codes))
+    hours = np.zeros(len(codes))
+    for position, code in enumerate(codes):
+        if span >= MIN_SPAN_HOURS and code in base:
+            gained[position] = max(0, latest.get(code, 0) - base[code])
+            hours[position] = span
+        elif published.get(code) is not None:
+            gained[position] = latest.get(code, 0)
+            hours[position] = max(MIN_SPAN_HOURS, (as_of - published[code]).total_seconds() / 3600)
+    return gained, hours
+
+
+def simulate(
+    zones: list[dict[str, Any]],
+    members: list[list[tuple[str, int]]],
+    votes: Any,
+    gained: Any,
+    hours: Any,
+    horizon_hours: float,
+    trials: int,
+    seed: int,
+    momentum: float,
+) -> tuple[Any, Any]:
+    """Veces que entra cada candidata y apoyos finales simulados (trials x candidatas)."""
+    rng = np.random.default_rng(seed)
+    count = len(votes)
+    width = max((len(candidates) for candidates in members), default=0)
+    slots = np.full((len(zones), width), -1, dtype=np.int64)
+    amounts = np.full((len(zones), width), NEVER_FITS, dtype=np.int64)
+    # Desempate: a igualdad de apoyos, primero el codigo menor (valor mas alto aqui).
+    tiebreak = np.zeros((len(zones), width), dtype=np.int64)
+    position = 0
+    for zone, candidates in enumerate(members):
+        ranked = sorted(range(len(candidates)), key=lambda index: code_order(candidates[index][0]))
+        for slot, (_, amount) in enumerate(candidates):
+            slots[zone, slot] = position + slot
+            amounts[zone, slot] = amount
+            tiebreak[zone, slot] = width - ranked.index(slot)
+        position += len(candidates)
+    caps = np.array([zone["cap_cents"] if zone["cap_cents"] is not None else -1 for zone in zones], dtype=np.int64)
+    padding = slots < 0
+
+    # Ritmo de cada zona como previa de sus propuestas.
+    zone_of = np.repeat(np.arange(len(zones)), [len(candidates) for candidates in members])
+    zone_rate = np.array([
+        gained[zone_of == zone].sum() / max(hours[zone_of == zone].sum(), MIN_SPAN_HOURS) for zone in range(len(zones))
+    ])
+    shape = gained + zone_rate[zone_of] * PRIOR_HOURS
+    rate = hours + PRIOR_HOURS
+
+    wins = np.zeros(count, dtype=np.int64)
+    finals = np.empty((trials, count), dtype=np.int64)
+    for start in range(0, trials, CHUNK_TRIALS):
+        size = min(CHUNK_TRIALS, trials - start)
+        if horizon_hours > 0:
+            hourly = rng.gamma(np.maximum(shape, 1e-9), 1 / rate, size=(size, count))
+            surge = rng.lognormal(-momentum ** 2 / 2, momentum, size=(size, 1))
+            final = votes + rng.poisson(hourly * surge * horizon_hours)
+        else:
+            final = np.broadcast_to(votes, (size, count)).astype(np.int64)
+        finals[start:start + size] = final
+
+        zone_votes = np.where(padding, -1, final[:, np.where(padding, 0, slots)])
+        order = np.argsort(-(zone_votes * (width + 1) + tiebreak), axis=-1, kind="stable")
+        ranked_amounts = np.take_along_axis(np.broadcast_to(amounts, zone_votes.shape), order, axis=-1)
+        ranked_selected, _ = greedy_selection(ranked_amounts, np.broadcast_to(caps, (size, len(zones))))
+        selected = np.zeros(zone_votes.shape, dtype=bool)
+        np.put_along_axis(selected, order, ranked_selected, axis=-1)
+        np.add.at(wins, slots[~padding], selected[:, ~padding].sum(axis=0))
+    return wins, finals
+
+
+def run(
+    proposals_json: Path = DEFAULT_PROPOSALS_JSON,
+    finales_json: Path = DEFAULT_FINALES_JSON,
+    output: Path = DEFAULT_OUTPUT_JSON,
+    *,
+    progress_json: Path = DEFAULT_PROGRESS_JSON,
+    backup_dir: Path = DEFAULT_BACKUP_DIR,
+    from_git: bool = False,
+    caps: dict[str, int] | None = None,
+    caps_json: Path = DEFAULT_ZONE_CAPS_JSON,
+    trials: int = DEFAULT_TRIALS,
+    seed: int = DEFAULT_SEED,
+    window_hours: float = DEFAULT_WINDOW_HOURS,
+    momentum: float = DEFAULT_MOMENTUM,
+) -> dict[str, Any]:
+    if np is None:
+        raise RuntimeError("simulate_outcomes.py necesita NumPy (pip install numpy)")
+
+    finales = json.loads(finales_json.read_text(encoding="utf-8"))
+    zones, members = zone_members(finales, known_caps(finales, caps, caps_json))
+    check_caps(zones, members)
+
+    snapshots = backup_snapshots(backup_dir)
+    if from_git:
+        snapshots += git_snapshots(proposals_json)
+    snapshots = merge_snapshots(snapshots + [current_snapshot(proposals_json, progress_json)])
+    as_of, latest = snapshots[-1]
+
+    codes = [code for candidates in members for code, _ in candidates]
+    proposals = {proposal.get("code"): proposal for proposal in json.loads(proposals_json.read_text(encoding="utf-8"))}
+    published = {code: published_at(proposals.get(code) or {}) for code in codes}
+    gained, hours = observed_rates(codes, snapshots, published, window_hours)
+    votes = np.array([latest.get(code, 0) for code in codes], dtype=np.int64)
+    horizon_hours = max(0.0, (DEADLINE - as_of).total_seconds() / 3600)
+
+    wins, finals = simulate(zones, members, votes, gained, hours, horizon_hours, trials, seed, momentum)
+    p10, p50, p90 = np.percentile(finals, [10, 50, 90], axis=0)
+    probability = wins / trials
+
+    rows, by_zone, position = [], [], 0
+    for zone, candidates in enumerate(members):
+        known = zones[zone]["cap_cents"] is not None
+        by_zone.append(list(range(position, position + len(candidates))))
+        for index in range(position, position + len(candidates)):
+            rows.append([
+                codes[index],
+                zone,
+                int(votes[index]),
+                round(float(gained[index] / hours[index] * 24), 2) if hours[index] else 0.0,
+                int(round(p10[index])),
+                int(round(p50[index])),
+                int(round(p90[index])),
+                round(float(probability[index]), 4) if known else None,
+            ])
+        position += len(candidates)
+
+    artifact = {
+        "version": FORMAT_VERSION,
+        "as_of": as_of.isoformat(timespec="seconds"),
+        "deadline": DEADLINE.isoformat(timespec="seconds"),
+        "horizon_hours": round(horizon_hours, 2),
+        "snapshots": len(snapshots),
+        "trials": trials,
+        "seed": seed,
+        "zones": [
+            {
+                **zone,
+                "expected_winners": round(sum(rows[row][7] for row in by_zone[index]), 2) if zone["cap_cents"] is not None else None,
+            }
+            for index, zone in enumerate(zones)
+        ],
+        "columns": COLUMNS,
+        "rows": rows,
+        "index": {
+            "by_code": {row[0]: position for position, row in enumerate(rows)},
+            "by_zone": by_zone,
+        },
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(artifact, ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+    return artifact
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Probabilidad de entrar al cierre de apoyos (Monte Carlo)")
+    parser.add_argument("--proposals-json", type=Path, default=DEFAULT_PROPOSALS_JSON)
+    parser.add_argument("--finales-json", type=Path, default=DEFAULT_FINALES_JSON)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_JSON)
+    parser.add_argument("--backup-dir", type=Path, default=DEFAULT_BACKUP_DIR)
+    parser.add_argument("--from-git", action="store_true", help="Usa tambien las versiones de proposals_data.json en git")
+    parser.add_argument("--caps-json", type=Path, default=DEFAULT_ZONE_CAPS_JSON, help="Tabla de topes por zona")
+    parser.add_argument("--cap", action="append", default=[], metavar="ZONA=EUROS", help="Tope de una zona (repetible)")
+    parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--window-hours", type=float, default=DEFAULT_WINDOW_HOURS, help="Ventana para medir el ritmo reciente")
+    parser.add_argument("--momentum", type=float, default=DEFAULT_MOMENTUM, help="Dispersion del empuje comun por escenario")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        artifact = run(
+            args.proposals_json,
+            args.finales_json,
+            args.output,
+            backup_dir=args.backup_dir,
+            from_git=args.from_git,
+            caps=parse_caps(args.cap),
+            caps_json=args.caps_json,
+            trials=args.trials,
+            seed=args.seed,
+            window_hours=args.window_hours,
+            momentum=args.momentum,
+        )
+    except RuntimeError as exc:
+        raise SystemExit(f"[!] {exc}")
+
+    print(f"Fotos de apoyos: {artifact['snapshots']} (la ultima, {artifact['as_of']})")
+    print(f"Horas hasta el cierre: {artifact['horizon_hours']}")
+    for zone in artifact["zones"]:
+        expected = zone["expected_winners"] if zone["expected_winners"] is not None else "sin tope conocido"
+        print(f"  {zone['name']:16} ganadoras esperadas: {expected}")
+    print(f"{artifact['trials']} escenarios en {time.perf_counter() - started:.1f}s")
+    print(f"Guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
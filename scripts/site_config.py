@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Origen del portal de presupuestos participativos usado por los scripts.
+
+Por defecto es el servidor municipal. La variable de entorno
+`PARTICIPATIVOS_BASE_URL` permite apuntar todos los scrapers a otro origen,
+por ejemplo al servidor local de `mock_site.py`:
+
+    PARTICIPATIVOS_BASE_URL=http://127.0.0.1:8765 python3 scripts/update_votes.py
+
+Las URLs guardadas en los datos siguen apuntando al servidor real; `site_url`
+las reescribe al origen configurado en el momento de pedirlas.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+
+SITE_ORIGIN = "https://www10.ava.es"
+BASE_URL = os.environ.get("PARTICIPATIVOS_BASE_URL", SITE_ORIGIN).rstrip("/")
+
+_ORIGIN_PATTERN = re.compile(r"^https?://[^/]+")
+
+
+def site_url(url: str) -> str:
+    """Reescribe una URL absoluta del portal (o una ruta) al origen configurado."""
+    if not url:
+        return url
+    if url.startswith("/"):
+        return BASE_URL + url
+    if BASE_URL == SITE_ORIGIN or not url.startswith(SITE_ORIGIN):
+        return url
+    return _ORIGIN_PATTERN.sub(BASE_URL, url, count=1)
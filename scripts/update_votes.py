@@ -8,12 +8,14 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import json
+import glob
+import hashlib
 import time
 import os
 import random
 import logging
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 from tqdm import tqdm
 import shutil
 import sys
@@ -21,9 +23,16 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import ssl
 import certifi
+import argparse
+from contextlib import nullcontext
+
+from concurrency import AdaptiveLimiter
+from profiling import profile_run
+from run_metrics import RunMetrics, instrument_session, write_github_outputs
+from scrape_budgets import START_URL, ZONE_REFS, normalize_investment_url
+from site_config import site_url
 
 # Configuración
-BASE_URL = "https://www10.ava.es"
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'data'))
 LOGS_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'logs'))
@@ -31,6 +40,8 @@ PROPOSALS_FILE = os.path.join(DATA_DIR, "proposals_data.json")
 PROGRESS_FILE = os.path.join(DATA_DIR, "update_progress.json")
 BACKUP_DIR = os.path.join(DATA_DIR, "backups")
 LOG_FILE = os.path.join(LOGS_DIR, "vote_update.log")
+METRICS_FILE = os.path.join(LOGS_DIR, "vote_update_metrics.json")
+SHARDS_DIR = os.path.join(DATA_DIR, "cache", "vote_shards")
 
 # Configuración de tiempo y actualización
 MIN_UPDATE_INTERVAL_HOURS = 1  # Mínimo 1 hora entre actualizaciones completas
@@ -43,7 +54,10 @@ BATCH_SIZE = 100  # lotes más pequeños
 PAUSE_EVERY = 100  # pausas más frecuentes
 PAUSE_DURATION = 8  # pausas más largas
 TIMEOUT = 15  # timeout más generoso
-MAX_WORKERS = 6  # menos hilos concurrentes para GitHub Actions
+# Peticiones en vuelo: empiezan en INITIAL_CONCURRENCY y AdaptiveLimiter las ajusta según latencia y errores
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+MAX_LISTING_PAGES = 500  # tope de páginas por zona en el modo de listados
 
 # Headers optimizados
 HEADERS = {
@@ -55,6 +69,33 @@ HEADERS = {
     'Upgrade-Insecure-Requests': '1',
 }
 
+def parse_shard(value):
+    """"2/4" -> (2, 4); los shards se numeran desde 1"""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value or '')
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"Shard no válido: {value!r} (formato i/N, con 1 <= i <= N)")
+    return int(match.group(1)), int(match.group(2))
+
+def shard_of(code, shard_count):
+    """Shard (1..N) de una propuesta: hash estable del código, igual en cualquier máquina"""
+    digest = hashlib.sha1(str(code).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % shard_count + 1
+
+def listing_heading_id(listing_url):
+    return re.search(r'heading_id=(\d+)', listing_url).group(1)
+
+def listing_shards(listing_urls, shard_count):
+    """heading_id -> shard (1..N): los listados se reparten por turnos en orden de heading_id
+
+    Todos los shards leen el mismo índice, así que el reparto es el mismo en cada
+    máquina, y por turnos queda más parejo que con el hash (solo hay 10 zonas).
+    """
+    headings = sorted({listing_heading_id(url) for url in listing_urls}, key=int)
+    return {heading: position % shard_count + 1 for position, heading in enumerate(headings)}
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
 # Lock para thread-safe operations
 stats_lock = threading.Lock()
 
@@ -70,17 +111,40 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class VoteUpdater:
-    def __init__(self):
+    def __init__(self, metrics=None, prometheus_file=None, from_listings=False, shard=None, shards_dir=SHARDS_DIR):
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
         
         # Configurar sesión con SSL robusto para GitHub Actions
         self.setup_ssl_session()
         
+        # Métricas por etapa y por petición (ver run_metrics.py)
+        self.metrics = metrics or RunMetrics("update_votes")
+        self.prometheus_file = prometheus_file
+        self.from_listings = from_listings
+        self.limiter = AdaptiveLimiter(INITIAL_CONCURRENCY, maximum=MAX_CONCURRENCY, metrics=self.metrics, stage="votes")
+        
+        # Con --shard i/N solo se procesan las propuestas del shard y el resultado va a su fichero
+        self.shard = shard
+        self.progress_file = PROGRESS_FILE
+        if shard:
+            self.shard_file = os.path.join(shards_dir, f"shard-{shard[0]}-of-{shard[1]}.json")
+            self.progress_file = os.path.join(shards_dir, f"progress-{shard[0]}-of-{shard[1]}.json")
+            os.makedirs(shards_dir, exist_ok=True)
+        instrument_session(self.session, self.metrics, "votes", limiter=self.limiter)
+        
         self.start_time = time.time()
         self.processed_count = 0
         self.error_count = 0
         self.updated_count = 0
+        self.listing_pages = 0
+        self.listing_votes = 0
+        self.observations = {}  # código -> {"votes", "observed_at"} leídos en esta ejecución (o en la interrumpida que se reanuda)
+        self.shard_started_at = datetime.fromtimestamp(self.start_time, timezone.utc).isoformat()
+        self.listing_observed_at = {}
+        # Listados que leer en el modo de listados; None = todos los del índice
+        self.listing_urls = None
+        self.error_codes = []
         
         # Crear directorios
         os.makedirs(BACKUP_DIR, exist_ok=True)
@@ -154,9 +218,9 @@ class VoteUpdater:
     
     def load_progress(self):
         """Cargar progreso previo si existe"""
-        if os.path.exists(PROGRESS_FILE):
+        if os.path.exists(self.progress_file):
             try:
-                with open(PROGRESS_FILE, 'r') as f:
+                with open(self.progress_file, 'r') as f:
                     return json.load(f)
             except Exception as e:
                 logger.warning(f"Error cargando progreso: {e}")
@@ -165,7 +229,7 @@ class VoteUpdater:
     def save_progress(self, progress):
         """Guardar progreso actual"""
         try:
-            with open(PROGRESS_FILE, 'w') as f:
+            with open(self.progress_file, 'w') as f:
                 json.dump(progress, f, indent=2)
         except Exception as e:
             logger.error(f"Error guardando progreso: {e}")
@@ -177,66 +241,87 @@ class VoteUpdater:
         progress["processed_codes"] = []  # Resetear para próxima ejecución completa
         self.save_progress(progress)
     
-    def get_vote_count(self, proposal_url, proposal_code):
-        """Obtener votos de forma ultra-robusta para GitHub Actions"""
+    def fetch_html(self, url, label):
+        """Descargar una página con reintentos (None si falla en todos los intentos)"""
         
         for attempt in range(MAX_RETRIES):
             try:
                 # Delay más conservador
                 time.sleep(BASE_DELAY + random.uniform(0, 0.2))
                 
-                response = self.session.get(proposal_url, timeout=TIMEOUT)
+                response = self.session.get(site_url(url), timeout=TIMEOUT)
                 response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Búsqueda directa del span con clase total-supports
-                vote_span = soup.find('span', class_='total-supports')
-                if vote_span:
-                    text = vote_span.get_text().strip()
-                    
-                    # Caso especial: "Sin apoyos"
-                    if "sin apoyos" in text.lower():
-                        return 0
-                    
-                    # Extraer número del texto "X apoyos"
-                    numbers = re.findall(r'\d+', text)
-                    if numbers:
-                        return int(numbers[0])
-                
-                # Búsqueda alternativa más exhaustiva si falla la principal
-                page_text = soup.get_text()
-                vote_patterns = [
-                    r'(\d+)\s*apoyos?',
-                    r'apoyos?\s*[:\-]?\s*(\d+)',
-                    r'(\d+)\s*votos?',
-                    r'votos?\s*[:\-]?\s*(\d+)',
-                ]
-                
-                for pattern in vote_patterns:
-                    matches = re.findall(pattern, page_text, re.IGNORECASE)
-                    if matches:
-                        return int(matches[-1])
-                
-                # Si no se encuentra nada, mantener valor existente en lugar de asumir 0
-                logger.warning(f"No se encontraron votos para propuesta {proposal_code}, manteniendo valor existente")
-                return None  # Señal para mantener valor existente
+                return response.content
                     
             except requests.exceptions.RequestException as e:
                 wait_time = (attempt + 1) * 2  # Backoff más agresivo
                 if attempt == MAX_RETRIES - 1:
-                    logger.warning(f"Error final para propuesta {proposal_code}: {e}")
-                    return None  # Mantener valor existente en caso de error
-                logger.warning(f"Intento {attempt + 1}/{MAX_RETRIES} para propuesta {proposal_code}: {e}. Esperando {wait_time}s...")
+                    logger.warning(f"Error final para {label}: {e}")
+                    return None
+                self.metrics.count("retries", stage="votes")
+                logger.warning(f"Intento {attempt + 1}/{MAX_RETRIES} para {label}: {e}. Esperando {wait_time}s...")
                 time.sleep(wait_time)
                 
             except Exception as e:
                 if attempt == MAX_RETRIES - 1:
-                    logger.error(f"Error inesperado para propuesta {proposal_code}: {e}")
-                    return None  # Mantener valor existente en caso de error
+                    logger.error(f"Error inesperado para {label}: {e}")
+                    return None
                 time.sleep(1)
         
-        return None  # Mantener valor existente como último recurso
+        return None
+    
+    def get_vote_count(self, proposal_url, proposal_code):
+        """Obtener votos de forma ultra-robusta para GitHub Actions"""
+        html = self.fetch_html(proposal_url, f"propuesta {proposal_code}")
+        if html is None:
+            return None  # Mantener valor existente en caso de error
+        
+        with self.metrics.timer("parse_seconds", stage="votes"):
+            votes = self.parse_vote_count(html)
+        if votes is None:
+            # Si no se encuentra nada, mantener valor existente en lugar de asumir 0
+            logger.warning(f"No se encontraron votos para propuesta {proposal_code}, manteniendo valor existente")
+        return votes
+    
+    @staticmethod
+    def parse_supports_text(text):
+        """Número de apoyos de un texto "X apoyos" / "Sin apoyos" (None si no hay número)"""
+        # Caso especial: "Sin apoyos"
+        if "sin apoyos" in text.lower():
+            return 0
+        
+        # Extraer número del texto "X apoyos"
+        numbers = re.findall(r'\d+', text)
+        if numbers:
+            return int(numbers[0])
+        return None
+    
+    def parse_vote_count(self, html):
+        """Extraer el número de apoyos del HTML de la ficha (None si no aparece)"""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Búsqueda directa del span con clase total-supports
+        vote_span = soup.find('span', class_='total-supports')
+        if vote_span:
+            votes = self.parse_supports_text(vote_span.get_text().strip())
+            if votes is not None:
+                return votes
+        
+        # Búsqueda alternativa más exhaustiva si falla la principal
+        page_text = soup.get_text()
+        vote_patterns = [
+            r'(\d+)\s*apoyos?',
+            r'apoyos?\s*[:\-]?\s*(\d+)',
+            r'(\d+)\s*votos?',
+            r'votos?\s*[:\-]?\s*(\d+)',
+        ]
+        
+        for pattern in vote_patterns:
+            matches = re.findall(pattern, page_text, re.IGNORECASE)
+            if matches:
+                return int(matches[-1])
+        
+        return None
     
     def process_proposal(self, proposal):
         """Procesar una propuesta individual"""
@@ -267,17 +352,20 @@ class VoteUpdater:
                     if new_votes != old_votes:
                         self.updated_count += 1
                     self.processed_count += 1
+                    self.observations[proposal_code] = {"votes": new_votes, "observed_at": utc_now()}
                 
                 return result
             else:
                 # Mantener valor existente cuando hay error
                 with stats_lock:
                     self.error_count += 1
+                    self.error_codes.append(proposal_code)
                 return {"code": proposal_code, "error": "Manteniendo valor existente por error"}
                 
         except Exception as e:
             with stats_lock:
                 self.error_count += 1
+                self.error_codes.append(proposal_code)
             return {"code": proposal_code, "error": str(e)}
     
     def update_proposals(self, proposals, progress):
@@ -290,7 +378,7 @@ class VoteUpdater:
         processed_codes = set(progress.get("processed_codes", []))
         proposals_to_process = [p for p in remaining_proposals if p.get("code") not in processed_codes]
         
-        logger.info(f"Procesando {len(proposals_to_process)} propuestas con {MAX_WORKERS} hilos")
+        logger.info(f"Procesando {len(proposals_to_process)} propuestas con concurrencia adaptativa ({self.limiter.describe()})")
         
         with tqdm(total=len(proposals_to_process), desc="Actualizando votos") as pbar:
             
@@ -298,7 +386,8 @@ class VoteUpdater:
             for i in range(0, len(proposals_to_process), BATCH_SIZE):
                 batch = proposals_to_process[i:i + BATCH_SIZE]
                 
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                # Hilos hasta el tope; cuántas peticiones van en vuelo lo decide el limitador
+                with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
                     # Enviar todas las propuestas del lote
                     future_to_proposal = {
                         executor.submit(self.process_proposal, proposal): proposal 
@@ -321,27 +410,297 @@ class VoteUpdater:
                 
                 # Pausa breve entre lotes
                 if i + BATCH_SIZE < len(proposals_to_process):
-                    time.sleep(PAUSE_DURATION)
+                    with self.metrics.stage("pause_between_batches"):
+                        time.sleep(PAUSE_DURATION)
                 
                 # Guardar progreso cada lote
-                self.save_progress(progress)
-                self.save_proposals(proposals)
+                with self.metrics.stage("checkpoint"):
+                    self.save_progress(progress)
+                    self.save_proposals(proposals)
                 
                 # Mostrar estadísticas
                 with stats_lock:
                     logger.info(f"Lote completado: {self.processed_count}/{len(proposals)} procesados, "
-                              f"{self.updated_count} actualizados, {self.error_count} errores")
+                              f"{self.updated_count} actualizados, {self.error_count} errores, "
+                              f"límite de concurrencia {self.limiter.limit:.1f}")
         
         return proposals
     
+    def get_listing_urls(self):
+        """URLs de los listados por zona (heading_id) del índice de presupuestos"""
+        html = self.fetch_html(START_URL, "índice de presupuestos")
+        if html is None:
+            return []
+        
+        soup = BeautifulSoup(html, 'html.parser')
+        urls = {}
+        for link in soup.find_all('a', href=re.compile(r'investments\?heading_id=\d+')):
+            heading_id = re.search(r'heading_id=(\d+)', link['href']).group(1)
+            if heading_id in urls:
+                continue
+            # Mismo orden estable que get_zones en scrape_budgets.py para que la paginación no baile
+            href = re.sub(r'&?order=[^&]*', '', link['href'])
+            urls[heading_id] = f"{href}&order=confidence_score"
+        return list(urls.values())
+    
+    def parse_listing_votes(self, html):
+        """Apoyos de cada tarjeta de un listado: ({código: votos o None}, hay página siguiente)"""
+        soup = BeautifulSoup(html, 'html.parser')
+        votes_by_code = {}
+        for card in soup.find_all('div', class_='investment-project'):
+            link = card.find('a', href=re.compile(r'/budgets/\d+/investments/\d+'))
+            if not link:
+                continue
+            code = normalize_investment_url(link['href']).rstrip('/').rsplit('/', 1)[-1]
+            vote_span = card.find('span', class_='total-supports')
+            votes = self.parse_supports_text(vote_span.get_text().strip()) if vote_span else None
+            # Si la misma propuesta sale dos veces, vale la tarjeta que sí tenga apoyos
+            if votes is not None or code not in votes_by_code:
+                votes_by_code[code] = votes
+        
+        has_next = bool(soup.select_one('a[rel="next"]') or soup.select_one('li.next a'))
+        return votes_by_code, has_next
+    
+    def harvest_listing(self, listing_url):
+        """Recorrer la paginación de un listado y devolver los apoyos de sus tarjetas"""
+        votes_by_code = {}
+        for page in range(1, MAX_LISTING_PAGES + 1):
+            html = self.fetch_html(f"{listing_url}&page={page}", f"listado {listing_url} página {page}")
+            if html is None:
+                break
+            
+            observed_at = utc_now()
+            with self.metrics.timer("parse_seconds", stage="listings"):
+                page_votes, has_next = self.parse_listing_votes(html)
+            for code, votes in page_votes.items():
+                if votes is not None or code not in votes_by_code:
+                    votes_by_code[code] = votes
+            with stats_lock:
+                self.listing_pages += 1
+                for code, votes in page_votes.items():
+                    if votes is not None:
+                        self.listing_observed_at[code] = observed_at
+            if not has_next:
+                break
+        return votes_by_code
+    
+    def harvest_listing_votes(self):
+        """Apoyos de todas las propuestas leídos de los listados por zona, en paralelo"""
+        listing_urls = self.listing_urls if self.listing_urls is not None else self.get_listing_urls()
+        logger.info(f"Leyendo apoyos de {len(listing_urls)} listados de zona ({self.limiter.describe()})")
+        
+        votes_by_code = {}
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+            for zone_votes in executor.map(self.harvest_listing, listing_urls):
+                for code, votes in zone_votes.items():
+                    if votes is not None or code not in votes_by_code:
+                        votes_by_code[code] = votes
+        return votes_by_code
+    
+    def update_from_listings(self, proposals, progress):
+        """Actualizar votos desde los listados; solo se piden fichas de las propuestas sin apoyos en ellos"""
+        with self.metrics.stage("fetch_listings"):
+            votes_by_code = self.harvest_listing_votes()
+        
+        processed_codes = set(progress.get("processed_codes", []))
+        for proposal in proposals:
+            code = proposal.get("code")
+            new_votes = votes_by_code.get(str(code))
+            if new_votes is None or code in processed_codes:
+                continue
+            
+            if new_votes != proposal.get("votes", 0):
+                proposal["votes"] = new_votes
+                self.updated_count += 1
+            self.processed_count += 1
+            self.listing_votes += 1
+            self.observations[code] = {"votes": new_votes, "observed_at": self.listing_observed_at.get(str(code)) or utc_now()}
+            progress["processed_codes"].append(code)
+        
+        processed_codes = set(progress["processed_codes"])
+        fallback = sum(1 for proposal in proposals if proposal.get("code") not in processed_codes)
+        logger.info(f"Apoyos leídos de {self.listing_pages} páginas de listado para {self.listing_votes} propuestas; "
+                    f"{fallback} se consultarán en su ficha")
+        self.metrics.count("listing_votes", self.listing_votes, result="listing")
+        self.metrics.count("listing_votes", fallback, result="detail_fallback")
+        
+        # El resto (tarjetas sin apoyos o propuestas que no salen en ningún listado) va por ficha
+        return self.update_proposals(proposals, progress)
+    
     def save_proposals(self, proposals):
         """Guardar las propuestas actualizadas"""
+        if self.shard:
+            # Un shard no toca el dataset: su resultado se junta después con --merge-shards
+            self.save_shard_results()
+            return
         try:
-            with open(PROPOSALS_FILE, 'w', encoding='utf-8') as f:
+            # Escritura atómica: quien lea el fichero a la vez (otras etapas del pipeline) nunca ve un JSON a medias
+            tmp_file = f"{PROPOSALS_FILE}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(proposals, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, PROPOSALS_FILE)
         except Exception as e:
             logger.error(f"Error guardando propuestas: {e}")
     
+    def shard_proposals(self, proposals):
+        """Propuestas de este shard
+
+        Por fichas, cada código va a su shard por hash. Con --from-listings cada
+        listado de zona lo lee un solo shard, que se queda con las propuestas de
+        esa zona (también las que acaben yendo por ficha); las que no son de
+        ninguna zona del índice siguen repartidas por hash del código.
+        """
+        index, count = self.shard
+        owner_by_zone = {}
+        if self.from_listings:
+            listing_urls = self.get_listing_urls()
+            heading_shards = listing_shards(listing_urls, count)
+            self.listing_urls = [url for url in listing_urls if heading_shards[listing_heading_id(url)] == index]
+            owner_by_zone = {ZONE_REFS[heading]: shard for heading, shard in heading_shards.items() if heading in ZONE_REFS}
+        
+        selected = []
+        for proposal in proposals:
+            zone_id = ZONE_REFS.get(str(proposal.get("zone_id")))
+            if owner_by_zone.get(zone_id, shard_of(proposal.get("code"), count)) == index:
+                selected.append(proposal)
+        
+        listings = f", {len(self.listing_urls)} listados de zona" if self.listing_urls is not None else ""
+        logger.info(f"Shard {index}/{count}: {len(selected)} propuestas{listings} (resultado en {self.shard_file})")
+        return selected
+    
+    def resume_shard_results(self, progress):
+        """Al reanudar un shard, recuperar lo que ya guardó la ejecución interrumpida.
+
+        El progreso hace que se salten los códigos ya procesados, así que sin
+        esto el fichero del shard se reescribiría solo con los de esta ejecución.
+        """
+        if not progress.get("processed_codes") or not os.path.exists(self.shard_file):
+            return
+        try:
+            with open(self.shard_file, 'r', encoding='utf-8') as f:
+                shard_data = json.load(f)
+        except Exception as e:
+            logger.warning(f"No se pudo leer {self.shard_file} para reanudar: {e}")
+            return
+        if (shard_data.get("shard"), shard_data.get("shards")) != tuple(self.shard):
+            return
+        for result in shard_data.get("results", []):
+            self.observations[result["code"]] = {"votes": result["votes"], "observed_at": result["observed_at"]}
+        self.error_codes.extend(shard_data.get("errors", []))
+        self.shard_started_at = shard_data.get("started_at") or self.shard_started_at
+        logger.info(f"Reanudando shard: {len(self.observations)} resultados previos en {self.shard_file}")
+    
+    def save_shard_results(self):
+        """Guardar los votos observados por este shard (con la hora de cada observación)"""
+        index, count = self.shard
+        with stats_lock:
+            results = [
+                {"code": code, "votes": observation["votes"], "observed_at": observation["observed_at"]}
+                for code, observation in sorted(self.observations.items())
+            ]
+            errors = sorted(set(self.error_codes) - set(self.observations))
+        shard_data = {
+            "shard": index,
+            "shards": count,
+            "started_at": self.shard_started_at,
+            "saved_at": utc_now(),
+            "results": results,
+            "errors": errors,
+        }
+        try:
+            tmp_file = f"{self.shard_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(shard_data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, self.shard_file)
+        except Exception as e:
+            logger.error(f"Error guardando resultados del shard: {e}")
+    
+    def merge_shards(self, shard_files):
+        """Juntar los ficheros de shard en el dataset; si un código aparece varias veces gana la observación más reciente
+
+        Solo se juntan ficheros de un mismo número de shards, y se descartan las
+        observaciones anteriores a la última actualización completa del dataset
+        (restos de ejecuciones ya juntadas).
+        """
+        loaded = []
+        for shard_file in sorted(shard_files):
+            try:
+                with open(shard_file, 'r', encoding='utf-8') as f:
+                    loaded.append((shard_file, json.load(f)))
+            except Exception as e:
+                logger.error(f"Error leyendo {shard_file}: {e}")
+                return False
+        
+        counts = sorted({str(shard_data.get("shards")) for _, shard_data in loaded})
+        if len(counts) > 1:
+            logger.error(f"Hay ficheros de shard de distintas ejecuciones ({', '.join(counts)} shards); "
+                         f"indica los ficheros de una sola ejecución o borra los que sobran")
+            return False
+        
+        last_complete = self.load_progress().get("last_complete_timestamp")
+        if last_complete:
+            last_complete = datetime.fromisoformat(last_complete)
+            if last_complete.tzinfo is None:
+                last_complete = last_complete.astimezone()  # mark_complete guarda la hora local sin zona
+        
+        latest = {}
+        errors = set()
+        shards_seen = {}
+        stale = 0
+        for shard_file, shard_data in loaded:
+            shards_seen.setdefault(shard_data.get("shards"), set()).add(shard_data.get("shard"))
+            errors.update(str(code) for code in shard_data.get("errors", []))
+            for result in shard_data.get("results", []):
+                code = str(result["code"])
+                observed_at = datetime.fromisoformat(result["observed_at"])
+                if last_complete and observed_at <= last_complete:
+                    stale += 1
+                    continue
+                # Empate en la hora: orden total por votos para que el resultado no dependa del orden de los ficheros
+                key = (observed_at, result["votes"])
+                if code not in latest or key > latest[code]:
+                    latest[code] = key
+        
+        for count, seen in shards_seen.items():
+            missing = sorted(set(range(1, (count or 0) + 1)) - seen)
+            if missing:
+                logger.warning(f"Faltan shards de {count}: {', '.join(map(str, missing))}")
+        if stale:
+            logger.warning(f"Descartadas {stale} observaciones anteriores a la última actualización completa ({last_complete.isoformat()})")
+        logger.info(f"Juntando {len(shard_files)} ficheros de shard: {len(latest)} propuestas observadas")
+        if not latest:
+            logger.error("Ningún fichero de shard trae observaciones posteriores a la última actualización")
+            return False
+        
+        if not self.create_backup():
+            logger.error("No se pudo crear el backup. Abortando.")
+            return False
+        with open(PROPOSALS_FILE, 'r', encoding='utf-8') as f:
+            proposals = json.load(f)
+        
+        for proposal in proposals:
+            code = str(proposal.get("code"))
+            if code not in latest:
+                continue
+            new_votes = latest[code][1]
+            if new_votes != proposal.get("votes", 0):
+                proposal["votes"] = new_votes
+                self.updated_count += 1
+            self.processed_count += 1
+        self.error_count = len(errors - set(latest))
+        
+        self.save_proposals(proposals)
+        # Los ficheros ya juntados quedan anteriores a esta marca y no se vuelven a aplicar
+        self.mark_complete(self.load_progress())
+        logger.info(f"Merge completado: {self.processed_count} procesadas, {self.updated_count} actualizadas, "
+                    f"{self.error_count} con error en todos los shards")
+        write_github_outputs({
+            "processed": self.processed_count,
+            "updated": self.updated_count,
+            "errors": self.error_count,
+        })
+        return True
+    
     def generate_report(self, progress):
         """Generar reporte final"""
         elapsed_time = time.time() - self.start_time
@@ -360,7 +719,8 @@ Estadísticas:
 - Velocidad: {self.processed_count/elapsed_time:.1f} propuestas/segundo
 
 Configuración utilizada:
-- Hilos concurrentes: {MAX_WORKERS}
+- Modo: {"listados de zona (" + str(self.listing_pages) + " páginas, " + str(self.listing_votes) + " propuestas)" if self.from_listings else "fichas"}
+- Concurrencia adaptativa: {self.limiter.describe()}
 - Delay base: {BASE_DELAY}s
 - Tamaño de lote: {BATCH_SIZE}
 - Timeout: {TIMEOUT}s
@@ -375,11 +735,13 @@ Errores registrados: {len(progress.get('errors', []))}
         
         logger.info(report)
         
-        # Output GitHub Actions environment variables for persistence
-        if os.getenv('GITHUB_ACTIONS'):
-            print(f"::set-output name=processed::{self.processed_count}")
-            print(f"::set-output name=updated::{self.updated_count}")
-            print(f"::set-output name=errors::{self.error_count}")
+        # Outputs de GitHub Actions (::set-output está obsoleto, se usa $GITHUB_OUTPUT)
+        outputs = {
+            "processed": self.processed_count,
+            "updated": self.updated_count,
+            "errors": self.error_count,
+        }
+        if write_github_outputs(outputs):
             logger.info(f"GitHub Actions outputs set: processed={self.processed_count}, updated={self.updated_count}, errors={self.error_count}")
         
         # Guardar reporte
@@ -390,13 +752,30 @@ Errores registrados: {len(progress.get('errors', []))}
             logger.info(f"Reporte guardado en: {report_file}")
         except Exception as e:
             logger.error(f"Error guardando reporte: {e}")
+        
+        self.save_metrics()
+    
+    def save_metrics(self):
+        """Volcar el resumen de métricas en JSON (y en formato Prometheus si se pidió)"""
+        for name, value in (("processed", self.processed_count), ("updated", self.updated_count), ("errors", self.error_count)):
+            self.metrics.set_gauge("proposals", value, result=name)
+        try:
+            summary = self.metrics.write_json(METRICS_FILE)
+            stages = ", ".join(f"{name} {entry['seconds']:.1f}s" for name, entry in summary["stages"].items())
+            logger.info(f"Métricas guardadas en: {METRICS_FILE} ({stages})")
+            if self.prometheus_file:
+                self.metrics.write_prometheus(self.prometheus_file)
+                logger.info(f"Métricas Prometheus guardadas en: {self.prometheus_file}")
+        except Exception as e:
+            logger.error(f"Error guardando métricas: {e}")
     
     def run(self):
         """Ejecutar el proceso de actualización con control de tiempo"""
         logger.info("Iniciando actualización de votos...")
         
         # 1. Cargar progreso
-        progress = self.load_progress()
+        with self.metrics.stage("load_progress"):
+            progress = self.load_progress()
         
         # 2. Verificar si se debe actualizar
         should_update, reason = self.should_update(progress)
@@ -409,30 +788,41 @@ Errores registrados: {len(progress.get('errors', []))}
         
         logger.info(f"Actualización procediendo: {reason}")
         
-        # 3. Crear backup
-        backup_file = self.create_backup()
-        if not backup_file:
-            logger.error("No se pudo crear el backup. Abortando.")
-            return False
+        # 3. Crear backup (un shard no modifica el dataset)
+        if not self.shard:
+            with self.metrics.stage("backup"):
+                backup_file = self.create_backup()
+            if not backup_file:
+                logger.error("No se pudo crear el backup. Abortando.")
+                return False
         
         # 4. Cargar datos
         try:
-            with open(PROPOSALS_FILE, 'r', encoding='utf-8') as f:
+            with self.metrics.stage("load_proposals"), open(PROPOSALS_FILE, 'r', encoding='utf-8') as f:
                 proposals = json.load(f)
             logger.info(f"Cargadas {len(proposals)} propuestas")
         except Exception as e:
             logger.error(f"Error cargando propuestas: {e}")
             return False
         
+        if self.shard:
+            proposals = self.shard_proposals(proposals)
+            self.resume_shard_results(progress)
+        
         # 5. Actualizar votos
         try:
-            updated_proposals = self.update_proposals(proposals, progress)
+            if self.from_listings:
+                updated_proposals = self.update_from_listings(proposals, progress)
+            else:
+                with self.metrics.stage("fetch_votes"):
+                    updated_proposals = self.update_proposals(proposals, progress)
             
             # 6. Guardar datos finales
-            self.save_proposals(updated_proposals)
-            
-            # 7. Marcar como completada
-            self.mark_complete(progress)
+            with self.metrics.stage("save"):
+                self.save_proposals(updated_proposals)
+                
+                # 7. Marcar como completada
+                self.mark_complete(progress)
             
             # 8. Generar reporte
             self.generate_report(progress)
@@ -444,17 +834,43 @@ Errores registrados: {len(progress.get('errors', []))}
             logger.info("Proceso interrumpido. Guardando progreso...")
             self.save_progress(progress)
             self.save_proposals(proposals)
+            self.save_metrics()
             return False
         except Exception as e:
             logger.error(f"Error durante la actualización: {e}")
+            self.save_metrics()
             return False
 
 def main():
     """Función principal"""
-    updater = VoteUpdater()
+    parser = argparse.ArgumentParser(description="Actualizar votos de las propuestas")
+    parser.add_argument("--prometheus", default=None,
+                        help="Escribir también las métricas en formato Prometheus en este fichero")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfilar la ejecución (cProfile + muestreo de hilos) y guardar el perfil en logs/")
+    parser.add_argument("--from-listings", action="store_true",
+                        help="Leer los apoyos de los listados por zona y pedir la ficha solo si falta en la tarjeta")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="i/N",
+                        help="Procesar solo el shard i de N (hash del código) y guardar el resultado en --shards-dir")
+    parser.add_argument("--shards-dir", default=SHARDS_DIR,
+                        help="Directorio de los ficheros de shard")
+    parser.add_argument("--merge-shards", nargs="*", default=None, metavar="FICHERO",
+                        help="Juntar los ficheros de shard en el dataset (sin ficheros: todos los de --shards-dir)")
+    args = parser.parse_args()
+    
+    updater = VoteUpdater(prometheus_file=args.prometheus, from_listings=args.from_listings,
+                          shard=args.shard, shards_dir=args.shards_dir)
+    
+    if args.merge_shards is not None:
+        shard_files = args.merge_shards or glob.glob(os.path.join(args.shards_dir, "shard-*-of-*.json"))
+        if not shard_files:
+            logger.error(f"No hay ficheros de shard en {args.shards_dir}")
+            sys.exit(1)
+        sys.exit(0 if updater.merge_shards(shard_files) else 1)
     
     try:
-        success = updater.run()
+        with profile_run("update_votes", LOGS_DIR) if args.profile else nullcontext():
+            success = updater.run()
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         logger.info("Proceso interrumpido")
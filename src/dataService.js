@@ -33,9 +33,16 @@ export async function fetchData() {
         const rawData = await rawResponse.json();
         const metaData = await metaResponse.json();
 
+        // Index metadata by code once; on duplicated codes the first entry wins
+        const metaByCode = new Map();
+        metaData.forEach(m => {
+            const code = String(m.code);
+            if (!metaByCode.has(code)) metaByCode.set(code, m);
+        });
+
         // Merge datasets using 'code' as key
         const mergedData = rawData.map(proposal => {
-            const meta = metaData.find(m => String(m.code) === String(proposal.code)) || {};
+            const meta = metaByCode.get(String(proposal.code)) || {};
             
             // Use metadata category if available, otherwise check title for "Inadmitida"
             let category = meta.category || 'Sin categoría';
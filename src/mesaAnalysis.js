@@ -1,7 +1,7 @@
 import { escapeHtml } from './utils.js';
 
-const CSV_URL = '../data/mesa-final-unificado.csv?v=20260616c';
-const FINAL_BUDGETS_URL = '../data/finales-web-clean.csv?v=20260618a';
+// Generado por scripts/export_mesa_analysis.py a partir de los dos CSV de mesa y final.
+const ANALYSIS_URL = '../data/mesa-analysis.json?v=20261018a';
 
 const ACTA_BY_ZONE = {
     'Zona Centro': {
@@ -79,10 +79,17 @@ const STATUS_META = {
         className: 'status-final-no-mesa',
         label: 'En la final sin localizar claramente en acta',
     },
+    'En acta sin decision clara y fuera de la final': {
+        className: 'status-final-no-mesa',
+        label: 'En acta sin decisión clara y fuera de la final',
+    },
 };
 
 const state = {
     rows: [],
+    rowsById: new Map(),
+    enums: null,
+    aggregates: null,
     filters: {
         status: 'Todas',
         zone: 'Todas',
@@ -132,54 +139,6 @@ function getActaForZone(zone) {
     return ACTA_BY_ZONE[zone] || null;
 }
 
-function parseCsv(text) {
-    const rows = [];
-    let current = '';
-    let row = [];
-    let inQuotes = false;
-
-    for (let i = 0; i < text.length; i += 1) {
-        const char = text[i];
-        const next = text[i + 1];
-
-        if (char === '"' && inQuotes && next === '"') {
-            current += '"';
-            i += 1;
-            continue;
-        }
-
-        if (char === '"') {
-            inQuotes = !inQuotes;
-            continue;
-        }
-
-        if (char === ',' && !inQuotes) {
-            row.push(current);
-            current = '';
-            continue;
-        }
-
-        if ((char === '\n' || char === '\r') && !inQuotes) {
-            if (char === '\r' && next === '\n') i += 1;
-            row.push(current);
-            if (row.some(value => value !== '')) rows.push(row);
-            row = [];
-            current = '';
-            continue;
-        }
-
-        current += char;
-    }
-
-    if (current || row.length) {
-        row.push(current);
-        rows.push(row);
-    }
-
-    const headers = rows.shift() || [];
-    return rows.map(values => Object.fromEntries(headers.map((header, index) => [header, values[index] || ''])));
-}
-
 function normalize(value) {
     return String(value || '')
         .normalize('NFD')
@@ -187,79 +146,45 @@ function normalize(value) {
         .toLowerCase();
 }
 
-// Known canonical categories from the platform.
-// Any token not in this list (after light cleaning) is discarded.
-const KNOWN_CATEGORIES = new Set([
-    'Asociaciones',
-    'Contaminación ambiental y acústica',
-    'Cultura',
-    'Cultura y Embellecimiento Urbano',
-    'Deporte',
-    'Deportes',
-    'Educación',
-    'Igualdad',
-    'Medio Ambiente',
-    'Medio Ambiente - Limpieza',
-    'Participación ciudadana',
-    'Participación ciudadana - Asociaciones',
-    'Patrimonio',
-    'Ruido - Contaminación acústica',
-    'Salud',
-    'Salud y consumo - Animales',
-    'Seguridad y emergencias',
-    'Servicios sociales',
-    'Transportes y movilidad',
-    'Turismo',
-    'Urbanismo',
-]);
-
-function normalizeCategories(raw) {
-    if (!raw) return '';
-    // Strip surrounding/internal quotes and semicolons, then split on |
-    const cleaned = raw
-        .replace(/"/g, '')
-        .replace(/;/g, '')
-        .trim();
-    const parts = cleaned.split('|').map(p => p.trim()).filter(Boolean);
-    // Keep only tokens that match a known canonical category
-    const valid = parts.filter(p => KNOWN_CATEGORIES.has(p));
-    // Deduplicate while preserving order
-    return [...new Set(valid)].join(' | ');
-}
-
-function buildFinalBudgetMap(rows) {
-    return new Map(
-        rows
-            .filter(row => row.propuesta_id && row.importe_web)
-            .map(row => [String(row.propuesta_id).trim(), String(row.importe_web).trim()]),
-    );
+function formatEuroCents(cents) {
+    if (cents === null || cents === undefined) return '';
+    const euros = String(Math.floor(cents / 100)).replace(/\B(?=(\d{3})+(?!\d))/g, '.');
+    const rest = cents % 100;
+    return `${euros}${rest ? `,${String(rest).padStart(2, '0')}` : ''} €`;
+}
+
+function decodeRows(analysis) {
+    const { enums } = analysis;
+    const column = Object.fromEntries(analysis.columns.map((name, index) => [name, index]));
+    return analysis.rows.map(values => {
+        const categorias = values[column.categories].map(index => enums.category[index]);
+        const row = {
+            situacion: enums.status[values[column.status]] ?? '',
+            zona: enums.zone[values[column.zone]] ?? '',
+            propuestaId: values[column.id],
+            titulo: values[column.title],
+            enlace: values[column.url],
+            apoyos: values[column.supports],
+            categorias,
+            categoria: categorias.join(' | '),
+            apareceDescartadaEnMesa: values[column.discarded_in_mesa] ? 'SI' : 'NO',
+            extractoActa: values[column.extract],
+            razonExclusion: values[column.reason],
+            tipoRazonExclusion: enums.exclusion_type[values[column.exclusion_type]] ?? '',
+            presupuestoFinal: formatEuroCents(values[column.budget_cents]),
+        };
+        row.searchText = normalize(`${row.titulo} ${row.zona} ${row.categoria} ${row.propuestaId}`);
+        return row;
+    });
 }
 
-function parseRows(rows, finalBudgetMap = new Map()) {
-    return rows.map(row => ({
-        situacion: row.situacion,
-        zona: row.zona,
-        propuestaId: row.propuesta_id,
-        titulo: row.titulo_propuesta,
-        enlace: row.enlace,
-        apoyos: Number.parseInt(row.apoyos, 10) || 0,
-        categoria: normalizeCategories(row.categoria) || 'Sin categoría',
-        apareceEnMesa: row.aparece_en_mesa,
-        apareceDescartadaEnMesa: row.aparece_descartada_en_mesa,
-        ordenMesa: row.orden_detectado_en_mesa,
-        apareceEnFinal: row.aparece_en_final_126,
-        decisionMesa: row.decision_mesa || '',
-        fiabilidad: row.fiabilidad_lectura_mesa || 'no aplica',
-        extractoActa: row.extracto_acta || '',
-        razonExclusion: row.razon_exclusion || '',
-        tipoRazonExclusion: row.tipo_razon_exclusion || '',
-        informeInviabilidadUrl: row.informe_inviabilidad_url || '',
-        presupuestoFinal: finalBudgetMap.get(String(row.propuesta_id || '').trim()) || '',
-    }));
+function statusCount(status) {
+    const index = state.enums.status.indexOf(status);
+    return index === -1 ? 0 : state.aggregates.status_counts[index];
 }
 
 function getProposalLinkById(proposalId) {
-    const existingLink = state.rows.find(row => row.propuestaId === proposalId)?.enlace;
+    const existingLink = state.rowsById.get(proposalId)?.enlace;
     if (existingLink) return existingLink;
     if (/^\d{4}$/.test(String(proposalId || ''))) {
         return `https://www10.ava.es/presupuestosparticipativos/budgets/6/investments/${proposalId}`;
@@ -275,7 +200,7 @@ function renderReasonTextWithLinks(text) {
 
     source.replace(pattern, (match, prefix, proposalId, offset) => {
         html += escapeHtml(source.slice(lastIndex, offset));
-        const localMatch = state.rows.some(row => row.propuestaId === proposalId);
+        const localMatch = state.rowsById.has(proposalId);
         const fallbackLink = getProposalLinkById(proposalId);
         if (localMatch) {
             html += `${escapeHtml(prefix)}<button type="button" class="mesa-inline-proposal-link" data-related-proposal-id="${escapeHtml(proposalId)}">${escapeHtml(proposalId)}</button>`;
@@ -325,10 +250,9 @@ function getRowsMatchingBaseFilters() {
         if (TABLE_HIDDEN_STATUSES.has(row.situacion)) return false;
         const statusMatch = state.filters.status === 'Todas' || row.situacion === state.filters.status;
         const zoneMatch = state.filters.zone === 'Todas' || row.zona === state.filters.zone;
-        const rowCategories = row.categoria ? row.categoria.split('|').map(c => c.trim()).filter(Boolean) : [];
-        const categoryMatch = state.filters.category === 'Todas' || rowCategories.includes(state.filters.category);
+        const categoryMatch = state.filters.category === 'Todas' || row.categorias.includes(state.filters.category);
         const supportMatch = row.apoyos >= state.filters.minSupport;
-        const queryMatch = !query || normalize(`${row.titulo} ${row.zona} ${row.categoria} ${row.propuestaId}`).includes(query);
+        const queryMatch = !query || row.searchText.includes(query);
         return statusMatch && zoneMatch && categoryMatch && supportMatch && queryMatch;
     });
 }
@@ -368,13 +292,6 @@ function compareBySort(a, b) {
     }
 }
 
-function countBy(rows, key) {
-    return rows.reduce((acc, row) => {
-        acc[row[key]] = (acc[row[key]] || 0) + 1;
-        return acc;
-    }, {});
-}
-
 function fillSelect(id, values, currentValue) {
     const select = document.getElementById(id);
     if (!select) return;
@@ -506,30 +423,10 @@ function applyFiltersFromUrl({ zones = [], categories = [], exclusionTypes = []
 }
 
 function setupFilters() {
-    const zones = ['Todas', ...new Set(state.rows.map(row => row.zona).filter(Boolean))].sort((a, b) => {
-        if (a === 'Todas') return -1;
-        if (b === 'Todas') return 1;
-        return a.localeCompare(b, 'es', { numeric: true });
-    });
-    const allCategories = new Set();
-    state.rows.forEach(row => {
-        if (row.categoria) {
-            row.categoria.split('|').forEach(cat => {
-                const trimmed = cat.trim();
-                if (trimmed) allCategories.add(trimmed);
-            });
-        }
-    });
-    const categories = ['Todas', ...Array.from(allCategories)].sort((a, b) => {
-        if (a === 'Todas') return -1;
-        if (b === 'Todas') return 1;
-        return a.localeCompare(b, 'es');
-    });
-    const exclusionTypes = ['Todas', ...new Set(state.rows.map(row => row.tipoRazonExclusion).filter(Boolean))].sort((a, b) => {
-        if (a === 'Todas') return -1;
-        if (b === 'Todas') return 1;
-        return a.localeCompare(b, 'es');
-    });
+    // Las listas ya vienen ordenadas en el JSON.
+    const zones = ['Todas', ...state.enums.zone];
+    const categories = ['Todas', ...state.enums.category];
+    const exclusionTypes = ['Todas', ...state.enums.exclusion_type];
     applyFiltersFromUrl({ zones, categories, exclusionTypes });
     const visibleStatuses = STATUS_ORDER.filter(status => !TABLE_HIDDEN_STATUSES.has(status));
     fillSelect('filter-status', ['Todas', ...visibleStatuses], state.filters.status);
@@ -683,8 +580,7 @@ function renderSortIndicators() {
     });
 }
 
-function renderMetrics(rows) {
-    const counts = countBy(rows, 'situacion');
+function renderMetrics() {
     const metricsContainer = document.getElementById('summary-metrics');
     const summaryStatuses = [
         'Mesa pero no final',
@@ -695,7 +591,7 @@ function renderMetrics(rows) {
     if (metricsContainer) {
         metricsContainer.innerHTML = summaryStatuses.map(status => {
             const meta = STATUS_META[status];
-            const value = counts[status] || 0;
+            const value = statusCount(status);
             return `
                 <article class="mesa-summary-metric mesa-summary-metric-actionable">
                     <span class="mesa-metric-label">
@@ -713,40 +609,36 @@ function renderMetrics(rows) {
             });
         });
     }
-    document.getElementById('filtered-count').textContent = `${rows.length} propuestas`;
-}
-
-function renderOverviewInsight(rows) {
-    const counts = countBy(rows, 'situacion');
-    const byZone = rows
-        .filter(row => row.situacion === 'Mesa pero no final')
-        .reduce((acc, row) => {
-            acc[row.zona] = (acc[row.zona] || 0) + 1;
-            return acc;
-        }, {});
-    const topZone = Object.entries(byZone).sort((a, b) => b[1] - a[1])[0];
+    document.getElementById('filtered-count').textContent = `${state.rows.length} propuestas`;
+}
+
+function renderOverviewInsight() {
+    const mesaNoFinal = state.enums.status.indexOf('Mesa pero no final');
+    const topZone = state.enums.zone
+        .map((zone, index) => [zone, state.aggregates.zone_status_counts[index][mesaNoFinal] || 0])
+        .filter(([, count]) => count > 0)
+        .sort((a, b) => b[1] - a[1])[0];
     const text = topZone
-        ? `${counts['Mesa pero no final'] || 0} propuestas elegidas por las mesas no aparecen en la votación final. ${counts['Descartada por mesa y en la final'] || 0} fueron descartadas por la mesa y aun así sí aparecen en la final. ${counts['Mesa y final'] || 0} sí llegaron y ${counts['Final pero no detectada en mesa'] || 0} están en la final pero no las hemos localizado con claridad en las actas.`
-        : `Mostrando ${rows.length} propuestas en esta vista.`;
+        ? `${statusCount('Mesa pero no final')} propuestas elegidas por las mesas no aparecen en la votación final. ${statusCount('Descartada por mesa y en la final')} fueron descartadas por la mesa y aun así sí aparecen en la final. ${statusCount('Mesa y final')} sí llegaron y ${statusCount('Final pero no detectada en mesa')} están en la final pero no las hemos localizado con claridad en las actas.`
+        : `Mostrando ${state.rows.length} propuestas en esta vista.`;
     document.getElementById('overview-insight').textContent = text;
     document.getElementById('zone-insight').textContent = topZone
         ? `No todas las zonas pierden el mismo número de propuestas entre la mesa y la final. En esta vista, ${topZone[0]} es la zona con más propuestas elegidas por mesa que no llegaron al listado final.`
         : 'No hay suficientes datos para mostrar una lectura por zonas.';
 }
 
-function renderSummaryRail(rows) {
+function renderSummaryRail() {
     const container = document.getElementById('summary-rail');
-    const counts = countBy(rows, 'situacion');
     const summaryStatuses = [
         'Mesa pero no final',
         'Descartada por mesa y en la final',
         'Mesa y final',
         'Final pero no detectada en mesa',
     ];
-    const total = summaryStatuses.reduce((sum, status) => sum + (counts[status] || 0), 0) || 1;
+    const total = summaryStatuses.reduce((sum, status) => sum + statusCount(status), 0) || 1;
 
     container.innerHTML = summaryStatuses.map(status => {
-        const value = counts[status] || 0;
+        const value = statusCount(status);
         const percent = (value / total) * 100;
         const meta = STATUS_META[status];
         return `
@@ -762,33 +654,25 @@ function renderSummaryRail(rows) {
     }).join('');
 }
 
-function renderZoneBars(rows) {
+function renderZoneBars() {
     const container = document.getElementById('zone-bars');
-    const byZone = new Map();
-    rows.forEach(row => {
-        if (!byZone.has(row.zona)) {
-            byZone.set(row.zona, {
-                visibleTotal: 0,
-                mesaNoFinal: 0,
-                discardedFinal: 0,
-                mesaFinal: 0,
-                finalNoMesa: 0,
-            });
-        }
-        const entry = byZone.get(row.zona);
-        if (row.situacion === 'Mesa pero no final') entry.mesaNoFinal += 1;
-        if (row.situacion === 'Descartada por mesa y en la final') entry.discardedFinal += 1;
-        if (row.situacion === 'Mesa y final') entry.mesaFinal += 1;
-        if (row.situacion === 'Final pero no detectada en mesa') entry.finalNoMesa += 1;
-        if ([
-            'Mesa pero no final',
-            'Descartada por mesa y en la final',
-            'Mesa y final',
-            'Final pero no detectada en mesa',
-        ].includes(row.situacion)) {
-            entry.visibleTotal += 1;
-        }
-    });
+    const statusIndex = status => state.enums.status.indexOf(status);
+    const visibleStatuses = [
+        'Mesa pero no final',
+        'Descartada por mesa y en la final',
+        'Mesa y final',
+        'Final pero no detectada en mesa',
+    ].map(statusIndex);
+    const byZone = new Map(state.enums.zone.map((zone, index) => {
+        const counts = state.aggregates.zone_status_counts[index];
+        return [zone, {
+            visibleTotal: visibleStatuses.reduce((sum, status) => sum + (counts[status] || 0), 0),
+            mesaNoFinal: counts[statusIndex('Mesa pero no final')] || 0,
+            discardedFinal: counts[statusIndex('Descartada por mesa y en la final')] || 0,
+            mesaFinal: counts[statusIndex('Mesa y final')] || 0,
+            finalNoMesa: counts[statusIndex('Final pero no detectada en mesa')] || 0,
+        }];
+    }));
 
     const zones = Array.from(byZone.entries())
         .sort((a, b) => b[1].mesaNoFinal - a[1].mesaNoFinal || b[1].visibleTotal - a[1].visibleTotal);
@@ -841,13 +725,7 @@ function renderZoneBars(rows) {
 }
 
 function renderTopProposals() {
-    const topRows = state.rows
-        .filter(row => (
-            row.situacion === 'Mesa pero no final'
-            && row.apareceDescartadaEnMesa !== 'SI'
-        ))
-        .sort((a, b) => b.apoyos - a.apoyos)
-        .slice(0, 5);
+    const topRows = state.aggregates.top_mesa_no_final.map(index => state.rows[index]);
 
     document.getElementById('top-proposals').innerHTML = topRows.map((row, index) => `
         <article class="mesa-top-item">
@@ -860,10 +738,8 @@ function renderTopProposals() {
     `).join('');
 }
 
-function renderDiscardedFinalCases(rows) {
-    const flagged = rows
-        .filter(row => row.situacion === 'Descartada por mesa y en la final')
-        .sort((a, b) => b.apoyos - a.apoyos);
+function renderDiscardedFinalCases() {
+    const flagged = state.aggregates.discarded_in_final.map(index => state.rows[index]);
     const container = document.getElementById('discarded-final-list');
     const count = document.getElementById('discarded-final-count');
     if (!container || !count) return;
@@ -911,7 +787,7 @@ function renderTable(rows) {
             </td>
             <td data-label="Categoria">
                 <div class="mesa-categories-wrap">
-                    ${row.categoria ? row.categoria.split('|').map(cat => cat.trim()).filter(Boolean).map(cat => `<span class="mesa-category-pill">${escapeHtml(cat)}</span>`).join('') : ''}
+                    ${row.categorias.map(cat => `<span class="mesa-category-pill">${escapeHtml(cat)}</span>`).join('')}
                 </div>
             </td>
         </tr>
@@ -933,14 +809,19 @@ function setupActaModal() {
     // The public UI now links directly to sanitized flattened copies.
 }
 
+// Los bloques de resumen no dependen de los filtros: se pintan una vez al cargar.
+function renderSummaries() {
+    renderMetrics();
+    renderOverviewInsight();
+    renderSummaryRail();
+    renderZoneBars();
+    renderDiscardedFinalCases();
+    renderTopProposals();
+}
+
 function render() {
     const rows = getFilteredRows();
     updateUrlFromFilters();
-    renderMetrics(state.rows);
-    renderOverviewInsight(state.rows);
-    renderSummaryRail(state.rows);
-    renderZoneBars(state.rows);
-    renderDiscardedFinalCases(state.rows);
     renderSortIndicators();
     updateQuickChipState();
     renderTable(rows);
@@ -948,21 +829,21 @@ function render() {
 
 async function init() {
     try {
-        const [mesaResponse, finalBudgetsResponse] = await Promise.all([
-            fetch(CSV_URL),
-            fetch(FINAL_BUDGETS_URL),
-        ]);
-        if (!mesaResponse.ok) throw new Error('No se pudo cargar el CSV principal');
-        if (!finalBudgetsResponse.ok) throw new Error('No se pudo cargar el CSV de importes finales');
-        const finalBudgetMap = buildFinalBudgetMap(parseCsv(await finalBudgetsResponse.text()));
-        state.rows = parseRows(parseCsv(await mesaResponse.text()), finalBudgetMap).sort(compareRows);
+        const response = await fetch(ANALYSIS_URL);
+        if (!response.ok) throw new Error('No se pudo cargar el analisis de mesas');
+        const analysis = await response.json();
+        state.enums = analysis.enums;
+        state.aggregates = analysis.aggregates;
+        // Las filas ya vienen en el orden por defecto de la tabla.
+        state.rows = decodeRows(analysis);
+        state.rowsById = new Map(state.rows.map(row => [row.propuestaId, row]));
         document.body.classList.add('mesa-ready');
         renderActaLinks();
         setupActaModal();
         setupFilters();
         const shouldScrollToTable = hasActiveFilters();
         setupSectionActions();
-        renderTopProposals();
+        renderSummaries();
         render();
         if (shouldScrollToTable) {
             requestAnimationFrame(() => {